@@ -40,6 +40,8 @@ APPS = [
 INSTALLED_APPS += APPS
 
 MIDDLEWARE = [
+    # Отвечает на запросы к MEDIA_URL до остальных middleware
+    "common.media.MediaMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -51,10 +53,11 @@ MIDDLEWARE = [
 ]
 
 REST_FRAMEWORK = {
-    "DEFAULT_AUTHENTICATION_CLASSES": (
-        "rest_framework_simplejwt.authentication.JWTAuthentication",
-    ),
+    "DEFAULT_AUTHENTICATION_CLASSES": ("users.authentication.CachedJWTAuthentication",),
     "DEFAULT_PERMISSION_CLASSES": ("rest_framework.permissions.IsAuthenticated",),
+    # Число доверенных прокси перед приложением: IP клиента для лимитов (users.throttling)
+    # берётся из X-Forwarded-For только при NUM_PROXIES > 0, иначе из REMOTE_ADDR
+    "NUM_PROXIES": env.int("NUM_PROXIES", default=0),
 }
 
 CORS_ALLOWED_ORIGINS = [
@@ -102,6 +105,54 @@ DATABASES = {
     }
 }
 
+# Cache
+# https://docs.djangoproject.com/en/5.1/topics/cache/
+# По умолчанию кэш в памяти процесса; для нескольких воркеров задайте CACHE_URL
+# (например, redis://127.0.0.1:6379/1)
+
+CACHES = {
+    "default": env.cache_url("CACHE_URL", default="locmemcache://"),
+}
+
+# Время жизни пользователя в кэше JWT-аутентификации (users.authentication), секунд
+AUTH_USER_CACHE_TTL = env.int("AUTH_USER_CACHE_TTL", default=60)
+# Представления с token_user = True получают пользователя из токена без запроса к БД
+AUTH_TOKEN_USER = env.bool("AUTH_TOKEN_USER", default=False)
+# Стоимость bcrypt для новых хэшей паролей; хэши другой стоимости пересчитываются при входе
+BCRYPT_ROUNDS = env.int("BCRYPT_ROUNDS", default=12)
+# Проверка паролей bcrypt (users.passwords): потоков и максимум проверок в работе и очереди
+PASSWORD_CHECK_WORKERS = env.int("PASSWORD_CHECK_WORKERS", default=4)
+PASSWORD_CHECK_MAX_PENDING = env.int("PASSWORD_CHECK_MAX_PENDING", default=64)
+# Лимиты входа, регистрации и создания копий фото (users.throttling):
+# ёмкость корзины / период её пополнения
+AUTH_THROTTLE_RATES = {
+    "login_ip": env.str("THROTTLE_LOGIN_IP", default="30/min"),
+    "login_username": env.str("THROTTLE_LOGIN_USERNAME", default="10/min"),
+    "register_ip": env.str("THROTTLE_REGISTER_IP", default="10/hour"),
+    "photo_rendition_ip": env.str("THROTTLE_PHOTO_RENDITION_IP", default="60/min"),
+}
+# Где хранить корзины: "local" - память процесса, "cache" - общий кэш CACHES
+AUTH_THROTTLE_STORE = env.str("AUTH_THROTTLE_STORE", default="local")
+# Отозванные refresh-токены (users.blacklist): ёмкость фильтра Блума и период очистки, с
+TOKEN_BLACKLIST_BLOOM_CAPACITY = env.int("TOKEN_BLACKLIST_BLOOM_CAPACITY", default=100_000)
+TOKEN_BLACKLIST_PRUNE_INTERVAL = env.int("TOKEN_BLACKLIST_PRUNE_INTERVAL", default=60 * 60)
+# Асинхронные версии читающих представлений (common.async_views) для запуска под ASGI
+ASYNC_API_VIEWS = env.bool("ASYNC_API_VIEWS", default=False)
+# Время жизни закэшированной статистики пользователя, секунд
+STATISTIC_CACHE_TTL = env.int("STATISTIC_CACHE_TTL", default=300)
+# Максимум периодов в графиках статистики (?from=&to=&bucket=), больше - ответ 400
+STATISTIC_MAX_BUCKETS = env.int("STATISTIC_MAX_BUCKETS", default=3660)
+# max-age ответов справочника марок/моделей; после него клиент перепроверяет ETag
+CATALOG_CACHE_MAX_AGE = env.int("CATALOG_CACHE_MAX_AGE", default=60)
+# Автодополнение справочника: максимум подсказок и длина запроса для поиска с опечаткой
+CATALOG_SUGGEST_LIMIT = env.int("CATALOG_SUGGEST_LIMIT", default=10)
+CATALOG_SUGGEST_FUZZY_MIN_LENGTH = env.int("CATALOG_SUGGEST_FUZZY_MIN_LENGTH", default=4)
+
+# Генерация первичных ключей AbstractModel (common.ids)
+ID_ALLOCATOR = env.str("ID_ALLOCATOR", default="common.ids.HiLoIdAllocator")
+ID_BLOCK_SIZE = env.int("ID_BLOCK_SIZE", default=100)
+SNOWFLAKE_WORKER_ID = env.int("SNOWFLAKE_WORKER_ID", default=None)
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
@@ -170,6 +221,28 @@ STATIC_URL = "static/"
 MEDIA_URL = "/media/"
 MEDIA_ROOT = os.path.join(BASE_DIR, "media/")
 
+# Раздача MEDIA (common.media); в production файлы обычно отдаёт nginx
+MEDIA_SERVE = env.bool("MEDIA_SERVE", default=DEBUG)
+MEDIA_CACHE_MAX_AGE = env.int("MEDIA_CACHE_MAX_AGE", default=60 * 60)
+# Файлы по этим путям не меняются и кэшируются навсегда
+MEDIA_IMMUTABLE_PREFIXES = ["photos/vehicle/sha256/"]
+# Префикс internal location в nginx; если задан, файлы отдаёт nginx через X-Accel-Redirect
+MEDIA_ACCEL_REDIRECT_PREFIX = env.str("MEDIA_ACCEL_REDIRECT_PREFIX", default="")
+
+# Загрузка фотографий машин (cars.photos)
+VEHICLE_PHOTO_MAX_COUNT = env.int("VEHICLE_PHOTO_MAX_COUNT", default=20)
+VEHICLE_PHOTO_MAX_TOTAL_BYTES = env.int(
+    "VEHICLE_PHOTO_MAX_TOTAL_BYTES", default=100 * 1024 * 1024
+)
+VEHICLE_PHOTO_UPLOAD_WORKERS = env.int("VEHICLE_PHOTO_UPLOAD_WORKERS", default=8)
+# Хранить фото по хэшу содержимого (photos/vehicle/sha256/...) с дедупликацией
+VEHICLE_PHOTO_CONTENT_ADDRESSED = env.bool("VEHICLE_PHOTO_CONTENT_ADDRESSED", default=True)
+# Временные файлы загрузок - вне MEDIA_ROOT; None - системный каталог. На одном
+# разделе с MEDIA_ROOT файл переносится переименованием, без копирования
+FILE_UPLOAD_TEMP_DIR = env.str("FILE_UPLOAD_TEMP_DIR", default=None)
+# Процессы для уменьшенных копий фото (cars.renditions); 0 - в потоке запроса
+PHOTO_RENDITION_WORKERS = env.int("PHOTO_RENDITION_WORKERS", default=2)
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.1/ref/settings/#default-auto-field
 
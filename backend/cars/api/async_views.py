@@ -0,0 +1,143 @@
+"""
+Асинхронные версии читающих представлений (common.async_views).
+
+Запросы идут через асинхронный ORM (aiterator, aaggregate, aget); три агрегата
+статистики запускаются одновременно через asyncio.gather. В Django 5.1 асинхронный
+ORM выполняет запросы в общем потоке sync_to_async(thread_sensitive=True), так что
+сами запросы одного процесса идут по очереди, но обработчик не занимает поток
+WSGI-воркера, пока ждёт БД и кэш.
+"""
+
+import asyncio
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.cache import patch_cache_control
+from django.utils.http import parse_etags
+from rest_framework import exceptions
+
+from cars import statistic_cache
+from cars.catalog import get_catalog
+from cars.models import DailyUserRollup, Vehicle
+from common.async_views import AsyncAPIView
+
+from .filters import filter_vehicles
+from .pagination import VehicleCursorPagination
+from .serializers import (
+    GraphParamsSerializer,
+    UserStatisticModelSerializer,
+    VehicleListSerializer,
+    VehicleRetrieveSerializer,
+)
+from .views import CarBrandListView, CarModelListView
+
+
+class AsyncVehicleListView(AsyncAPIView):
+    pagination_class = VehicleCursorPagination
+    token_user = True
+
+    async def get(self, request, *args, **kwargs):
+        params = request.query_params
+        catalog = None
+        if params.get("brand") or params.get("model"):
+            # Справочник обычно уже в памяти процесса; иначе читается из кэша или БД
+            catalog = await sync_to_async(get_catalog)()
+        vehicles = (
+            Vehicle.objects.filter(owner_id=request.user.id)
+            .select_related("brand", "model")
+            .with_expense_flag()
+        )
+        vehicles = filter_vehicles(vehicles, params, catalog)
+
+        paginator = self.pagination_class()
+        vehicles = paginator.sort_queryset(vehicles, request)
+        if paginator.is_enabled(request):
+            page = await paginator.apaginate_queryset(vehicles, request)
+            serializer = VehicleListSerializer(page, many=True)
+            return self.render(paginator.get_paginated_data(serializer.data))
+
+        vehicles = [vehicle async for vehicle in vehicles.aiterator()]
+        return self.render(VehicleListSerializer(vehicles, many=True).data)
+
+
+class AsyncVehicleRetrieveView(AsyncAPIView):
+    async def get(self, request, pk, *args, **kwargs):
+        vehicles = Vehicle.objects.select_related("brand", "model").prefetch_related("photos")
+        try:
+            vehicle = await vehicles.aget(pk=pk)
+        except Vehicle.DoesNotExist:
+            raise exceptions.NotFound("Модель не найдена.")
+        # Сериализация идёт в цикле событий: фото взяты prefetch_related, ссылки на
+        # копии строятся по VehiclePhoto.renditions без обращения к хранилищу
+        serializer = VehicleRetrieveSerializer(vehicle, context={"request": request})
+        return self.render(serializer.data)
+
+
+class AsyncUserStatisticView(AsyncAPIView):
+    # Все запросы статистики фильтруются по id владельца
+    token_user = True
+
+    async def get(self, request, *args, **kwargs):
+        params = GraphParamsSerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        params = dict(params.validated_data)
+        user_id = request.user.id
+
+        data = await sync_to_async(statistic_cache.get_statistic)(user_id, params)
+        cache_status = "HIT"
+        if data is None:
+            serializer_class = UserStatisticModelSerializer
+            vehicle_totals, expense_totals, graph_rows = await asyncio.gather(
+                Vehicle.objects.filter(owner_id=user_id).aaggregate(
+                    **serializer_class.vehicle_aggregates()
+                ),
+                DailyUserRollup.objects.filter(owner_id=user_id).aaggregate(
+                    **serializer_class.expense_aggregates()
+                ),
+                self.fetch(serializer_class.graph_rows(user_id, params)),
+            )
+            serializer = serializer_class(
+                request.user,
+                context={
+                    "request": request,
+                    "graph_params": params,
+                    "vehicle_totals": vehicle_totals,
+                    "expense_totals": expense_totals,
+                    "graph_rows": graph_rows,
+                },
+            )
+            data = serializer.data
+            await sync_to_async(statistic_cache.set_statistic)(user_id, params, data)
+            cache_status = "MISS"
+        return self.render(data, headers={"X-Cache": cache_status})
+
+    @staticmethod
+    async def fetch(queryset) -> list:
+        return [row async for row in queryset.aiterator()]
+
+
+class AsyncCatalogListView(AsyncAPIView):
+    """Список справочника; тело и ETag готовит синхронное представление view_class"""
+
+    token_user = True
+    view_class = None
+
+    async def get(self, request, *args, **kwargs):
+        body, etag = await sync_to_async(self.view_class().get_rendered)()
+        if_none_match = parse_etags(request.headers.get("If-None-Match", ""))
+        if etag in if_none_match or "*" in if_none_match:
+            response = HttpResponseNotModified()
+        else:
+            response = HttpResponse(body, content_type="application/json")
+        response["ETag"] = etag
+        patch_cache_control(response, private=True, max_age=settings.CATALOG_CACHE_MAX_AGE)
+        return response
+
+
+class AsyncCarBrandListView(AsyncCatalogListView):
+    view_class = CarBrandListView
+
+
+class AsyncCarModelListView(AsyncCatalogListView):
+    view_class = CarModelListView
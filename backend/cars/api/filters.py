@@ -0,0 +1,69 @@
+from django.utils.dateparse import parse_date
+from rest_framework.exceptions import ValidationError
+
+from cars.catalog import get_catalog
+
+
+def split_values(params, name: str) -> list[str]:
+    """Значения параметра через запятую: `?status=for_sale,in_progress`"""
+    return [value.strip() for value in params.get(name, "").split(",") if value.strip()]
+
+
+def split_ids(params, name: str) -> list[int]:
+    try:
+        return [int(value) for value in split_values(params, name)]
+    except ValueError:
+        raise ValidationError({name: "Ожидается список целых чисел через запятую."})
+
+
+def parse_date_param(params, name: str):
+    value = params.get(name)
+    if not value:
+        return None
+    try:
+        parsed = parse_date(value)
+    except ValueError:
+        parsed = None
+    if parsed is None:
+        raise ValidationError({name: "Ожидается дата в формате ГГГГ-ММ-ДД."})
+    return parsed
+
+
+def filter_vehicles(vehicles, params, catalog=None):
+    """
+    Фильтры списка машин из параметров запроса. Марки и модели фильтруются по ID:
+    названия переводятся в ID через кэш справочника (catalog), чтобы условие не
+    требовало JOIN с CarBrand/CarModel.
+    """
+    if params.get("brand_id"):
+        vehicles = vehicles.filter(brand_id__in=split_ids(params, "brand_id"))
+    if params.get("model_id"):
+        vehicles = vehicles.filter(model_id__in=split_ids(params, "model_id"))
+    if params.get("brand") or params.get("model"):
+        catalog = catalog or get_catalog()
+    if params.get("brand"):
+        vehicles = vehicles.filter(
+            brand_id__in=catalog.brand_ids(split_values(params, "brand"))
+        )
+    if params.get("model"):
+        vehicles = vehicles.filter(
+            model_id__in=catalog.model_ids(split_values(params, "model"))
+        )
+    if params.get("status"):
+        vehicles = vehicles.filter(status__in=split_values(params, "status"))
+
+    for field in ("year", "mileage", "purchase_price"):
+        value_from = params.get(f"{field}_from")
+        value_to = params.get(f"{field}_to")
+        if value_from:
+            vehicles = vehicles.filter(**{f"{field}__gte": value_from})
+        if value_to:
+            vehicles = vehicles.filter(**{f"{field}__lte": value_to})
+    for field in ("purchase_date", "sale_date"):
+        date_from = parse_date_param(params, f"{field}_from")
+        date_to = parse_date_param(params, f"{field}_to")
+        if date_from:
+            vehicles = vehicles.filter(**{f"{field}__gte": date_from})
+        if date_to:
+            vehicles = vehicles.filter(**{f"{field}__lte": date_to})
+    return vehicles
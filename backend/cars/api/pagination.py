@@ -0,0 +1,160 @@
+import base64
+import json
+from decimal import Decimal, InvalidOperation
+
+from django.db.models import DecimalField, F, Q, Value
+from django.db.models.functions import Coalesce
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import ValidationError
+from rest_framework.response import Response
+
+
+def _decimal_or_zero(field_name):
+    zero = Value(0, output_field=DecimalField(max_digits=10, decimal_places=2))
+    return Coalesce(F(field_name), zero)
+
+
+class VehicleCursorPagination:
+    """
+    Keyset-пагинация списка машин.
+
+    Страница выбирается условием `(sort_value, id) > (последнее значение, последний id)`
+    вместо OFFSET, поэтому стоимость запроса зависит только от размера страницы.
+    Пагинация включается, если в запросе передан `cursor` или `page_size`.
+    """
+
+    page_size = 50
+    max_page_size = 500
+    cursor_query_param = "cursor"
+    page_size_query_param = "page_size"
+    sort_query_param = "sort"
+    default_sort = "created_at"
+
+    # Имя сортировки -> (выражение, функция разбора значения из курсора)
+    sort_fields = {
+        "created_at": (lambda: F("created_at"), parse_datetime),
+        "year": (lambda: F("year"), int),
+        "mileage": (lambda: F("mileage"), int),
+        "purchase_price": (lambda: _decimal_or_zero("purchase_price"), Decimal),
+        "benefit": (lambda: F("benefit"), Decimal),
+    }
+
+    def __init__(self):
+        self.sort = None
+        self.cursor = None
+        self.backwards = False
+        self.page_size_value = None
+        self.next_cursor = None
+        self.prev_cursor = None
+
+    def is_enabled(self, request) -> bool:
+        params = request.query_params
+        return self.cursor_query_param in params or self.page_size_query_param in params
+
+    def get_sort(self, request) -> str:
+        sort = request.query_params.get(self.sort_query_param) or self.default_sort
+        if sort.lstrip("-") not in self.sort_fields:
+            raise ValidationError({self.sort_query_param: f"Недопустимая сортировка: {sort}."})
+        return sort
+
+    def get_page_size(self, request) -> int:
+        value = request.query_params.get(self.page_size_query_param)
+        if not value:
+            return self.page_size
+        try:
+            page_size = int(value)
+        except ValueError:
+            raise ValidationError({self.page_size_query_param: "Ожидается целое число."})
+        if page_size < 1:
+            raise ValidationError({self.page_size_query_param: "Должно быть больше нуля."})
+        return min(page_size, self.max_page_size)
+
+    def sort_queryset(self, queryset, request):
+        """Добавляет аннотацию `sort_value` и сортировку `(sort_value, id)`"""
+        self.sort = self.get_sort(request)
+        expression, _ = self.sort_fields[self.sort.lstrip("-")]
+        queryset = queryset.annotate(sort_value=expression())
+        if self.sort.startswith("-"):
+            return queryset.order_by("-sort_value", "-id")
+        return queryset.order_by("sort_value", "id")
+
+    def get_page_queryset(self, queryset, request):
+        """Запрос страницы: page_size + 1 строк после курсора"""
+        self.page_size_value = self.get_page_size(request)
+        descending = self.sort.startswith("-")
+        self.cursor = self.decode_cursor(request)
+
+        self.backwards = False
+        if self.cursor is not None:
+            self.backwards = self.cursor["r"]
+            # При движении назад идём в обратном порядке и разворачиваем страницу
+            forward = descending == self.backwards
+            value, last_id = self.cursor["v"], self.cursor["i"]
+            if forward:
+                condition = Q(sort_value__gt=value) | Q(sort_value=value, id__gt=last_id)
+            else:
+                condition = Q(sort_value__lt=value) | Q(sort_value=value, id__lt=last_id)
+            queryset = queryset.filter(condition)
+            if self.backwards:
+                queryset = queryset.reverse()
+        return queryset[: self.page_size_value + 1]
+
+    def get_page(self, items: list) -> list:
+        """Страница из строк get_page_queryset и курсоры соседних страниц"""
+        has_more = len(items) > self.page_size_value
+        items = items[: self.page_size_value]
+        if self.backwards:
+            items.reverse()
+
+        has_next = has_more if not self.backwards else True
+        has_prev = has_more if self.backwards else self.cursor is not None
+        if items and has_next:
+            self.next_cursor = self.encode_cursor(items[-1], reverse=False)
+        if items and has_prev:
+            self.prev_cursor = self.encode_cursor(items[0], reverse=True)
+        return items
+
+    def paginate_queryset(self, queryset, request) -> list:
+        return self.get_page(list(self.get_page_queryset(queryset, request)))
+
+    async def apaginate_queryset(self, queryset, request) -> list:
+        queryset = self.get_page_queryset(queryset, request)
+        return self.get_page([item async for item in queryset.aiterator()])
+
+    def get_paginated_data(self, data) -> dict:
+        return {"next": self.next_cursor, "prev": self.prev_cursor, "results": data}
+
+    def get_paginated_response(self, data) -> Response:
+        return Response(self.get_paginated_data(data))
+
+    def encode_cursor(self, instance, reverse: bool) -> str:
+        value = instance.sort_value
+        payload = {
+            "s": self.sort,
+            "v": value.isoformat() if hasattr(value, "isoformat") else str(value),
+            "i": instance.id,
+            "r": reverse,
+        }
+        raw = json.dumps(payload, separators=(",", ":")).encode()
+        return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            raw = base64.urlsafe_b64decode(encoded + "=" * (-len(encoded) % 4))
+            payload = json.loads(raw)
+            _, parse = self.sort_fields[self.sort.lstrip("-")]
+            cursor = {
+                "v": parse(payload["v"]),
+                "i": int(payload["i"]),
+                "r": bool(payload["r"]),
+            }
+        except (ValueError, KeyError, TypeError, InvalidOperation):
+            raise ValidationError({self.cursor_query_param: "Некорректный курсор."})
+        if payload.get("s") != self.sort or cursor["v"] is None:
+            raise ValidationError(
+                {self.cursor_query_param: "Курсор не соответствует сортировке."}
+            )
+        return cursor
@@ -1,7 +1,23 @@
-from django.db.models import Count, F, QuerySet, Sum
+from datetime import date, timedelta
+
+from django.conf import settings
+from django.db.models import (
+    Count,
+    DurationField,
+    Exists,
+    ExpressionWrapper,
+    F,
+    OuterRef,
+    Q,
+    Sum,
+)
+from django.db.models.functions import Trunc
+from django.urls import reverse
 from rest_framework import serializers
 
-from cars.models import CarBrand, CarModel, Expense, Vehicle, VehiclePhoto
+from cars.models import CarBrand, CarModel, DailyUserRollup, Expense, Vehicle, VehiclePhoto
+from cars.photos import rendition_token
+from cars.renditions import RENDITIONS, rendition_name
 from users.models import User
 
 
@@ -27,12 +43,16 @@ class VehicleListSerializer(serializers.ModelSerializer):
             "benefit",
         ]
 
-    def get_expenses_amount(self, obj) -> int:
-        expenses_amount = sum(expense.amount for expense in obj.expenses.all())
-        return expenses_amount
+    # Формат сумм как при подсчёте в Python: без расходов и цен - целый 0, а не 0.0.
+    # has_expenses добавляет VehicleQuerySet.with_expense_flag()
+
+    def get_expenses_amount(self, obj: Vehicle) -> int:
+        return obj.expenses_total if obj.has_expenses else 0
 
     def get_benefit(self, obj: Vehicle) -> int:
-        return obj.calculate_benefit()
+        if obj.has_expenses or obj.sale_price is not None or obj.purchase_price is not None:
+            return obj.benefit
+        return 0
 
 
 class VehicleCreateSerializer(serializers.ModelSerializer):
@@ -135,9 +155,29 @@ class VehiclePhotoSerializer(serializers.ModelSerializer):
     def to_representation(self, instance):
         """Добавляем поле `url` для получения полного URL изображения."""
         representation = super().to_representation(instance)
-        representation["url"] = self.context["request"].build_absolute_uri(instance.image.url)
+        request = self.context["request"]
+        representation["url"] = request.build_absolute_uri(instance.image.url)
+        representation["renditions"] = self.get_renditions(instance, request)
         return representation
 
+    @staticmethod
+    def get_renditions(instance, request) -> dict:
+        """
+        URL уменьшенных копий. Копия, ещё не отмеченная в instance.renditions, отдаётся
+        ссылкой на vehicle-photo-rendition, который создаст её и перенаправит на файл.
+        """
+        storage = instance.image.storage
+        renditions = {}
+        for rendition in RENDITIONS:
+            name = rendition_name(instance.image.name, rendition)
+            if rendition in instance.renditions:
+                url = storage.url(name)
+            else:
+                token = rendition_token(instance)
+                url = reverse("vehicle-photo-rendition", args=[token, rendition])
+            renditions[rendition] = request.build_absolute_uri(url)
+        return renditions
+
 
 class VehicleRetrieveSerializer(serializers.ModelSerializer):
     brand = CarBrandModelSerializer()
@@ -171,7 +211,71 @@ class ExpenseSerializer(serializers.ModelSerializer):
         read_only_fields = ["id"]
 
 
+GRAPH_BUCKET_DAY = "day"
+GRAPH_BUCKETS = [GRAPH_BUCKET_DAY, "week", "month", "quarter"]
+
+
+def truncate_date(value: date | None, bucket: str) -> date | None:
+    """Начало периода, в который попадает дата (как Trunc* в БД)"""
+    if value is None or bucket == GRAPH_BUCKET_DAY:
+        return value
+    if bucket == "week":
+        return value - timedelta(days=value.weekday())
+    if bucket == "month":
+        return value.replace(day=1)
+    return value.replace(month=(value.month - 1) // 3 * 3 + 1, day=1)
+
+
+def iter_buckets(start: date | None, end: date | None, bucket: str):
+    """Начала всех периодов от start до end включительно"""
+    if start is None or end is None:
+        return
+    months = {"month": 1, "quarter": 3}.get(bucket)
+    while start <= end:
+        yield start
+        if months is None:
+            start += timedelta(days=7 if bucket == "week" else 1)
+        else:
+            month = start.month - 1 + months
+            start = start.replace(year=start.year + month // 12, month=month % 12 + 1)
+
+
+def count_buckets(start: date, end: date, bucket: str) -> int:
+    """Число периодов, которое вернёт iter_buckets(start, end, bucket)"""
+    start, end = truncate_date(start, bucket), truncate_date(end, bucket)
+    if end < start:
+        return 0
+    if bucket == GRAPH_BUCKET_DAY:
+        return (end - start).days + 1
+    if bucket == "week":
+        return (end - start).days // 7 + 1
+    months = (end.year - start.year) * 12 + end.month - start.month
+    return months // (3 if bucket == "quarter" else 1) + 1
+
+
+def check_bucket_count(start: date, end: date, bucket: str, field: str):
+    """Периоды без данных заполняются нулями: их число ограничено STATISTIC_MAX_BUCKETS"""
+    limit = settings.STATISTIC_MAX_BUCKETS
+    if count_buckets(start, end, bucket) > limit:
+        raise serializers.ValidationError(
+            {field: f"Слишком длинный период: больше {limit} точек графика."}
+        )
+
+
+def _or_zero(value):
+    return 0 if value is None else value
+
+
 class UserStatisticModelSerializer(serializers.ModelSerializer):
+    """
+    Статистика пользователя.
+
+    Все поля собираются из трёх агрегирующих запросов: по машинам пользователя
+    и два по дневным итогам DailyUserRollup (расходы и графики), стоимость
+    которых зависит от числа дней, а не машин. Результаты запросов можно передать
+    в context ("vehicle_totals", "expense_totals", "graph_rows"), посчитав их заранее.
+    """
+
     vehicle_by_status = serializers.SerializerMethodField()
     expenses_by_status = serializers.SerializerMethodField()
     vehicle_count = serializers.SerializerMethodField()
@@ -188,104 +292,173 @@ class UserStatisticModelSerializer(serializers.ModelSerializer):
             "graph_datasets",
         ]
 
+    @staticmethod
+    def vehicle_aggregates() -> dict:
+        """Агрегаты по машинам пользователя (один запрос)"""
+        days_held = ExpressionWrapper(
+            F("sale_date") - F("purchase_date"), output_field=DurationField()
+        )
+        return dict(
+            vehicle_count=Count("id"),
+            **{
+                f"status_{status}": Count("id", filter=Q(status=status))
+                for status, _ in Vehicle.STATUS_CHOICES
+            },
+            purchase_total=Sum("purchase_price"),
+            purchase_count=Count("purchase_price"),
+            sold_total=Sum("sale_price"),
+            sold_count=Count("sale_price"),
+            benefit_total=Sum("benefit"),
+            # Машины, прибыль которых считалась бы в Decimal (см. get_deals_data)
+            priced_count=Count(
+                "id",
+                filter=Q(purchase_price__isnull=False)
+                | Q(sale_price__isnull=False)
+                | Q(Exists(Expense.objects.filter(vehicle=OuterRef("pk")))),
+            ),
+            with_benefits=Count("id", filter=Q(benefit__gt=0)),
+            with_losses=Count("id", filter=Q(benefit__lt=0)),
+            days_held=Sum(days_held),
+        )
+
+    @staticmethod
+    def expense_aggregates() -> dict:
+        """Суммы расходов по типам из дневных итогов"""
+        return {
+            expense_type: Sum(DailyUserRollup.expense_field(expense_type))
+            for expense_type, _ in Expense.EXPENSE_TYPES
+        }
+
+    @staticmethod
+    def graph_rows(owner_id, params: dict):
+        """Покупки и продажи по периодам графика"""
+        bucket = params.get("bucket", GRAPH_BUCKET_DAY)
+        rollups = DailyUserRollup.objects.filter(owner_id=owner_id)
+        if params.get("from"):
+            rollups = rollups.filter(day__gte=params["from"])
+        if params.get("to"):
+            rollups = rollups.filter(day__lte=params["to"])
+        period = F("day") if bucket == GRAPH_BUCKET_DAY else Trunc("day", bucket)
+        return (
+            rollups.order_by()
+            .values(period=period)
+            .annotate(
+                purchase_count=Sum("purchases_count"),
+                purchase_amount=Sum("purchases_amount"),
+                sale_count=Sum("sales_count"),
+                sale_amount=Sum("sales_amount"),
+            )
+        )
+
+    def get_vehicle_totals(self, obj: User) -> dict:
+        """Агрегаты по машинам пользователя одним запросом"""
+        if "vehicle_totals" in self.context:
+            return self.context["vehicle_totals"]
+        if not hasattr(self, "_vehicle_totals"):
+            self._vehicle_totals = {}
+        cache = self._vehicle_totals
+        if obj.pk not in cache:
+            cache[obj.pk] = Vehicle.objects.filter(owner_id=obj.pk).aggregate(
+                **self.vehicle_aggregates()
+            )
+        return cache[obj.pk]
+
     def get_vehicle_by_status(self, obj: User) -> dict:
         """Сколько машин по статусу"""
-        data = {}
-        for vehicle in obj.vehicles.all().only("status"):
-            status = vehicle.status
-            data[status] = data.get(status, 0) + 1
-        return data
+        totals = self.get_vehicle_totals(obj)
+        return {
+            status: totals[f"status_{status}"]
+            for status, _ in Vehicle.STATUS_CHOICES
+            if totals[f"status_{status}"]
+        }
 
     def get_expenses_by_status(self, obj: User) -> dict:
         """Сколько расходов по статусу"""
-        vehicles: QuerySet[Vehicle] = obj.vehicles.all().prefetch_related("expenses")
-        data = {}
-        for vehicle in vehicles:
-            for expense in vehicle.expenses.all():
-                status = expense.expense_type
-                data[status] = data.get(status, 0) + expense.amount
-        return data
+        totals = self.context.get("expense_totals")
+        if totals is None:
+            totals = DailyUserRollup.objects.filter(owner_id=obj.pk).aggregate(
+                **self.expense_aggregates()
+            )
+        return {expense_type: total for expense_type, total in totals.items() if total}
 
     def get_vehicle_count(self, obj: User) -> int:
         """Всего машин"""
-        return obj.vehicles.count()
+        return self.get_vehicle_totals(obj)["vehicle_count"]
 
     def get_deals_data(self, obj: User) -> dict:
         """Данные по сделкам"""
-        vehicles: QuerySet[Vehicle] = obj.vehicles.all()
-        purchased_vehicles = vehicles.filter(purchase_price__isnull=False)
-        solded_vehicles = vehicles.filter(sale_price__isnull=False)
-        vehicle_benefits_dict = {
-            vehicle.id: vehicle.calculate_benefit() for vehicle in vehicles
+        totals = self.get_vehicle_totals(obj)
+        purchase_total = _or_zero(totals["purchase_total"])
+        sold_total = _or_zero(totals["sold_total"])
+        days_held = totals["days_held"].days if totals["days_held"] else 0
+        return {
+            "purchase_total_amount": purchase_total,
+            "sold_total_amount": sold_total,
+            "purchase_avg_price": purchase_total / (totals["purchase_count"] or 1),
+            "sold_avg_price": sold_total / (totals["sold_count"] or 1),
+            # Без цен и расходов у всех машин прибыль - целый 0, как у суммы в Python
+            "benefit": totals["benefit_total"] if totals["priced_count"] else 0,
+            "avg_days_between_purchase_and_sale": days_held / (totals["vehicle_count"] or 1),
+            "vehicle_with_benefits": totals["with_benefits"],
+            "vehicle_with_losses": totals["with_losses"],
         }
-        data = {
-            "purchase_total_amount": sum(
-                vehicle.purchase_price for vehicle in purchased_vehicles
-            ),
-            "sold_total_amount": sum(vehicle.sale_price for vehicle in solded_vehicles),
-            "purchase_avg_price": sum(vehicle.purchase_price for vehicle in purchased_vehicles)
-            / (purchased_vehicles.count() or 1),
-            "sold_avg_price": sum(vehicle.sale_price for vehicle in solded_vehicles)
-            / (solded_vehicles.count() or 1),
-            "benefit": sum(vehicle.calculate_benefit() for vehicle in vehicles),
-            "avg_days_between_purchase_and_sale": (
-                sum(
-                    (vehicle.sale_date - vehicle.purchase_date).days
-                    for vehicle in vehicles.filter(
-                        purchase_date__isnull=False, sale_date__isnull=False
-                    )
+
+    def get_graph_datasets(self, obj: User) -> dict:
+        """Данные для графиков, сгруппированные по периодам и без пропусков"""
+        params = self.context.get("graph_params") or {}
+        bucket = params.get("bucket", GRAPH_BUCKET_DAY)
+        date_from, date_to = params.get("from"), params.get("to")
+
+        rows = self.context.get("graph_rows")
+        if rows is None:
+            rows = self.graph_rows(obj.pk, params)
+
+        # Заполняем нулями периоды без покупок и продаж
+        data = {}
+        for row in rows:
+            for kind in ("purchase", "sale"):
+                if row[f"{kind}_count"]:
+                    data[kind, row["period"]] = (row[f"{kind}_count"], row[f"{kind}_amount"])
+        days = [day for _, day in data]
+        start = truncate_date(date_from or min(days, default=None), bucket)
+        end = truncate_date(date_to or max(days, default=None), bucket)
+        if start is not None and end is not None:
+            # Открытую границу периода задают даты сделок
+            field = "from" if date_from else "to" if date_to else "bucket"
+            check_bucket_count(start, end, bucket, field)
+
+        count_dataset = {"purchase_dates": [], "sale_dates": []}
+        financial_dataset = {"purchase_dates": [], "sale_dates": []}
+        for kind in ("purchase", "sale"):
+            date_field = f"{kind}_date"
+            for day in iter_buckets(start, end, bucket):
+                count, amount = data.get((kind, day), (0, 0))
+                count_dataset[f"{kind}_dates"].append(
+                    {date_field: day, "count": count, "date": day}
                 )
-                / vehicles.count()
-            ),
-            "vehicle_with_benefits": sum(
-                1 for vehicle in vehicles if vehicle_benefits_dict[vehicle.id] > 0
-            ),
-            "vehicle_with_losses": sum(
-                1 for vehicle in vehicles if vehicle_benefits_dict[vehicle.id] < 0
-            ),
+                financial_dataset[f"{kind}_dates"].append(
+                    {date_field: day, "amount": amount, "date": day}
+                )
+
+        return {
+            "count_dataset": count_dataset,
+            "financial_dataset": financial_dataset,
         }
-        return data
 
-    def get_graph_datasets(self, obj: User) -> dict:
-        """Данные для графиков"""
-
-        def get_count_dataset():
-            purchase_data = (
-                Vehicle.objects.filter(purchase_date__isnull=False)
-                .values("purchase_date")
-                .annotate(count=Count("id"), date=F("purchase_date"))
-                .order_by("purchase_date")
-            )
-            sale_data = (
-                Vehicle.objects.filter(sale_date__isnull=False)
-                .values("sale_date")
-                .annotate(count=Count("id"), date=F("sale_date"))
-                .order_by("sale_date")
-            )
-            return {
-                "purchase_dates": list(purchase_data),
-                "sale_dates": list(sale_data),
-            }
-
-        def get_financial_dataset():
-            purchase_data = (
-                Vehicle.objects.filter(purchase_date__isnull=False)
-                .values("purchase_date")
-                .annotate(amount=Sum("purchase_price"), date=F("purchase_date"))
-                .order_by("purchase_date")
-            )
-            sale_data = (
-                Vehicle.objects.filter(sale_date__isnull=False)
-                .values("sale_date")
-                .annotate(amount=Sum("sale_price"), date=F("sale_date"))
-                .order_by("sale_date")
-            )
-            return {
-                "purchase_dates": list(purchase_data),
-                "sale_dates": list(sale_data),
-            }
 
+class GraphParamsSerializer(serializers.Serializer):
+    """Параметры графиков: ?bucket=day|week|month|quarter&from=YYYY-MM-DD&to=YYYY-MM-DD"""
+
+    def get_fields(self):
         return {
-            "count_dataset": get_count_dataset(),
-            "financial_dataset": get_financial_dataset(),
+            "bucket": serializers.ChoiceField(choices=GRAPH_BUCKETS, default=GRAPH_BUCKET_DAY),
+            "from": serializers.DateField(required=False),
+            "to": serializers.DateField(required=False),
         }
+
+    def validate(self, attrs):
+        if attrs.get("from") and attrs.get("to"):
+            if attrs["from"] > attrs["to"]:
+                raise serializers.ValidationError({"from": "Начало периода позже его конца."})
+            check_bucket_count(attrs["from"], attrs["to"], attrs["bucket"], "to")
+        return attrs
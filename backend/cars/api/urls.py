@@ -1,17 +1,29 @@
+from django.conf import settings
 from django.urls import path
 
+from .async_views import (
+    AsyncCarBrandListView,
+    AsyncCarModelListView,
+    AsyncUserStatisticView,
+    AsyncVehicleListView,
+    AsyncVehicleRetrieveView,
+)
 from .views import (
     CarBrandListView,
     CarModelListView,
     CarModelRetrieveView,
+    CatalogSuggestView,
     ExpenseCreateView,
     ExpenseDeleteView,
     ExpenseListView,
     PhotoDeleteView,
+    UserStatisticCacheView,
     UserStatisticView,
     VehicleCreateView,
     VehicleDeleteView,
+    VehicleImportView,
     VehicleListView,
+    VehiclePhotoRenditionView,
     VehicleUpdateView,
 )
 
@@ -19,13 +31,27 @@ VEHICLE = "vehicles/"
 BRANDS = "brands/"
 MODELS = "models/"
 EXPENSES = "expenses/"
+CATALOG = "catalog/"
+
+
+def read_view(view_class, async_view_class):
+    """Асинхронная версия читающего представления при ASYNC_API_VIEWS"""
+    return (async_view_class if settings.ASYNC_API_VIEWS else view_class).as_view()
+
 
 urlpatterns = [
-    path(VEHICLE + "list/", VehicleListView.as_view(), name="vehicle-list"),
     path(
-        VEHICLE + "retrieve/<int:pk>/", CarModelRetrieveView.as_view(), name="vehicle-retrieve"
+        VEHICLE + "list/",
+        read_view(VehicleListView, AsyncVehicleListView),
+        name="vehicle-list",
+    ),
+    path(
+        VEHICLE + "retrieve/<int:pk>/",
+        read_view(CarModelRetrieveView, AsyncVehicleRetrieveView),
+        name="vehicle-retrieve",
     ),
     path(VEHICLE + "create/", VehicleCreateView.as_view(), name="vehicle-create"),
+    path(VEHICLE + "import/", VehicleImportView.as_view(), name="vehicle-import"),
     path(VEHICLE + "update/<int:pk>/", VehicleUpdateView.as_view(), name="vehicle-update"),
     path(VEHICLE + "delete/<int:pk>/", VehicleDeleteView.as_view(), name="vehicle-delete"),
     path(
@@ -33,10 +59,29 @@ urlpatterns = [
         PhotoDeleteView.as_view(),
         name="vehicle-photo-delete",
     ),
-    path(BRANDS + "list/", CarBrandListView.as_view(), name="car-brand-list"),
-    path(MODELS + "list/", CarModelListView.as_view(), name="car-model-list"),
+    path(
+        VEHICLE + "photo/<str:token>/<str:rendition>/",
+        VehiclePhotoRenditionView.as_view(),
+        name="vehicle-photo-rendition",
+    ),
+    path(
+        BRANDS + "list/",
+        read_view(CarBrandListView, AsyncCarBrandListView),
+        name="car-brand-list",
+    ),
+    path(
+        MODELS + "list/",
+        read_view(CarModelListView, AsyncCarModelListView),
+        name="car-model-list",
+    ),
+    path(CATALOG + "suggest/", CatalogSuggestView.as_view(), name="catalog-suggest"),
     path(EXPENSES + "list/<int:vehicle_id>/", ExpenseListView.as_view(), name="expense-list"),
     path(EXPENSES + "create/", ExpenseCreateView.as_view(), name="expense-create"),
     path(EXPENSES + "delete/<int:pk>/", ExpenseDeleteView.as_view(), name="expense-delete"),
-    path("statistic/", UserStatisticView.as_view(), name="user-statistic"),
+    path(
+        "statistic/",
+        read_view(UserStatisticView, AsyncUserStatisticView),
+        name="user-statistic",
+    ),
+    path("statistic/cache/", UserStatisticCacheView.as_view(), name="user-statistic-cache"),
 ]
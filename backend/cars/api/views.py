@@ -1,16 +1,43 @@
+import hashlib
+
+from django.conf import settings
+from django.db import transaction
+from django.http import Http404, HttpResponse, HttpResponseNotModified, HttpResponseRedirect
 from django.shortcuts import get_object_or_404
+from django.utils.cache import patch_cache_control
+from django.utils.http import parse_etags
 from rest_framework import generics
 from rest_framework import status as rest_status
+from rest_framework.exceptions import ValidationError
 from rest_framework.parsers import JSONParser, MultiPartParser
+from rest_framework.permissions import AllowAny, IsAdminUser
+from rest_framework.renderers import JSONRenderer
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
+from cars import statistic_cache
+from cars.catalog import catalog_version
+from cars.importers import VehicleImporter, detect_format, read_rows
 from cars.models import CarBrand, CarModel, Expense, Vehicle, VehiclePhoto
+from cars.photos import (
+    check_photo_limits,
+    generate_renditions,
+    ingest_vehicle_photos,
+    missing_renditions,
+    photo_id_from_token,
+    rendition_lock,
+)
+from cars.renditions import RENDITIONS, rendition_name
+from cars.suggest import get_suggest_index
+from users.throttling import PhotoRenditionIPThrottle
 
+from .filters import filter_vehicles, split_ids
+from .pagination import VehicleCursorPagination
 from .serializers import (
     CarBrandModelSerializer,
     CarModelModelSerializer,
     ExpenseSerializer,
+    GraphParamsSerializer,
     UserStatisticModelSerializer,
     VehicleCreateSerializer,
     VehicleListSerializer,
@@ -20,40 +47,26 @@ from .serializers import (
 
 
 class VehicleListView(APIView):
+    pagination_class = VehicleCursorPagination
+    # Нужен только id пользователя (users.authentication)
+    token_user = True
+
     def get(self, request, *args, **kwargs):
-        user = request.user
-        vehicles = Vehicle.objects.filter(owner=user)
-
-        # Получение параметров фильтрации из запроса
-        brand = request.query_params.get("brand", None)
-        model = request.query_params.get("model", None)
-        status = request.query_params.get("status", None)
-        year_from = request.query_params.get("year_from", None)
-        year_to = request.query_params.get("year_to", None)
-        mileage_from = request.query_params.get("mileage_from", None)
-        mileage_to = request.query_params.get("mileage_to", None)
-        purchase_price_from = request.query_params.get("purchase_price_from", None)
-        purchase_price_to = request.query_params.get("purchase_price_to", None)
-
-        # Применяем фильтры
-        if brand:
-            vehicles = vehicles.filter(brand__name=brand)
-        if model:
-            vehicles = vehicles.filter(model__name=model)
-        if status:
-            vehicles = vehicles.filter(status=status)
-        if year_from:
-            vehicles = vehicles.filter(year__gte=year_from)
-        if year_to:
-            vehicles = vehicles.filter(year__lte=year_to)
-        if mileage_from:
-            vehicles = vehicles.filter(mileage__gte=mileage_from)
-        if mileage_to:
-            vehicles = vehicles.filter(mileage__lte=mileage_to)
-        if purchase_price_from:
-            vehicles = vehicles.filter(purchase_price__gte=purchase_price_from)
-        if purchase_price_to:
-            vehicles = vehicles.filter(purchase_price__lte=purchase_price_to)
+        vehicles = (
+            Vehicle.objects.filter(owner_id=request.user.id)
+            .select_related("brand", "model")
+            .with_expense_flag()
+        )
+
+        vehicles = filter_vehicles(vehicles, request.query_params)
+
+        # Сортировка (?sort=year, ?sort=-benefit, ...) и пагинация по курсору
+        paginator = self.pagination_class()
+        vehicles = paginator.sort_queryset(vehicles, request)
+        if paginator.is_enabled(request):
+            page = paginator.paginate_queryset(vehicles, request)
+            serializer = VehicleListSerializer(page, many=True)
+            return paginator.get_paginated_response(serializer.data)
 
         # Сериализация данных
         serializer = VehicleListSerializer(vehicles, many=True)
@@ -72,6 +85,38 @@ class VehicleCreateView(APIView):
         return Response(serializer.errors, status=rest_status.HTTP_400_BAD_REQUEST)
 
 
+class VehicleImportView(APIView):
+    """Массовый импорт машин из CSV, JSON Lines, JSON или XLSX; dry_run=1 - только проверка"""
+
+    parser_classes = [MultiPartParser]
+
+    def post(self, request, *args, **kwargs):
+        upload = request.FILES.get("file")
+        if upload is None:
+            return Response(
+                {"file": "Файл не передан."}, status=rest_status.HTTP_400_BAD_REQUEST
+            )
+        dry_run = request.data.get("dry_run", request.query_params.get("dry_run", ""))
+        dry_run = str(dry_run).lower() in ("1", "true", "yes")
+        try:
+            fmt = detect_format(upload.name, request.data.get("format"))
+            importer = VehicleImporter(request.user, dry_run=dry_run)
+            result = importer.run(read_rows(upload.file, fmt))
+        except (ValueError, UnicodeDecodeError) as error:
+            return Response({"file": str(error)}, status=rest_status.HTTP_400_BAD_REQUEST)
+
+        return Response(
+            {
+                "dry_run": dry_run,
+                "rows": result.rows,
+                "created": 0 if dry_run else result.created.get("vehicles", 0),
+                "valid": result.created.get("vehicles", 0),
+                "errors": [{"row": line, "errors": errors} for line, errors in result.errors],
+            },
+            status=rest_status.HTTP_200_OK,
+        )
+
+
 class VehicleUpdateView(APIView):
     parser_classes = [MultiPartParser, JSONParser]
 
@@ -86,14 +131,14 @@ class VehicleUpdateView(APIView):
 
         serializer = VehicleUpdateSerializer(vehicle, data=request.data, partial=True)
         if serializer.is_valid():
-            serializer.save()
-
-            # Обновление фотографий
             photos = request.FILES.getlist("photos")
-            if photos:
-                for photo in photos:
-                    photo_instance = VehiclePhoto.objects.create(image=photo)
-                    vehicle.photos.add(photo_instance)
+            check_photo_limits(photos)
+            # Фото проверяются при сохранении: при ошибке (400) откатываются и поля машины
+            with transaction.atomic():
+                serializer.save()
+
+                # Обновление фотографий
+                ingest_vehicle_photos(vehicle, photos)
 
             return Response(serializer.data, status=rest_status.HTTP_200_OK)
 
@@ -112,8 +157,11 @@ class PhotoDeleteView(APIView):
                 status=rest_status.HTTP_403_FORBIDDEN,
             )
 
-        # Удаляем фотографию
-        photo.delete()
+        # Одно фото может быть у нескольких машин (cars.photos): отвязываем его от машин
+        # пользователя, а строку удаляем, когда других машин не осталось
+        photo.vehicles.remove(*photo.vehicles.filter(owner=request.user))
+        if not photo.vehicles.exists():
+            photo.delete()
 
         return Response(
             {"detail": "Фотография успешно удалена."},
@@ -121,6 +169,33 @@ class PhotoDeleteView(APIView):
         )
 
 
+class VehiclePhotoRenditionView(APIView):
+    """Перенаправляет на уменьшенную копию фото, создавая её при первом запросе"""
+
+    # Адрес подставляется в <img>, как и ссылки на сами файлы из MEDIA_URL; фото
+    # задаётся подписанным токеном (cars.photos.rendition_token), а не pk
+    permission_classes = [AllowAny]
+    authentication_classes = []
+
+    def get(self, request, token, rendition, *args, **kwargs):
+        photo_id = photo_id_from_token(token)
+        if rendition not in RENDITIONS or photo_id is None:
+            raise Http404
+        photo = get_object_or_404(VehiclePhoto, id=photo_id)
+        if rendition not in photo.renditions:
+            with rendition_lock(photo):
+                # Копии мог создать параллельный запрос или backfill_photo_renditions
+                missing = missing_renditions(photo)
+                if rendition in missing:
+                    # Лимит только на создание: готовые копии отдаются без него
+                    throttle = PhotoRenditionIPThrottle()
+                    if not throttle.allow_request(request, self):
+                        self.throttled(request, throttle.wait())
+                    generate_renditions(photo, missing)
+        name = rendition_name(photo.image.name, rendition)
+        return HttpResponseRedirect(photo.image.storage.url(name))
+
+
 class VehicleDeleteView(APIView):
     def delete(self, request, pk, *args, **kwargs):
         try:
@@ -138,18 +213,69 @@ class VehicleDeleteView(APIView):
         )
 
 
-class CarBrandListView(APIView):
+class CatalogListView(APIView):
+    """
+    Список справочника марок/моделей.
+
+    JSON рендерится один раз на версию справочника и хранится в памяти процесса;
+    условный запрос с актуальным ETag получает 304 без обращения к БД.
+    """
+
+    token_user = True
+    queryset = None
+    serializer_class = None
+    # (версия справочника, тело ответа, ETag) - своё у каждого подкласса
+    rendered = None
+
+    def get_rendered(self) -> tuple[bytes, str]:
+        version = catalog_version()
+        rendered = type(self).rendered
+        if rendered is None or rendered[0] != version:
+            serializer = self.serializer_class(self.queryset.order_by("id"), many=True)
+            body = JSONRenderer().render(serializer.data)
+            rendered = (version, body, f'"{hashlib.sha256(body).hexdigest()[:32]}"')
+            type(self).rendered = rendered
+        return rendered[1], rendered[2]
+
     def get(self, request, *args, **kwargs):
-        car_brands = CarBrand.objects.all()
-        serializer = CarBrandModelSerializer(car_brands, many=True)
-        return Response(serializer.data, status=rest_status.HTTP_200_OK)
+        body, etag = self.get_rendered()
+        if_none_match = parse_etags(request.headers.get("If-None-Match", ""))
+        if etag in if_none_match or "*" in if_none_match:
+            response = HttpResponseNotModified()
+        else:
+            response = HttpResponse(body, content_type="application/json")
+        response["ETag"] = etag
+        patch_cache_control(response, private=True, max_age=settings.CATALOG_CACHE_MAX_AGE)
+        return response
+
+
+class CarBrandListView(CatalogListView):
+    queryset = CarBrand.objects.all()
+    serializer_class = CarBrandModelSerializer
+
+
+class CarModelListView(CatalogListView):
+    queryset = CarModel.objects.all()
+    serializer_class = CarModelModelSerializer
 
 
-class CarModelListView(APIView):
+class CatalogSuggestView(APIView):
+    """Подсказки марок и моделей по началу названия: ?q=тойо&brand_id=1&limit=5"""
+
+    token_user = True
+
     def get(self, request, *args, **kwargs):
-        car_models = CarModel.objects.all()
-        serializer = CarModelModelSerializer(car_models, many=True)
-        return Response(serializer.data, status=rest_status.HTTP_200_OK)
+        params = request.query_params
+        brand_ids = split_ids(params, "brand_id")
+        limits = split_ids(params, "limit")
+        if limits and limits[0] < 1:
+            raise ValidationError({"limit": "Ожидается целое число больше нуля."})
+        suggestions = get_suggest_index().suggest(
+            params.get("q", ""),
+            brand_id=brand_ids[0] if brand_ids else None,
+            limit=limits[0] if limits else None,
+        )
+        return Response(suggestions, status=rest_status.HTTP_200_OK)
 
 
 class CarModelRetrieveView(APIView):
@@ -200,3 +326,39 @@ class UserStatisticView(generics.RetrieveAPIView):
 
     def get_object(self):
         return self.request.user
+
+    def get_graph_params(self) -> dict:
+        if not hasattr(self, "_graph_params"):
+            params = GraphParamsSerializer(data=self.request.query_params)
+            params.is_valid(raise_exception=True)
+            self._graph_params = dict(params.validated_data)
+        return self._graph_params
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context["graph_params"] = self.get_graph_params()
+        return context
+
+    def retrieve(self, request, *args, **kwargs):
+        # Ответ кэшируется по пользователю и параметрам графиков,
+        # сигналы сбрасывают кэш при изменении машин, расходов и фото
+        user = self.get_object()
+        params = self.get_graph_params()
+        data = statistic_cache.get_statistic(user.id, params)
+        cache_status = "HIT"
+        if data is None:
+            data = self.get_serializer(user).data
+            statistic_cache.set_statistic(user.id, params, data)
+            cache_status = "MISS"
+        return Response(data, headers={"X-Cache": cache_status})
+
+
+class UserStatisticCacheView(APIView):
+    """Счётчики попаданий в кэш статистики (для подбора TTL)"""
+
+    permission_classes = [IsAdminUser]
+
+    def get(self, request, *args, **kwargs):
+        return Response(
+            statistic_cache.statistic_cache_stats(), status=rest_status.HTTP_200_OK
+        )
@@ -0,0 +1,86 @@
+"""
+Кэш справочника марок и моделей.
+
+Справочник меняется редко, а читается на каждый запрос списка машин с фильтром
+по названию марки/модели. Строки справочника лежат в кэше Django под общей
+версией, которую сигналы CarBrand/CarModel увеличивают при каждом изменении;
+индексы по названиям собираются один раз на процесс для каждой версии.
+"""
+
+import time
+
+from django.core.cache import cache
+
+VERSION_KEY = "cars:catalog:version"
+DATA_KEY = "cars:catalog:data:{version}"
+DATA_TTL = 60 * 60 * 24
+
+
+class Catalog:
+    def __init__(self, brands: list[tuple], models: list[tuple], version=None):
+        # brands: [(id, name)], models: [(id, brand_id, name)]
+        self.version = version
+        self.brands = brands
+        self.models = models
+        self.brand_ids_by_name = {name: brand_id for brand_id, name in brands}
+        self.model_ids_by_name = {}
+        self.model_ids_by_brand_and_name = {}
+        for model_id, brand_id, name in models:
+            self.model_ids_by_name.setdefault(name, []).append(model_id)
+            self.model_ids_by_brand_and_name[(brand_id, name)] = model_id
+
+    def brand_ids(self, names) -> list[int]:
+        return [
+            self.brand_ids_by_name[name] for name in names if name in self.brand_ids_by_name
+        ]
+
+    def model_ids(self, names) -> list[int]:
+        return [
+            model_id for name in names for model_id in self.model_ids_by_name.get(name, ())
+        ]
+
+
+# (версия, Catalog) последнего загруженного в процесс справочника
+_cached = (None, None)
+
+
+def catalog_version():
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        # Начинаем с текущего времени, чтобы не совпасть с прежними версиями
+        version = time.time_ns()
+        if not cache.add(VERSION_KEY, version, timeout=None):
+            version = cache.get(VERSION_KEY, version)
+    return version
+
+
+def _load() -> tuple[list, list]:
+    from cars.models import CarBrand, CarModel
+
+    brands = list(CarBrand.objects.order_by("id").values_list("id", "name"))
+    models = list(CarModel.objects.order_by("id").values_list("id", "brand_id", "name"))
+    return brands, models
+
+
+def get_catalog() -> Catalog:
+    global _cached
+    version = catalog_version()
+    cached_version, catalog = _cached
+    if catalog is not None and cached_version == version:
+        return catalog
+
+    data_key = DATA_KEY.format(version=version)
+    rows = cache.get(data_key)
+    if rows is None:
+        rows = _load()
+        cache.set(data_key, rows, timeout=DATA_TTL)
+    catalog = Catalog(*rows, version=version)
+    _cached = (version, catalog)
+    return catalog
+
+
+def invalidate_catalog():
+    try:
+        cache.incr(VERSION_KEY)
+    except ValueError:
+        cache.set(VERSION_KEY, time.time_ns(), timeout=None)
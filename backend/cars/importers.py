@@ -0,0 +1,343 @@
+"""
+Массовый импорт данных из CSV, JSON и XLSX.
+
+Файлы читаются построчно и обрабатываются пачками: каждая пачка - одна
+транзакция и несколько bulk_create вместо запроса на строку.
+"""
+
+import csv
+import io
+import itertools
+import json
+from datetime import datetime
+from pathlib import Path
+from xml.etree.ElementTree import ParseError
+from zipfile import BadZipFile
+
+from django.db import IntegrityError, transaction
+from rest_framework import serializers
+from rest_framework.settings import api_settings
+
+from cars.catalog import get_catalog, invalidate_catalog
+from cars.models import CarBrand, CarModel, DailyUserRollup, Vehicle
+
+FORMATS = ("csv", "jsonl", "json", "xlsx")
+NOT_OBJECT = "Строка должна быть объектом с полями."
+
+
+def detect_format(path: str, fmt: str | None = None) -> str:
+    fmt = fmt or Path(path).suffix.lstrip(".").lower()
+    if fmt == "ndjson":
+        fmt = "jsonl"
+    if fmt not in FORMATS:
+        raise ValueError(f"Неизвестный формат файла: {fmt or path}")
+    return fmt
+
+
+def read_rows(stream, fmt: str):
+    """
+    Строки файла; всё, кроме json, читается потоково. Ошибки разбора файла
+    поднимаются как ValueError, строки не-словари проверяют импортёры.
+    """
+    if fmt == "xlsx":
+        yield from read_xlsx_rows(stream)
+        return
+    if not isinstance(stream, io.TextIOBase):
+        stream = io.TextIOWrapper(stream, encoding="utf-8-sig", newline="")
+    if fmt == "csv":
+        try:
+            yield from csv.DictReader(stream)
+        except csv.Error as error:
+            raise ValueError(f"Некорректный CSV: {error}")
+    elif fmt == "jsonl":
+        for line in stream:
+            if line.strip():
+                yield json.loads(line)
+    else:
+        rows = json.load(stream)
+        if not isinstance(rows, list):
+            raise ValueError("JSON-файл должен содержать список строк")
+        yield from rows
+
+
+def read_xlsx_rows(stream):
+    """Строки первого листа; первая строка - заголовки"""
+    try:
+        from openpyxl import load_workbook
+        from openpyxl.utils.exceptions import InvalidFileException
+    except ImportError:
+        raise ValueError("Для импорта XLSX нужен пакет openpyxl")
+
+    try:
+        workbook = load_workbook(stream, read_only=True, data_only=True)
+    except (BadZipFile, InvalidFileException, KeyError) as error:
+        raise ValueError(f"Некорректный XLSX: {error}")
+    try:
+        rows = workbook.worksheets[0].iter_rows(values_only=True)
+        header = [str(value).strip() if value is not None else "" for value in next(rows, ())]
+        for values in rows:
+            if any(value is not None for value in values):
+                yield {
+                    name: value.date() if isinstance(value, datetime) else value
+                    for name, value in zip(header, values)
+                    if name
+                }
+    except ParseError as error:
+        raise ValueError(f"Некорректный XLSX: {error}")
+    finally:
+        workbook.close()
+
+
+def chunked(iterable, size: int):
+    iterator = iter(iterable)
+    while chunk := list(itertools.islice(iterator, size)):
+        yield chunk
+
+
+class ImportResult:
+    def __init__(self):
+        self.rows = 0
+        self.created = {}
+        self.errors = []  # [(номер строки, сообщение)]
+
+    def add_created(self, name: str, count: int):
+        self.created[name] = self.created.get(name, 0) + count
+
+
+class CatalogImporter:
+    """
+    Импорт марок и моделей. Строка: {"brand": ..., "model": ..., "country": ...};
+    model и country необязательны.
+
+    Уже существующие марки и модели пропускаются (ignore_conflicts), с
+    update_country=True у существующих марок обновляется страна.
+    """
+
+    def __init__(self, chunk_size: int = 5000, update_country: bool = False):
+        self.chunk_size = chunk_size
+        self.update_country = update_country
+        self.result = ImportResult()
+        # Марки держим в памяти целиком: их немного, а каждая строка ссылается на марку
+        self.brand_ids = dict(CarBrand.objects.values_list("name", "id"))
+
+    def run(self, rows) -> ImportResult:
+        models_before = CarModel.objects.count()
+        line = 0
+        for chunk in chunked(rows, self.chunk_size):
+            with transaction.atomic():
+                self.import_chunk([(line + index + 1, row) for index, row in enumerate(chunk)])
+            line += len(chunk)
+        self.result.add_created("models", CarModel.objects.count() - models_before)
+        # bulk_create не отправляет сигналы, поэтому версию справочника увеличиваем сами
+        invalidate_catalog()
+        return self.result
+
+    def import_chunk(self, numbered_rows: list[tuple[int, dict]]):
+        brands = {}
+        models = set()
+        for line, row in numbered_rows:
+            self.result.rows += 1
+            if not isinstance(row, dict):
+                self.result.errors.append((line, NOT_OBJECT))
+                continue
+            brand = (row.get("brand") or "").strip()
+            model = (row.get("model") or "").strip()
+            country = (row.get("country") or "").strip() or None
+            error = self.validate(brand, model, country)
+            if error:
+                self.result.errors.append((line, error))
+                continue
+            if brand not in brands or country:
+                brands[brand] = country
+            if model:
+                models.add((brand, model))
+
+        self.save_brands(brands)
+        self.save_models(models)
+
+    @staticmethod
+    def validate(brand: str, model: str, country: str | None) -> str | None:
+        if not brand:
+            return "Не указана марка"
+        for field, value in (("brand", brand), ("model", model), ("country", country)):
+            if value and len(value) > 50:
+                return f"Поле {field} длиннее 50 символов"
+        return None
+
+    def save_brands(self, brands: dict):
+        if self.update_country:
+            objs = [
+                CarBrand(name=name, country=country)
+                for name, country in brands.items()
+                if country or name not in self.brand_ids
+            ]
+            new_names = [obj.name for obj in objs]
+            CarBrand.objects.bulk_create(
+                objs,
+                update_conflicts=True,
+                unique_fields=["name"],
+                update_fields=["country", "updated_at"],
+            )
+        else:
+            new_names = [name for name in brands if name not in self.brand_ids]
+            CarBrand.objects.bulk_create(
+                [CarBrand(name=name, country=brands[name]) for name in new_names],
+                ignore_conflicts=True,
+            )
+        missing = [name for name in new_names if name not in self.brand_ids]
+        if missing:
+            self.brand_ids.update(
+                CarBrand.objects.filter(name__in=missing).values_list("name", "id")
+            )
+        self.result.add_created("brands", len(missing))
+
+    def save_models(self, models: set):
+        # Существующие пары (brand, name) пропускает уникальный индекс
+        CarModel.objects.bulk_create(
+            [CarModel(brand_id=self.brand_ids[brand], name=name) for brand, name in models],
+            ignore_conflicts=True,
+        )
+
+
+class VehicleImportRowSerializer(serializers.Serializer):
+    """
+    Строка массового импорта машин (VehicleImporter).
+
+    Марка и модель задаются названиями и ищутся в справочнике из context["catalog"];
+    уникальность VIN проверяет импортёр одним запросом на пачку строк.
+    """
+
+    vin = serializers.CharField(max_length=17)
+    brand = serializers.CharField(max_length=50)
+    model = serializers.CharField(max_length=50)
+    year = serializers.IntegerField(min_value=1900, max_value=2100)
+    mileage = serializers.IntegerField(min_value=0)
+    status = serializers.ChoiceField(choices=Vehicle.STATUS_CHOICES, default=Vehicle.FOR_SALE)
+    purchase_price = serializers.DecimalField(
+        max_digits=10, decimal_places=2, required=False, allow_null=True
+    )
+    purchase_date = serializers.DateField(required=False, allow_null=True)
+    sale_price = serializers.DecimalField(
+        max_digits=10, decimal_places=2, required=False, allow_null=True
+    )
+    sale_date = serializers.DateField(required=False, allow_null=True)
+    description = serializers.CharField(required=False, allow_blank=True, default="")
+    seller_info = serializers.CharField(required=False, allow_null=True)
+    buyer_info = serializers.CharField(required=False, allow_null=True)
+
+    def validate(self, attrs):
+        catalog = self.context["catalog"]
+        brand_id = catalog.brand_ids_by_name.get(attrs.pop("brand"))
+        if brand_id is None:
+            raise serializers.ValidationError({"brand": "Марка не найдена."})
+        model_id = catalog.model_ids_by_brand_and_name.get((brand_id, attrs.pop("model")))
+        if model_id is None:
+            raise serializers.ValidationError(
+                {"model": "Модель не найдена у указанной марки."}
+            )
+        attrs["brand_id"] = brand_id
+        attrs["model_id"] = model_id
+        return attrs
+
+
+class VehicleImporter:
+    """
+    Импорт машин владельца. Колонки - поля VehicleImportRowSerializer, марка и
+    модель - названиями из справочника.
+
+    На пачку строк приходится один запрос проверки VIN и один bulk_create,
+    дневные итоги владельца пересобираются один раз после всех пачек;
+    в режиме dry_run строки только проверяются.
+    """
+
+    def __init__(self, owner, chunk_size: int = 1000, dry_run: bool = False):
+        self.owner = owner
+        self.chunk_size = chunk_size
+        self.dry_run = dry_run
+        self.result = ImportResult()
+        self.catalog = get_catalog()
+        self.seen_vins = set()
+
+    def run(self, rows) -> ImportResult:
+        line = 0
+        try:
+            for chunk in chunked(rows, self.chunk_size):
+                with transaction.atomic():
+                    self.import_chunk(
+                        [(line + index + 1, row) for index, row in enumerate(chunk)]
+                    )
+                line += len(chunk)
+        finally:
+            # Пачки сохраняются без пересборки итогов - пересобираем один раз в конце,
+            # в том числе после ошибки: сохранённые пачки уже закоммичены
+            if self.result.created.get("vehicles"):
+                DailyUserRollup.objects.rebuild([self.owner.pk])
+        return self.result
+
+    def import_chunk(self, numbered_rows: list[tuple[int, dict]]):
+        valid = []
+        for line, row in numbered_rows:
+            self.result.rows += 1
+            if not isinstance(row, dict):
+                self.result.errors.append(
+                    (line, {api_settings.NON_FIELD_ERRORS_KEY: [NOT_OBJECT]})
+                )
+                continue
+            serializer = VehicleImportRowSerializer(
+                data=self.clean_row(row), context={"catalog": self.catalog}
+            )
+            if serializer.is_valid():
+                valid.append((line, serializer.validated_data))
+            else:
+                self.result.errors.append((line, serializer.errors))
+
+        vins = [data["vin"] for _, data in valid]
+        taken = set(Vehicle.objects.filter(vin__in=vins).values_list("vin", flat=True))
+        vehicles = []
+        for line, data in valid:
+            vin = data["vin"]
+            if vin in taken or vin in self.seen_vins:
+                message = "VIN уже занят." if vin in taken else "VIN повторяется в файле."
+                self.result.errors.append((line, {"vin": [message]}))
+                continue
+            self.seen_vins.add(vin)
+            vehicles.append((line, Vehicle(owner=self.owner, **data)))
+
+        if self.dry_run:
+            self.result.add_created("vehicles", len(vehicles))
+        else:
+            self.save_vehicles(vehicles)
+
+    def save_vehicles(self, numbered_vehicles: list[tuple[int, Vehicle]]):
+        try:
+            with transaction.atomic():
+                Vehicle.objects.bulk_create(
+                    [vehicle for _, vehicle in numbered_vehicles], rebuild_rollups=False
+                )
+        except IntegrityError:
+            # VIN занят параллельной вставкой после проверки: сохраняем пачку построчно
+            pass
+        else:
+            self.result.add_created("vehicles", len(numbered_vehicles))
+            return
+        for line, vehicle in numbered_vehicles:
+            try:
+                with transaction.atomic():
+                    Vehicle.objects.bulk_create([vehicle], rebuild_rollups=False)
+            except IntegrityError:
+                self.result.errors.append((line, {"vin": ["VIN уже занят."]}))
+            else:
+                self.result.add_created("vehicles", 1)
+
+    @staticmethod
+    def clean_row(row: dict) -> dict:
+        """Пустые ячейки считаем отсутствующими значениями"""
+        cleaned = {}
+        for name, value in row.items():
+            if name is None:
+                continue
+            if isinstance(value, str):
+                value = value.strip()
+            if value not in ("", None):
+                cleaned[name.strip()] = value
+        return cleaned
@@ -0,0 +1,74 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from cars.models import VehiclePhoto
+from cars.photos import (
+    get_process_executor,
+    missing_renditions,
+    read_original,
+    save_renditions,
+)
+from cars.renditions import RENDITIONS, render
+
+
+class Command(BaseCommand):
+    help = "Создаёт недостающие уменьшенные копии фотографий машин"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--force", action="store_true", help="Пересоздать копии, даже если они уже есть"
+        )
+        parser.add_argument("--batch-size", type=int, default=100)
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        self.force = options["force"]
+        executor = get_process_executor()
+        processed = failed = 0
+
+        batch = []
+        photos = VehiclePhoto.objects.order_by("id").iterator(chunk_size=options["batch_size"])
+        for photo in photos:
+            renditions = list(RENDITIONS) if options["force"] else missing_renditions(photo)
+            if renditions:
+                batch.append((photo, renditions))
+            if len(batch) >= options["batch_size"]:
+                done, errors = self.process(batch, executor)
+                processed, failed = processed + done, failed + errors
+                batch = []
+        if batch:
+            done, errors = self.process(batch, executor)
+            processed, failed = processed + done, failed + errors
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Обработано фото: {processed}, ошибок: {failed} "
+                f"за {time.monotonic() - started:.1f} с"
+            )
+        )
+
+    def process(self, batch, executor) -> tuple[int, int]:
+        jobs = []
+        for photo, renditions in batch:
+            try:
+                data = read_original(photo)
+            except OSError as error:
+                self.stderr.write(f"Фото {photo.pk}: {error}")
+                continue
+            if executor is None:
+                jobs.append((photo, renditions, data, None))
+            else:
+                jobs.append(
+                    (photo, renditions, None, executor.submit(render, data, renditions))
+                )
+
+        done = 0
+        for photo, renditions, data, future in jobs:
+            try:
+                rendered = future.result() if future else render(data, renditions)
+                save_renditions(photo, rendered, replace=self.force)
+                done += 1
+            except Exception as error:
+                self.stderr.write(f"Фото {photo.pk}: {error}")
+        return done, len(batch) - done
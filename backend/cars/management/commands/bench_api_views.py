@@ -0,0 +1,272 @@
+import asyncio
+import statistics
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import RequestFactory, override_settings
+from django.utils import timezone
+from rest_framework_simplejwt.tokens import AccessToken
+
+from cars.api.async_views import (
+    AsyncCarBrandListView,
+    AsyncUserStatisticView,
+    AsyncVehicleListView,
+    AsyncVehicleRetrieveView,
+)
+from cars.api.views import (
+    CarBrandListView,
+    CarModelRetrieveView,
+    UserStatisticView,
+    VehicleListView,
+)
+from cars.models import CarBrand, CarModel, Vehicle
+from common.ids import get_id_allocator
+from users.api.async_views import AsyncUserProfileView
+from users.api.views import UserProfileView
+from users.models import User
+
+BENCH_PREFIX = "benchapi"
+
+
+class Command(BaseCommand):
+    help = (
+        "Нагрузочное сравнение синхронных и асинхронных (ASYNC_API_VIEWS) читающих "
+        "представлений: запросы/с, p50 и p95 по каждому эндпоинту"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--vehicles", type=int, default=500, help="Машин у пользователя")
+        parser.add_argument("--requests", type=int, default=300, help="Запросов на эндпоинт")
+        parser.add_argument(
+            "--concurrency", type=int, default=16, help="Одновременных запросов"
+        )
+        parser.add_argument("--mode", choices=["sync", "async", "both"], default="both")
+        parser.add_argument(
+            "--url",
+            help=(
+                "Адрес запущенного сервера (http://127.0.0.1:8000): запросы идут по HTTP, "
+                "режим задаёт сам сервер - WSGI или ASGI с ASYNC_API_VIEWS"
+            ),
+        )
+        parser.add_argument("--keep", action="store_true", help="Не удалять созданные данные")
+
+    def handle(self, *args, **options):
+        if min(options["vehicles"], options["requests"], options["concurrency"]) < 1:
+            raise CommandError(
+                "--vehicles, --requests и --concurrency должны быть больше нуля"
+            )
+
+        # Данные коммитятся: их читают потоки-клиенты и внешний сервер
+        user, vehicle = self.generate(options["vehicles"])
+        try:
+            token = str(AccessToken.for_user(user))
+            # Статистика считается на каждый запрос, а не берётся из кэша;
+            # с --url кэш статистики определяют настройки сервера
+            with override_settings(STATISTIC_CACHE_TTL=0):
+                if options["url"]:
+                    self.run_http(options["url"].rstrip("/"), token, vehicle, options)
+                else:
+                    modes = (
+                        ["sync", "async"] if options["mode"] == "both" else [options["mode"]]
+                    )
+                    for mode in modes:
+                        self.run_views(mode, token, vehicle, options)
+        finally:
+            if not options["keep"]:
+                User.objects.filter(username=BENCH_PREFIX).delete()
+                CarBrand.objects.filter(name__startswith=BENCH_PREFIX).delete()
+
+    def generate(self, count):
+        allocator = get_id_allocator()
+        now = timezone.now()
+        user = User.objects.create(
+            id=allocator.allocate(User),
+            username=BENCH_PREFIX,
+            email=f"{BENCH_PREFIX}@example.com",
+            password="!",
+        )
+        brand = CarBrand.objects.create(name=f"{BENCH_PREFIX} brand")
+        car_model = CarModel.objects.create(brand=brand, name=f"{BENCH_PREFIX} model")
+        vehicles = []
+        for number in range(count):
+            purchase_date = date.today() - timedelta(days=number % 730)
+            sold = number % 3 == 0
+            vehicles.append(
+                Vehicle(
+                    id=allocator.allocate(Vehicle),
+                    created_at=now,
+                    updated_at=now,
+                    owner=user,
+                    vin=f"A{number:016d}",
+                    brand=brand,
+                    model=car_model,
+                    year=1995 + number % 30,
+                    mileage=number * 100,
+                    status=Vehicle.SOLD if sold else Vehicle.FOR_SALE,
+                    purchase_price=Decimal(1000 + number),
+                    purchase_date=purchase_date,
+                    sale_price=Decimal(1200 + number) if sold else None,
+                    sale_date=purchase_date + timedelta(days=30) if sold else None,
+                )
+            )
+        # VehicleQuerySet.bulk_create пересобирает дневные итоги владельца один раз
+        Vehicle.objects.bulk_create(vehicles, batch_size=1000)
+        return user, vehicles[0]
+
+    def get_endpoints(self, vehicle):
+        # (название, синхронное представление, асинхронное, параметры, kwargs, путь)
+        return [
+            (
+                "vehicle-list",
+                VehicleListView,
+                AsyncVehicleListView,
+                {"page_size": 50},
+                {},
+                "/api/cars/vehicles/list/",
+            ),
+            (
+                "vehicle-retrieve",
+                CarModelRetrieveView,
+                AsyncVehicleRetrieveView,
+                {},
+                {"pk": vehicle.pk},
+                f"/api/cars/vehicles/retrieve/{vehicle.pk}/",
+            ),
+            (
+                "user-statistic",
+                UserStatisticView,
+                AsyncUserStatisticView,
+                {"bucket": "month"},
+                {},
+                "/api/cars/statistic/",
+            ),
+            (
+                "car-brand-list",
+                CarBrandListView,
+                AsyncCarBrandListView,
+                {},
+                {},
+                "/api/cars/brands/list/",
+            ),
+            (
+                "user-profile",
+                UserProfileView,
+                AsyncUserProfileView,
+                {},
+                {},
+                "/api/users/profile/",
+            ),
+        ]
+
+    def run_views(self, mode, token, vehicle, options):
+        """Представления без HTTP-сервера: sync - в пуле потоков, как воркер gthread;
+        async - в одном цикле событий, как воркер ASGI"""
+        self.stdout.write(self.style.MIGRATE_HEADING(f"\n{mode}"))
+        factory = RequestFactory()
+        headers = {"Authorization": f"Bearer {token}"}
+        concurrency = options["concurrency"]
+        for name, sync_view, async_view, params, kwargs, _ in self.get_endpoints(vehicle):
+            if mode == "sync":
+                view = sync_view.as_view()
+
+                def call():
+                    response = view(factory.get("/", params, headers=headers), **kwargs)
+                    if hasattr(response, "render"):
+                        response.render()
+                    return response.status_code
+
+                with ThreadPoolExecutor(concurrency) as executor:
+                    timings, errors, elapsed = self.measure_threads(
+                        executor, call, options["requests"]
+                    )
+                    self.close_connections(executor, concurrency)
+            else:
+                view = async_view.as_view()
+
+                async def call():
+                    response = await view(factory.get("/", params, headers=headers), **kwargs)
+                    return response.status_code
+
+                timings, errors, elapsed = asyncio.run(
+                    self.measure_async(call, options["requests"], concurrency)
+                )
+            self.report(name, timings, errors, elapsed)
+
+    def run_http(self, base_url, token, vehicle, options):
+        self.stdout.write(self.style.MIGRATE_HEADING(f"\n{base_url}"))
+        headers = {"Authorization": f"Bearer {token}"}
+        for name, _, _, params, _, path in self.get_endpoints(vehicle):
+            query = "&".join(f"{key}={value}" for key, value in params.items())
+            url = f"{base_url}{path}?{query}"
+
+            def call():
+                request = urllib.request.Request(url, headers=headers)
+                try:
+                    with urllib.request.urlopen(request, timeout=30) as response:
+                        response.read()
+                        return response.status
+                except urllib.error.HTTPError as error:
+                    return error.code
+
+            with ThreadPoolExecutor(options["concurrency"]) as executor:
+                timings, errors, elapsed = self.measure_threads(
+                    executor, call, options["requests"]
+                )
+            self.report(name, timings, errors, elapsed)
+
+    @staticmethod
+    def close_connections(executor, concurrency):
+        """Закрывает соединения с БД, открытые потоками пула"""
+        barrier = threading.Barrier(concurrency)
+
+        def close(_):
+            # Барьер не даёт одному потоку забрать задачи остальных
+            barrier.wait()
+            connection.close()
+
+        list(executor.map(close, range(concurrency)))
+
+    @staticmethod
+    def measure_threads(executor, call, count):
+        def timed(_):
+            started = time.perf_counter()
+            status = call()
+            return (time.perf_counter() - started) * 1000, status
+
+        started = time.perf_counter()
+        results = list(executor.map(timed, range(count)))
+        elapsed = time.perf_counter() - started
+        return [timing for timing, _ in results], [s for _, s in results if s >= 400], elapsed
+
+    @staticmethod
+    async def measure_async(call, count, concurrency):
+        slots = asyncio.Semaphore(concurrency)
+
+        async def timed():
+            async with slots:
+                started = time.perf_counter()
+                status = await call()
+                return (time.perf_counter() - started) * 1000, status
+
+        started = time.perf_counter()
+        results = await asyncio.gather(*(timed() for _ in range(count)))
+        elapsed = time.perf_counter() - started
+        return [timing for timing, _ in results], [s for _, s in results if s >= 400], elapsed
+
+    def report(self, name, timings, errors, elapsed):
+        p50 = statistics.median(timings)
+        p95 = statistics.quantiles(timings, n=20)[-1] if len(timings) > 1 else timings[0]
+        line = (
+            f"{name}: {len(timings) / elapsed:.0f} запросов/с, "
+            f"p50: {p50:.1f} мс, p95: {p95:.1f} мс"
+        )
+        if errors:
+            line += f", ошибок: {len(errors)} (статус {errors[0]})"
+        self.stdout.write(line)
@@ -0,0 +1,155 @@
+import random
+import statistics
+import time
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+
+from cars.models import CarBrand, CarModel, DailyUserRollup, Vehicle
+from common.ids import get_id_allocator
+from users.models import User
+
+BENCH_PREFIX = "bench"
+
+
+class Command(BaseCommand):
+    help = (
+        "Генерирует тестовые машины и замеряет типовые фильтры списка машин: "
+        "выводит план запроса (EXPLAIN) и p50/p95 времени выполнения"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--count", type=int, default=1_000_000, help="Сколько машин создать"
+        )
+        parser.add_argument(
+            "--owners", type=int, default=100, help="Сколько владельцев создать"
+        )
+        parser.add_argument("--repeat", type=int, default=50, help="Повторов каждого запроса")
+        parser.add_argument("--batch-size", type=int, default=5000)
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument(
+            "--keep",
+            action="store_true",
+            help="Сохранить сгенерированные данные (по умолчанию транзакция откатывается)",
+        )
+
+    def handle(self, *args, **options):
+        if options["count"] < 1 or options["owners"] < 1 or options["repeat"] < 1:
+            raise CommandError("--count, --owners и --repeat должны быть больше нуля")
+        self.random = random.Random(options["seed"])
+
+        with transaction.atomic():
+            owner = self.generate(options["count"], options["owners"], options["batch_size"])
+            self.analyze()
+            for name, queryset in self.get_cases(owner):
+                self.run_case(name, queryset, options["repeat"])
+            if not options["keep"]:
+                transaction.set_rollback(True)
+
+    def generate(self, count, owners_count, batch_size):
+        started = time.monotonic()
+        # bulk_create не вызывает save(), поэтому ID и даты задаём сами
+        allocator = get_id_allocator()
+        now = timezone.now()
+        owners = User.objects.bulk_create(
+            User(
+                id=allocator.allocate(User),
+                created_at=now,
+                updated_at=now,
+                username=f"{BENCH_PREFIX}{index}",
+                email=f"{BENCH_PREFIX}{index}@example.com",
+                first_name="Bench",
+                last_name="User",
+                password="!",
+            )
+            for index in range(owners_count)
+        )
+        brands = CarBrand.objects.bulk_create(
+            CarBrand(name=f"{BENCH_PREFIX} brand {index}") for index in range(20)
+        )
+        car_models = CarModel.objects.bulk_create(
+            CarModel(brand=brand, name=f"{BENCH_PREFIX} model {index}")
+            for brand in brands
+            for index in range(10)
+        )
+
+        for offset in range(0, count, batch_size):
+            batch = [
+                self.make_vehicle(number, owners, car_models)
+                for number in range(offset, min(offset + batch_size, count))
+            ]
+            # Дневные итоги пересобираются один раз в конце
+            Vehicle.objects.bulk_create(batch, rebuild_rollups=False)
+        DailyUserRollup.objects.rebuild([owner.pk for owner in owners])
+
+        self.stdout.write(f"Создано машин: {count} за {time.monotonic() - started:.1f} с")
+        return owners[0]
+
+    def make_vehicle(self, number, owners, car_models):
+        rnd = self.random
+        car_model = rnd.choice(car_models)
+        purchase_date = date.today() - timedelta(days=rnd.randint(0, 5 * 365))
+        status = rnd.choices(
+            [Vehicle.SOLD, Vehicle.FOR_SALE, Vehicle.IN_PROGRESS], weights=[70, 20, 10]
+        )[0]
+        purchase_price = Decimal(rnd.randint(200, 5000) * 1000)
+        sold = status == Vehicle.SOLD
+        return Vehicle(
+            owner=rnd.choice(owners),
+            vin=f"B{number:016d}",
+            brand_id=car_model.brand_id,
+            model=car_model,
+            year=rnd.randint(1995, 2024),
+            mileage=rnd.randint(0, 400_000),
+            status=status,
+            purchase_price=purchase_price,
+            purchase_date=purchase_date,
+            sale_price=purchase_price * Decimal("1.1") if sold else None,
+            sale_date=purchase_date + timedelta(days=rnd.randint(1, 120)) if sold else None,
+        )
+
+    def analyze(self):
+        # Планировщику нужна свежая статистика после массовой вставки
+        with connection.cursor() as cursor:
+            cursor.execute(f"ANALYZE {Vehicle._meta.db_table}")
+
+    def get_cases(self, owner):
+        """Комбинации фильтров VehicleListView: первая страница, сортировка по created_at"""
+        vehicles = Vehicle.objects.filter(owner=owner).select_related("brand", "model")
+        brand = CarBrand.objects.filter(name__startswith=BENCH_PREFIX).first()
+        month_ago = date.today() - timedelta(days=30)
+        year_ago = date.today() - timedelta(days=365)
+        cases = [
+            ("owner", vehicles),
+            ("owner + status", vehicles.filter(status=Vehicle.FOR_SALE)),
+            ("owner + unsold", vehicles.exclude(status=Vehicle.SOLD)),
+            ("owner + purchase_date", vehicles.filter(purchase_date__gte=year_ago)),
+            ("owner + sale_date", vehicles.filter(sale_date__gte=month_ago)),
+            ("owner + brand", vehicles.filter(brand_id__in=[brand.pk])),
+            (
+                "owner + year + mileage",
+                vehicles.filter(year__gte=2015, year__lte=2020, mileage__lte=100_000),
+            ),
+            (
+                "owner + purchase_price",
+                vehicles.filter(purchase_price__gte=1_000_000, purchase_price__lte=2_000_000),
+            ),
+        ]
+        return [(name, queryset.order_by("created_at", "id")[:50]) for name, queryset in cases]
+
+    def run_case(self, name, queryset, repeat):
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            rows = len(queryset.all())
+            timings.append((time.perf_counter() - started) * 1000)
+
+        p50 = statistics.median(timings)
+        p95 = statistics.quantiles(timings, n=20)[-1] if repeat > 1 else timings[0]
+        self.stdout.write(self.style.MIGRATE_HEADING(f"\n{name}"))
+        self.stdout.write(f"строк: {rows}, p50: {p50:.2f} мс, p95: {p95:.2f} мс")
+        self.stdout.write(queryset.explain())
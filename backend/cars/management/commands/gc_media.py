@@ -0,0 +1,145 @@
+import time
+from datetime import timedelta
+
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from cars.models import VehiclePhoto
+from cars.renditions import RENDITIONS, rendition_name
+from users.models import User
+
+# Каталог загрузок в MEDIA_ROOT; остальное содержимое хранилища не трогаем
+MEDIA_PREFIX = "photos"
+
+
+class Command(BaseCommand):
+    help = (
+        "Удаляет фото машин, не привязанные ни к одной машине, и файлы, на которые "
+        "не ссылаются VehiclePhoto.image и User.photo"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=500)
+        parser.add_argument(
+            "--sleep", type=float, default=0.1, help="Пауза между пачками удалений, с"
+        )
+        parser.add_argument(
+            "--min-age",
+            type=int,
+            default=3600,
+            help="Не удалять строки и файлы, изменённые меньше N секунд назад",
+        )
+        parser.add_argument(
+            "--interval", type=int, default=0, help="Повторять сборку каждые N секунд"
+        )
+        parser.add_argument("--dry-run", action="store_true", help="Только подсчитать")
+
+    def handle(self, *args, **options):
+        self.batch_size = options["batch_size"]
+        self.sleep = options["sleep"]
+        self.min_age = options["min_age"]
+        self.dry_run = options["dry_run"]
+        while True:
+            self.collect()
+            if not options["interval"]:
+                break
+            time.sleep(options["interval"])
+
+    def collect(self):
+        started = time.monotonic()
+        cutoff = timezone.now() - timedelta(seconds=self.min_age)
+        rows = self.delete_orphan_photos(cutoff)
+        files, reclaimed = self.delete_orphan_files(cutoff)
+        prefix = "Будет удалено" if self.dry_run else "Удалено"
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{prefix} фото: {rows}, файлов: {files}, "
+                f"освобождено {reclaimed} байт ({reclaimed / 1024 / 1024:.1f} МБ) "
+                f"за {time.monotonic() - started:.1f} с"
+            )
+        )
+
+    def delete_orphan_photos(self, cutoff) -> int:
+        """Строки VehiclePhoto без машин; их файлы удаляются следующим шагом"""
+        orphans = VehiclePhoto.objects.filter(vehicles__isnull=True, updated_at__lt=cutoff)
+        if self.dry_run:
+            # Строки не удаляются: их файлы исключаются из ссылок при подсчёте файлов
+            self.orphans = orphans
+            return orphans.count()
+        deleted = 0
+        while ids := list(
+            orphans.order_by("id").values_list("id", flat=True)[: self.batch_size]
+        ):
+            # Условия повторяются: фото могли привязать к машине после выборки
+            count, _ = orphans.filter(pk__in=ids).delete()
+            if not count:
+                break
+            deleted += count
+            self.pause()
+        return deleted
+
+    def delete_orphan_files(self, cutoff) -> tuple[int, int]:
+        referenced = self.referenced_names()
+        deleted = reclaimed = 0
+        batch = []
+        for name in self.walk(MEDIA_PREFIX):
+            if name in referenced or not self.is_old(name, cutoff):
+                continue
+            batch.append(name)
+            if len(batch) >= self.batch_size:
+                count, size = self.delete_files(batch)
+                deleted, reclaimed = deleted + count, reclaimed + size
+                batch = []
+        if batch:
+            count, size = self.delete_files(batch)
+            deleted, reclaimed = deleted + count, reclaimed + size
+        return deleted, reclaimed
+
+    def referenced_names(self) -> set[str]:
+        """Файлы всех фото с их уменьшенными копиями и фото профилей"""
+        referenced = set()
+        images = VehiclePhoto.objects.values_list("image", flat=True)
+        if self.dry_run:
+            images = images.exclude(pk__in=self.orphans.values("pk"))
+        for name in images.iterator(chunk_size=self.batch_size * 10):
+            referenced.add(name)
+            referenced.update(rendition_name(name, rendition) for rendition in RENDITIONS)
+        referenced.update(User.objects.exclude(photo="").values_list("photo", flat=True))
+        return referenced
+
+    def walk(self, path: str):
+        if not default_storage.exists(path):
+            return
+        directories, files = default_storage.listdir(path)
+        for name in files:
+            yield f"{path}/{name}"
+        for directory in directories:
+            yield from self.walk(f"{path}/{directory}")
+
+    @staticmethod
+    def is_old(name: str, cutoff) -> bool:
+        try:
+            return default_storage.get_modified_time(name) < cutoff
+        except NotImplementedError:
+            return True
+
+    def delete_files(self, names: list[str]) -> tuple[int, int]:
+        deleted = reclaimed = 0
+        for name in names:
+            try:
+                size = default_storage.size(name)
+                if not self.dry_run:
+                    default_storage.delete(name)
+            except OSError as error:
+                self.stderr.write(f"{name}: {error}")
+                continue
+            deleted += 1
+            reclaimed += size
+        if not self.dry_run:
+            self.pause()
+        return deleted, reclaimed
+
+    def pause(self):
+        if self.sleep:
+            time.sleep(self.sleep)
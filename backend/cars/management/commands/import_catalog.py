@@ -0,0 +1,49 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from cars.importers import FORMATS, CatalogImporter, detect_format, read_rows
+
+
+class Command(BaseCommand):
+    help = "Импортирует марки и модели из CSV (brand,model,country), JSON Lines, JSON или XLSX"
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="Путь к файлу")
+        parser.add_argument("--format", choices=FORMATS, help="По умолчанию - по расширению")
+        parser.add_argument("--chunk-size", type=int, default=5000)
+        parser.add_argument(
+            "--update-country",
+            action="store_true",
+            help="Обновлять страну у уже существующих марок",
+        )
+
+    def handle(self, *args, **options):
+        try:
+            fmt = detect_format(options["path"], options["format"])
+        except ValueError as error:
+            raise CommandError(error)
+        if options["chunk_size"] < 1:
+            raise CommandError("--chunk-size должен быть больше нуля")
+
+        started = time.monotonic()
+        importer = CatalogImporter(
+            chunk_size=options["chunk_size"], update_country=options["update_country"]
+        )
+        try:
+            with open(options["path"], "rb") as stream:
+                result = importer.run(read_rows(stream, fmt))
+        except (OSError, ValueError) as error:
+            raise CommandError(error)
+        elapsed = time.monotonic() - started
+
+        for line, error in result.errors[:50]:
+            self.stderr.write(f"Строка {line}: {error}")
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Строк: {result.rows}, ошибок: {len(result.errors)}, "
+                f"новых марок: {result.created.get('brands', 0)}, "
+                f"новых моделей: {result.created.get('models', 0)} "
+                f"за {elapsed:.2f} с ({result.rows / max(elapsed, 1e-6):.0f} строк/с)"
+            )
+        )
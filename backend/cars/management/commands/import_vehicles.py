@@ -0,0 +1,60 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from cars.importers import FORMATS, VehicleImporter, detect_format, read_rows
+from users.models import User
+
+
+class Command(BaseCommand):
+    help = "Импортирует машины владельца из CSV, JSON Lines, JSON или XLSX"
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="Путь к файлу")
+        parser.add_argument("--owner", required=True, help="ID или username владельца")
+        parser.add_argument("--format", choices=FORMATS, help="По умолчанию - по расширению")
+        parser.add_argument("--chunk-size", type=int, default=1000)
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Только проверить строки, ничего не сохранять",
+        )
+
+    def handle(self, *args, **options):
+        try:
+            fmt = detect_format(options["path"], options["format"])
+        except ValueError as error:
+            raise CommandError(error)
+        if options["chunk_size"] < 1:
+            raise CommandError("--chunk-size должен быть больше нуля")
+        owner = self.get_owner(options["owner"])
+
+        started = time.monotonic()
+        importer = VehicleImporter(
+            owner, chunk_size=options["chunk_size"], dry_run=options["dry_run"]
+        )
+        try:
+            with open(options["path"], "rb") as stream:
+                result = importer.run(read_rows(stream, fmt))
+        except (OSError, ValueError) as error:
+            raise CommandError(error)
+        elapsed = time.monotonic() - started
+
+        for line, errors in result.errors:
+            self.stderr.write(f"Строка {line}: {errors}")
+        verb = "Проверено" if options["dry_run"] else "Импортировано"
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{verb} машин: {result.created.get('vehicles', 0)} из {result.rows}, "
+                f"ошибок: {len(result.errors)} за {elapsed:.2f} с "
+                f"({result.rows / max(elapsed, 1e-6):.0f} строк/с)"
+            )
+        )
+
+    @staticmethod
+    def get_owner(value: str) -> User:
+        lookup = {"pk": int(value)} if value.isdigit() else {"username": value}
+        try:
+            return User.objects.get(**lookup)
+        except User.DoesNotExist:
+            raise CommandError(f"Пользователь {value} не найден")
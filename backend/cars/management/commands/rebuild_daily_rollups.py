@@ -0,0 +1,25 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from cars.models import DailyUserRollup
+
+
+class Command(BaseCommand):
+    help = "Заполняет или пересобирает дневные итоги пользователей (DailyUserRollup)"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--owner",
+            type=int,
+            action="append",
+            dest="owner_ids",
+            help="ID пользователя (можно указать несколько раз); по умолчанию - все",
+        )
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        rows = DailyUserRollup.objects.rebuild(options["owner_ids"])
+        self.stdout.write(
+            self.style.SUCCESS(f"Записано строк: {rows} за {time.monotonic() - started:.2f} с")
+        )
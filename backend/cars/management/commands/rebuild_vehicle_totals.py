@@ -0,0 +1,58 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import F, Sum
+from django.db.models.functions import Coalesce
+
+from cars.importers import chunked
+from cars.models import ROLLUP_REBUILD_CHUNK_SIZE, ZERO, DailyUserRollup, Vehicle
+
+
+class Command(BaseCommand):
+    help = "Пересчитывает и проверяет сохранённые суммы расходов (Vehicle.expenses_total)"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--check",
+            action="store_true",
+            help="Только проверить, завершиться с ошибкой при расхождениях",
+        )
+        parser.add_argument("--batch-size", type=int, default=10000)
+
+    def handle(self, *args, **options):
+        mismatched = self.find_mismatched()
+        self.stdout.write(f"Машин с неверной суммой расходов: {len(mismatched)}")
+
+        if options["check"]:
+            if mismatched:
+                ids = [vehicle_id for vehicle_id, _ in mismatched[:20]]
+                raise CommandError(f"Расхождения у машин: {ids}")
+            return
+
+        # id читаются пачками по ключу, без загрузки всей таблицы в память
+        batch_size = options["batch_size"]
+        vehicles = Vehicle.objects.order_by("id").values_list("id", flat=True)
+        count, last_id = 0, 0
+        while batch := list(vehicles.filter(id__gt=last_id)[:batch_size]):
+            with transaction.atomic():
+                Vehicle.objects.filter(
+                    id__gte=batch[0], id__lte=batch[-1]
+                ).recalculate_expenses_total(rebuild_rollups=False)
+            count += len(batch)
+            last_id = batch[-1]
+
+        # Дневные итоги меняются только у владельцев машин с расхождением -
+        # пересобираются один раз, после всех пачек
+        owner_ids = sorted({owner_id for _, owner_id in mismatched})
+        for chunk in chunked(owner_ids, ROLLUP_REBUILD_CHUNK_SIZE):
+            DailyUserRollup.objects.rebuild(chunk)
+
+        self.stdout.write(self.style.SUCCESS(f"Пересчитано машин: {count}"))
+
+    def find_mismatched(self) -> list:
+        """Пары (id, owner_id) машин, у которых сохранённая сумма расходов неверна"""
+        return list(
+            Vehicle.objects.annotate(actual=Coalesce(Sum("expenses__amount"), ZERO))
+            .exclude(expenses_total=F("actual"))
+            .order_by("id")
+            .values_list("id", "owner_id")
+        )
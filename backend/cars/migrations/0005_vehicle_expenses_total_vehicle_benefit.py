@@ -0,0 +1,78 @@
+# Generated by Django 5.1.4 on 2026-10-18 03:20
+
+import django.db.models.expressions
+import django.db.models.functions.comparison
+from decimal import Decimal
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery, Sum
+
+
+def fill_expenses_total(apps, schema_editor):
+    Vehicle = apps.get_model("cars", "Vehicle")
+    Expense = apps.get_model("cars", "Expense")
+    totals = (
+        Expense.objects.filter(vehicle=OuterRef("pk"))
+        .order_by()
+        .values("vehicle")
+        .annotate(total=Sum("amount"))
+        .values("total")
+    )
+    Vehicle.objects.filter(pk__in=Expense.objects.values("vehicle_id")).update(
+        expenses_total=Subquery(totals)
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("cars", "0004_vehiclephoto_carbrand_created_at_carbrand_updated_at_and_more"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="vehicle",
+            name="expenses_total",
+            field=models.DecimalField(
+                decimal_places=2,
+                default=Decimal("0.00"),
+                editable=False,
+                max_digits=12,
+                verbose_name="Сумма расходов",
+            ),
+        ),
+        migrations.RunPython(fill_expenses_total, migrations.RunPython.noop),
+        migrations.AddField(
+            model_name="vehicle",
+            name="benefit",
+            field=models.GeneratedField(
+                db_persist=True,
+                expression=django.db.models.expressions.CombinedExpression(
+                    django.db.models.expressions.CombinedExpression(
+                        django.db.models.functions.comparison.Coalesce(
+                            models.F("sale_price"),
+                            models.Value(
+                                Decimal("0.00"),
+                                output_field=models.DecimalField(
+                                    decimal_places=2, max_digits=12
+                                ),
+                            ),
+                        ),
+                        "-",
+                        django.db.models.functions.comparison.Coalesce(
+                            models.F("purchase_price"),
+                            models.Value(
+                                Decimal("0.00"),
+                                output_field=models.DecimalField(
+                                    decimal_places=2, max_digits=12
+                                ),
+                            ),
+                        ),
+                    ),
+                    "-",
+                    models.F("expenses_total"),
+                ),
+                output_field=models.DecimalField(decimal_places=2, max_digits=12),
+                verbose_name="Прибыль",
+            ),
+        ),
+    ]
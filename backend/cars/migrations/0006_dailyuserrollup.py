@@ -0,0 +1,177 @@
+# Generated by Django 5.1.4 on 2026-10-18 03:25
+
+import django.db.models.deletion
+from decimal import Decimal
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Sum
+
+
+def fill_daily_rollups(apps, schema_editor):
+    """Итоги по дням для уже существующих машин и расходов (как DailyUserRollup.rebuild)"""
+    Vehicle = apps.get_model("cars", "Vehicle")
+    Expense = apps.get_model("cars", "Expense")
+    DailyUserRollup = apps.get_model("cars", "DailyUserRollup")
+    rows = {}
+
+    def row(owner_id, day):
+        if (owner_id, day) not in rows:
+            rows[owner_id, day] = DailyUserRollup(owner_id=owner_id, day=day)
+        return rows[owner_id, day]
+
+    purchases = (
+        Vehicle.objects.order_by()
+        .filter(purchase_date__isnull=False)
+        .values("owner_id", "purchase_date")
+        .annotate(count=Count("id"), amount=Sum("purchase_price"))
+    )
+    for item in purchases:
+        rollup = row(item["owner_id"], item["purchase_date"])
+        rollup.purchases_count = item["count"]
+        rollup.purchases_amount = item["amount"] or 0
+
+    sales = (
+        Vehicle.objects.order_by()
+        .filter(sale_date__isnull=False)
+        .values("owner_id", "sale_date")
+        .annotate(count=Count("id"), amount=Sum("sale_price"), benefit_total=Sum("benefit"))
+    )
+    for item in sales:
+        rollup = row(item["owner_id"], item["sale_date"])
+        rollup.sales_count = item["count"]
+        rollup.sales_amount = item["amount"] or 0
+        rollup.realized_benefit = item["benefit_total"] or 0
+
+    expenses = (
+        Expense.objects.order_by()
+        .values("vehicle__owner_id", "date", "expense_type")
+        .annotate(amount=Sum("amount"))
+    )
+    # Неизвестные типы - в "прочие", как DailyUserRollup.expense_field
+    fields = {field.name for field in DailyUserRollup._meta.get_fields()}
+    for item in expenses:
+        rollup = row(item["vehicle__owner_id"], item["date"])
+        field = f"expenses_{item['expense_type']}"
+        if field not in fields:
+            field = "expenses_other"
+        setattr(rollup, field, getattr(rollup, field) + item["amount"])
+
+    DailyUserRollup.objects.bulk_create(rows.values(), batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("cars", "0005_vehicle_expenses_total_vehicle_benefit"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="DailyUserRollup",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True, primary_key=True, serialize=False, verbose_name="ID"
+                    ),
+                ),
+                (
+                    "created_at",
+                    models.DateTimeField(auto_now_add=True, verbose_name="Дата создания"),
+                ),
+                (
+                    "updated_at",
+                    models.DateTimeField(auto_now=True, verbose_name="Дата обновления"),
+                ),
+                ("day", models.DateField(verbose_name="День")),
+                (
+                    "purchases_count",
+                    models.IntegerField(default=0, verbose_name="Куплено машин"),
+                ),
+                (
+                    "purchases_amount",
+                    models.DecimalField(
+                        decimal_places=2,
+                        default=Decimal("0.00"),
+                        max_digits=14,
+                        verbose_name="Сумма покупок",
+                    ),
+                ),
+                ("sales_count", models.IntegerField(default=0, verbose_name="Продано машин")),
+                (
+                    "sales_amount",
+                    models.DecimalField(
+                        decimal_places=2,
+                        default=Decimal("0.00"),
+                        max_digits=14,
+                        verbose_name="Сумма продаж",
+                    ),
+                ),
+                (
+                    "expenses_repaid",
+                    models.DecimalField(
+                        decimal_places=2,
+                        default=Decimal("0.00"),
+                        max_digits=14,
+                        verbose_name="Ремонт",
+                    ),
+                ),
+                (
+                    "expenses_documents",
+                    models.DecimalField(
+                        decimal_places=2,
+                        default=Decimal("0.00"),
+                        max_digits=14,
+                        verbose_name="Документы",
+                    ),
+                ),
+                (
+                    "expenses_delivery",
+                    models.DecimalField(
+                        decimal_places=2,
+                        default=Decimal("0.00"),
+                        max_digits=14,
+                        verbose_name="Доставка",
+                    ),
+                ),
+                (
+                    "expenses_other",
+                    models.DecimalField(
+                        decimal_places=2,
+                        default=Decimal("0.00"),
+                        max_digits=14,
+                        verbose_name="Прочее",
+                    ),
+                ),
+                (
+                    "realized_benefit",
+                    models.DecimalField(
+                        decimal_places=2,
+                        default=Decimal("0.00"),
+                        max_digits=14,
+                        verbose_name="Реализованная прибыль",
+                    ),
+                ),
+                (
+                    "owner",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="daily_rollups",
+                        to=settings.AUTH_USER_MODEL,
+                        verbose_name="Владелец",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Итоги за день",
+                "verbose_name_plural": "Итоги по дням",
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("owner", "day"), name="daily_rollup_owner_day"
+                    )
+                ],
+            },
+        ),
+        migrations.RunPython(fill_daily_rollups, migrations.RunPython.noop),
+    ]
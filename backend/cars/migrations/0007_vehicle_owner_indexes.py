@@ -0,0 +1,61 @@
+# Generated by Django 5.1.4 on 2026-10-18 03:32
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("cars", "0006_dailyuserrollup"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="vehicle",
+            index=models.Index(
+                fields=["owner", "created_at", "id"], name="vehicle_owner_created_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="vehicle",
+            index=models.Index(fields=["owner", "status"], name="vehicle_owner_status_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="vehicle",
+            index=models.Index(
+                fields=["owner", "purchase_date"], name="vehicle_owner_purchase_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="vehicle",
+            index=models.Index(fields=["owner", "sale_date"], name="vehicle_owner_sale_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="vehicle",
+            index=models.Index(
+                fields=["owner", "brand", "model"], name="vehicle_owner_brand_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="vehicle",
+            index=models.Index(
+                condition=models.Q(("status", "sold"), _negated=True),
+                fields=["owner", "created_at", "id"],
+                name="vehicle_owner_unsold_idx",
+            ),
+        ),
+        migrations.AlterField(
+            model_name="vehicle",
+            name="owner",
+            field=models.ForeignKey(
+                db_index=False,
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="vehicles",
+                to=settings.AUTH_USER_MODEL,
+                verbose_name="Владелец",
+            ),
+        ),
+    ]
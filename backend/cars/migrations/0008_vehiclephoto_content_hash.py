@@ -0,0 +1,25 @@
+# Generated by Django 5.1.4 on 2026-10-18 03:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("cars", "0007_vehicle_owner_indexes"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="vehiclephoto",
+            name="content_hash",
+            field=models.CharField(
+                blank=True,
+                editable=False,
+                max_length=64,
+                null=True,
+                unique=True,
+                verbose_name="Хэш",
+            ),
+        ),
+    ]
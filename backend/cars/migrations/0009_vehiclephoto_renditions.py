@@ -0,0 +1,20 @@
+# Generated by Django 5.1.4 on 2026-10-18 04:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("cars", "0008_vehiclephoto_content_hash"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="vehiclephoto",
+            name="renditions",
+            field=models.JSONField(
+                blank=True, default=list, editable=False, verbose_name="Копии"
+            ),
+        ),
+    ]
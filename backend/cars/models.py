@@ -1,8 +1,25 @@
-from django.db import models
+from decimal import Decimal
 
+from django.db import IntegrityError, models, transaction
+from django.db.models import Count, DecimalField, Exists, F, OuterRef, Q, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from cars.statistic_cache import invalidate_all_statistics, invalidate_statistic
 from common.models import SimpleBaseModel
 from users.models import User
 
+ZERO = Value(Decimal("0.00"), output_field=DecimalField(max_digits=12, decimal_places=2))
+# Владельцев за одну транзакцию полной пересборки дневных итогов
+ROLLUP_REBUILD_CHUNK_SIZE = 1000
+
+
+def loaded_state(instance, fields) -> dict | None:
+    """Значения полей, прочитанные из БД, или None, если часть полей отложена"""
+    if instance.get_deferred_fields() & set(fields):
+        return None
+    return {field: getattr(instance, field) for field in fields}
+
 
 class CarBrand(SimpleBaseModel):
     name = models.CharField(max_length=50, unique=True, verbose_name="Марка")
@@ -37,6 +54,16 @@ def vihicle_photo_path(instance, filename):
 
 class VehiclePhoto(SimpleBaseModel):
     image = models.ImageField(upload_to=vihicle_photo_path, verbose_name="Фото")
+    # SHA-256 содержимого для файлов, сохранённых по хэшу (cars.photos); одно фото
+    # с таким содержимым может быть привязано к нескольким машинам
+    content_hash = models.CharField(
+        max_length=64, unique=True, null=True, blank=True, editable=False, verbose_name="Хэш"
+    )
+    # Уже созданные уменьшенные копии (cars.renditions): ссылки на них строятся
+    # без обращения к хранилищу
+    renditions = models.JSONField(
+        default=list, blank=True, editable=False, verbose_name="Копии"
+    )
 
     class Meta:
         verbose_name = "Фото автомобиля"
@@ -46,6 +73,46 @@ class VehiclePhoto(SimpleBaseModel):
         return f"Фото {self.id}"
 
 
+class VehicleQuerySet(models.QuerySet):
+    def recalculate_expenses_total(self, rebuild_rollups=True):
+        """
+        Пересчитывает сохранённую сумму расходов по строкам Expense. rebuild_rollups=False -
+        дневные итоги (прибыль зависит от суммы расходов) пересобирает вызывающий код
+        """
+        totals = (
+            Expense.objects.filter(vehicle=OuterRef("pk"))
+            .order_by()
+            .values("vehicle")
+            .annotate(total=Sum("amount"))
+            .values("total")
+        )
+        if not rebuild_rollups:
+            return self.update(expenses_total=Coalesce(Subquery(totals), ZERO))
+        with transaction.atomic(using=self.db):
+            owner_ids = set(self.values_list("owner_id", flat=True))
+            rows = self.update(expenses_total=Coalesce(Subquery(totals), ZERO))
+            DailyUserRollup.objects.rebuild(owner_ids)
+        return rows
+
+    def with_expense_flag(self):
+        """has_expenses: есть ли у машины расходы (см. VehicleListSerializer)"""
+        return self.annotate(
+            has_expenses=Exists(Expense.objects.filter(vehicle=OuterRef("pk")))
+        )
+
+    def bulk_create(self, objs, *args, rebuild_rollups=True, **kwargs):
+        """
+        rebuild_rollups=False - дневные итоги пересобирает вызывающий код, например
+        один раз после нескольких вставок
+        """
+        if not rebuild_rollups:
+            return super().bulk_create(objs, *args, **kwargs)
+        with transaction.atomic(using=self.db):
+            objs = super().bulk_create(objs, *args, **kwargs)
+            DailyUserRollup.objects.rebuild({vehicle.owner_id for vehicle in objs})
+        return objs
+
+
 class Vehicle(SimpleBaseModel):
     FOR_SALE = "for_sale"
     IN_PROGRESS = "in_progress"
@@ -59,7 +126,12 @@ class Vehicle(SimpleBaseModel):
 
     # Основные данные
     owner = models.ForeignKey(
-        User, on_delete=models.CASCADE, related_name="vehicles", verbose_name="Владелец"
+        User,
+        on_delete=models.CASCADE,
+        related_name="vehicles",
+        verbose_name="Владелец",
+        # Покрывается составными индексами из Meta.indexes
+        db_index=False,
     )
     vin = models.CharField(max_length=17, unique=True, verbose_name="VIN-номер")
     brand = models.ForeignKey(CarBrand, on_delete=models.PROTECT, verbose_name="Марка")
@@ -96,21 +168,119 @@ class Vehicle(SimpleBaseModel):
         VehiclePhoto, related_name="vehicles", verbose_name="Фотографии"
     )
 
+    # Денормализованные итоги: expenses_total меняется F-выражениями при записи расходов,
+    # benefit вычисляется самой БД из цен и expenses_total
+    expenses_total = models.DecimalField(
+        max_digits=12,
+        decimal_places=2,
+        default=Decimal("0.00"),
+        editable=False,
+        verbose_name="Сумма расходов",
+    )
+    benefit = models.GeneratedField(
+        expression=Coalesce(F("sale_price"), ZERO)
+        - Coalesce(F("purchase_price"), ZERO)
+        - F("expenses_total"),
+        output_field=models.DecimalField(max_digits=12, decimal_places=2),
+        db_persist=True,
+        verbose_name="Прибыль",
+    )
+
+    objects = VehicleQuerySet.as_manager()
+
     class Meta:
         verbose_name = "Автомобиль"
         verbose_name_plural = "Автомобили"
+        # Список машин всегда фильтруется по владельцу, поэтому owner - первая колонка
+        indexes = [
+            models.Index(
+                fields=["owner", "created_at", "id"], name="vehicle_owner_created_idx"
+            ),
+            models.Index(fields=["owner", "status"], name="vehicle_owner_status_idx"),
+            models.Index(fields=["owner", "purchase_date"], name="vehicle_owner_purchase_idx"),
+            models.Index(fields=["owner", "sale_date"], name="vehicle_owner_sale_idx"),
+            models.Index(fields=["owner", "brand", "model"], name="vehicle_owner_brand_idx"),
+            # Непроданные машины - основная рабочая выборка, а проданных со временем большинство
+            models.Index(
+                fields=["owner", "created_at", "id"],
+                condition=~Q(status="sold"),
+                name="vehicle_owner_unsold_idx",
+            ),
+        ]
+
+    ROLLUP_FIELDS = ["owner_id", "purchase_date", "purchase_price", "sale_date", "sale_price"]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance.remember_state()
+        return instance
+
+    def remember_state(self):
+        """Запоминает значения, уже учтённые в DailyUserRollup"""
+        self._saved_state = loaded_state(self, self.ROLLUP_FIELDS)
+
+    def save(self, *args, **kwargs):
+        # expenses_total меняется только атомарными UPDATE из сигналов Expense,
+        # поэтому не перезаписываем его значением, прочитанным ранее
+        if not self._state.adding and kwargs.get("update_fields") is None:
+            kwargs["update_fields"] = [
+                field.name
+                for field in self._meta.concrete_fields
+                if not field.primary_key
+                and not field.generated
+                and field.name != "expenses_total"
+            ]
+        with transaction.atomic(using=kwargs.get("using")):
+            super().save(*args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        with transaction.atomic(using=kwargs.get("using")):
+            return super().delete(*args, **kwargs)
 
     def calculate_benefit(self):
-        return (
-            (self.sale_price or 0)
-            - (self.purchase_price or 0)
-            - sum(expense.amount for expense in self.expenses.all())
-        )
+        return self.benefit
 
     def __str__(self):
         return f"{self.model} ({self.vin})"
 
 
+class ExpenseQuerySet(models.QuerySet):
+    def bulk_create(self, objs, *args, **kwargs):
+        with transaction.atomic(using=self.db):
+            objs = super().bulk_create(objs, *args, **kwargs)
+            vehicle_ids = {expense.vehicle_id for expense in objs}
+            if kwargs.get("ignore_conflicts") or kwargs.get("update_conflicts"):
+                # Неизвестно, какие строки реально вставлены - пересчитываем целиком
+                Vehicle.objects.filter(pk__in=vehicle_ids).recalculate_expenses_total()
+                return objs
+            totals = {}
+            for expense in objs:
+                amount = Expense._meta.get_field("amount").to_python(expense.amount)
+                totals[expense.vehicle_id] = totals.get(expense.vehicle_id, 0) + amount
+            for vehicle_id, amount in totals.items():
+                Vehicle.objects.filter(pk=vehicle_id).update(
+                    expenses_total=F("expenses_total") + amount
+                )
+            owner_ids = Vehicle.objects.filter(pk__in=vehicle_ids).values_list(
+                "owner_id", flat=True
+            )
+            DailyUserRollup.objects.rebuild(set(owner_ids))
+        return objs
+
+    def update(self, **kwargs):
+        if not {"amount", "vehicle", "vehicle_id", "expense_type", "date"} & kwargs.keys():
+            return super().update(**kwargs)
+        with transaction.atomic(using=self.db):
+            vehicle_ids = set(self.values_list("vehicle_id", flat=True))
+            rows = super().update(**kwargs)
+            new_vehicle = kwargs.get("vehicle", kwargs.get("vehicle_id"))
+            if new_vehicle is not None:
+                vehicle_ids.add(getattr(new_vehicle, "pk", new_vehicle))
+            Vehicle.objects.filter(pk__in=vehicle_ids).recalculate_expenses_total()
+        return rows
+
+
 class Expense(SimpleBaseModel):
     REPAID = "repaid"
     DOCUMENTS = "documents"
@@ -134,9 +304,195 @@ class Expense(SimpleBaseModel):
     date = models.DateField(verbose_name="Дата расхода")
     description = models.TextField(blank=True, verbose_name="Описание")
 
+    objects = ExpenseQuerySet.as_manager()
+
     class Meta:
         verbose_name = "Расход"
         verbose_name_plural = "Расходы"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance.remember_state()
+        return instance
+
+    ROLLUP_FIELDS = ["vehicle_id", "amount", "expense_type", "date"]
+
+    def remember_state(self):
+        """Запоминает значения, уже учтённые в Vehicle.expenses_total и DailyUserRollup"""
+        self._saved_state = loaded_state(self, self.ROLLUP_FIELDS)
+
+    def save(self, *args, **kwargs):
+        # Расход и сумма расходов машины меняются в одной транзакции (см. cars.signals)
+        with transaction.atomic(using=kwargs.get("using")):
+            super().save(*args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        with transaction.atomic(using=kwargs.get("using")):
+            return super().delete(*args, **kwargs)
+
     # def __str__(self):
     #     return f"{self.get_expense_type_display()} на {self.vehicle}"
+
+
+class DailyUserRollupQuerySet(models.QuerySet):
+    def lock_owners(self, owner_ids):
+        """
+        Блокирует строки владельцев до конца транзакции: bump и rebuild итогов одного
+        владельца не выполняются параллельно, и пересборка не теряет прибавленное
+        """
+        owners = User.objects.using(self.db).select_for_update(no_key=True)
+        list(owners.filter(pk__in=owner_ids).order_by("pk").values_list("pk", flat=True))
+
+    def bump(self, owner_id, day, **deltas):
+        """Прибавляет значения к итогам владельца за день, создавая строку при необходимости"""
+        deltas = {field: value for field, value in deltas.items() if value}
+        if owner_id is None or day is None or not deltas:
+            return
+        updates = {field: F(field) + value for field, value in deltas.items()}
+        with transaction.atomic(using=self.db):
+            self.lock_owners([owner_id])
+            rows = self.filter(owner_id=owner_id, day=day)
+            if rows.update(**updates, updated_at=timezone.now()):
+                return
+            try:
+                with transaction.atomic(using=self.db):
+                    self.create(owner_id=owner_id, day=day, **deltas)
+            except IntegrityError:
+                # Строку успел создать параллельный запрос
+                rows.update(**updates, updated_at=timezone.now())
+
+    def rebuild(self, owner_ids=None):
+        """Пересчитывает итоги целиком (для всех или указанных владельцев)"""
+        if owner_ids is not None:
+            owner_ids = set(owner_ids)
+            if not owner_ids:
+                return 0
+            count = self._rebuild_owners(owner_ids)
+            invalidate_statistic(*owner_ids)
+            return count
+
+        # Все владельцы - пачками, чтобы не держать блокировки всех пользователей сразу
+        count, last_id = 0, 0
+        users = User.objects.using(self.db).order_by("pk").values_list("pk", flat=True)
+        while chunk := list(users.filter(pk__gt=last_id)[:ROLLUP_REBUILD_CHUNK_SIZE]):
+            count += self._rebuild_owners(set(chunk))
+            last_id = chunk[-1]
+        invalidate_all_statistics()
+        return count
+
+    def _rebuild_owners(self, owner_ids: set) -> int:
+        if not owner_ids:
+            return 0
+        with transaction.atomic(using=self.db):
+            # Итоги читаются и записываются под блокировкой владельцев (см. bump)
+            self.lock_owners(owner_ids)
+            rows = self._build_rows(owner_ids)
+            self.filter(owner_id__in=owner_ids).delete()
+            self.bulk_create(rows, batch_size=1000)
+        return len(rows)
+
+    def _build_rows(self, owner_ids: set) -> list:
+        vehicles = Vehicle.objects.using(self.db).order_by().filter(owner_id__in=owner_ids)
+        expenses = Expense.objects.using(self.db).order_by()
+        expenses = expenses.filter(vehicle__owner_id__in=owner_ids)
+        rows = {}
+
+        def row(owner_id, day):
+            if (owner_id, day) not in rows:
+                rows[owner_id, day] = DailyUserRollup(owner_id=owner_id, day=day)
+            return rows[owner_id, day]
+
+        purchases = (
+            vehicles.filter(purchase_date__isnull=False)
+            .values("owner_id", "purchase_date")
+            .annotate(count=Count("id"), amount=Coalesce(Sum("purchase_price"), ZERO))
+        )
+        for item in purchases:
+            rollup = row(item["owner_id"], item["purchase_date"])
+            rollup.purchases_count = item["count"]
+            rollup.purchases_amount = item["amount"]
+
+        sales = (
+            vehicles.filter(sale_date__isnull=False)
+            .values("owner_id", "sale_date")
+            .annotate(
+                count=Count("id"),
+                amount=Coalesce(Sum("sale_price"), ZERO),
+                benefit_total=Sum("benefit"),
+            )
+        )
+        for item in sales:
+            rollup = row(item["owner_id"], item["sale_date"])
+            rollup.sales_count = item["count"]
+            rollup.sales_amount = item["amount"]
+            rollup.realized_benefit = item["benefit_total"]
+
+        expenses = expenses.values("vehicle__owner_id", "date", "expense_type").annotate(
+            amount=Sum("amount")
+        )
+        for item in expenses:
+            rollup = row(item["vehicle__owner_id"], item["date"])
+            field = DailyUserRollup.expense_field(item["expense_type"])
+            setattr(rollup, field, getattr(rollup, field) + item["amount"])
+
+        return list(rows.values())
+
+
+class DailyUserRollup(SimpleBaseModel):
+    """
+    Итоги пользователя за день: покупки и продажи по дате сделки, расходы по дате
+    расхода, реализованная прибыль по дате продажи.
+
+    Поддерживаются инкрементально сигналами Vehicle/Expense (см. cars.signals),
+    пересобираются командой rebuild_daily_rollups.
+    """
+
+    owner = models.ForeignKey(
+        User, on_delete=models.CASCADE, related_name="daily_rollups", verbose_name="Владелец"
+    )
+    day = models.DateField(verbose_name="День")
+    purchases_count = models.IntegerField(default=0, verbose_name="Куплено машин")
+    purchases_amount = models.DecimalField(
+        max_digits=14, decimal_places=2, default=Decimal("0.00"), verbose_name="Сумма покупок"
+    )
+    sales_count = models.IntegerField(default=0, verbose_name="Продано машин")
+    sales_amount = models.DecimalField(
+        max_digits=14, decimal_places=2, default=Decimal("0.00"), verbose_name="Сумма продаж"
+    )
+    expenses_repaid = models.DecimalField(
+        max_digits=14, decimal_places=2, default=Decimal("0.00"), verbose_name="Ремонт"
+    )
+    expenses_documents = models.DecimalField(
+        max_digits=14, decimal_places=2, default=Decimal("0.00"), verbose_name="Документы"
+    )
+    expenses_delivery = models.DecimalField(
+        max_digits=14, decimal_places=2, default=Decimal("0.00"), verbose_name="Доставка"
+    )
+    expenses_other = models.DecimalField(
+        max_digits=14, decimal_places=2, default=Decimal("0.00"), verbose_name="Прочее"
+    )
+    realized_benefit = models.DecimalField(
+        max_digits=14,
+        decimal_places=2,
+        default=Decimal("0.00"),
+        verbose_name="Реализованная прибыль",
+    )
+
+    objects = DailyUserRollupQuerySet.as_manager()
+
+    class Meta:
+        verbose_name = "Итоги за день"
+        verbose_name_plural = "Итоги по дням"
+        constraints = [
+            models.UniqueConstraint(fields=["owner", "day"], name="daily_rollup_owner_day")
+        ]
+
+    @staticmethod
+    def expense_field(expense_type: str) -> str:
+        if expense_type not in dict(Expense.EXPENSE_TYPES):
+            expense_type = Expense.OTHER
+        return f"expenses_{expense_type}"
+
+    def __str__(self):
+        return f"{self.owner_id}: {self.day}"
@@ -0,0 +1,358 @@
+"""
+Загрузка фотографий машин и их уменьшенных копий.
+
+Файлы пишутся в хранилище параллельно общим для процесса пулом потоков, а строки
+VehiclePhoto и связи с машиной создаются двумя bulk_create. Копии (cars.renditions)
+создаются пулом процессов после коммита загрузки, а недостающие - при первом запросе.
+
+С VEHICLE_PHOTO_CONTENT_ADDRESSED файл хранится под SHA-256 своего содержимого:
+одинаковые фото хранятся один раз и одной строкой VehiclePhoto, а содержимое по
+такому URL никогда не меняется.
+"""
+
+import errno
+import hashlib
+import logging
+import os
+import shutil
+import tempfile
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from django.conf import settings
+from django.core import signing
+from django.core.files.base import ContentFile
+from django.db import connection, transaction
+from django.utils import timezone
+from PIL import Image, UnidentifiedImageError
+from rest_framework.exceptions import ValidationError
+
+from cars.models import Vehicle, VehiclePhoto
+from cars.renditions import RENDITIONS, render, rendition_name
+from cars.statistic_cache import invalidate_statistic
+
+logger = logging.getLogger(__name__)
+
+CONTENT_PREFIX = "photos/vehicle/sha256/"
+RENDITION_TOKEN_SALT = "cars.photos.rendition"
+# Расширения файлов по формату Pillow; остальные форматы - ".<формат>"
+PHOTO_EXTENSIONS = {
+    "JPEG": ".jpg",
+    "MPO": ".jpg",
+    "PNG": ".png",
+    "WEBP": ".webp",
+    "GIF": ".gif",
+}
+
+_executor = None
+_executor_lock = threading.Lock()
+_process_executor = None
+# Копии одного фото создаёт один запрос: остальные дожидаются и находят их готовыми
+_rendition_locks = [threading.Lock() for _ in range(64)]
+
+
+def get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=settings.VEHICLE_PHOTO_UPLOAD_WORKERS,
+                    thread_name_prefix="vehicle-photo",
+                )
+    return _executor
+
+
+def check_photo_limits(files):
+    """Ограничения на одну загрузку: число файлов и их общий размер"""
+    if len(files) > settings.VEHICLE_PHOTO_MAX_COUNT:
+        raise ValidationError(
+            {"photos": f"Не больше {settings.VEHICLE_PHOTO_MAX_COUNT} фотографий за раз."}
+        )
+    total = sum(file.size for file in files)
+    if total > settings.VEHICLE_PHOTO_MAX_TOTAL_BYTES:
+        limit = settings.VEHICLE_PHOTO_MAX_TOTAL_BYTES // (1024 * 1024)
+        raise ValidationError({"photos": f"Общий размер фотографий больше {limit} МБ."})
+
+
+def content_photo_name(content_hash: str, extension: str) -> str:
+    """Путь файла по хэшу содержимого: photos/vehicle/sha256/ab/cd/abcd....jpg"""
+    return f"{CONTENT_PREFIX}{content_hash[:2]}/{content_hash[2:4]}/{content_hash}{extension}"
+
+
+def detect_extension(file) -> str:
+    """Расширение по формату, который определил Pillow, а не по имени от клиента"""
+    try:
+        with Image.open(file) as image:
+            fmt = image.format
+    except (UnidentifiedImageError, OSError):
+        raise ValidationError({"photos": f"Файл {file.name} не является изображением."})
+    finally:
+        file.seek(0)
+    return PHOTO_EXTENSIONS.get(fmt, f".{fmt.lower()}")
+
+
+def save_content_addressed(file) -> tuple[str, str]:
+    """
+    Сохраняет файл под именем из его SHA-256 и возвращает (имя, хэш).
+
+    Файл с тем же содержимым уже лежит по тому же пути, поэтому повторно не пишется.
+    В файловом хранилище хэш считается в том же проходе, что и запись во временный
+    файл вне MEDIA_ROOT (FILE_UPLOAD_TEMP_DIR), который затем переименовывается.
+    """
+    storage = VehiclePhoto._meta.get_field("image").storage
+    extension = detect_extension(file)
+    digest = hashlib.sha256()
+    try:
+        # Есть ли у хранилища локальные пути
+        storage.path(CONTENT_PREFIX)
+    except NotImplementedError:
+        # Хранилище без локальных путей: хэш отдельным проходом, затем обычное сохранение
+        for chunk in file.chunks():
+            digest.update(chunk)
+        file.seek(0)
+        name = content_photo_name(digest.hexdigest(), extension)
+        if not storage.exists(name):
+            storage.save(name, file)
+        return name, digest.hexdigest()
+
+    with tempfile.NamedTemporaryFile(dir=settings.FILE_UPLOAD_TEMP_DIR, delete=False) as tmp:
+        for chunk in file.chunks():
+            digest.update(chunk)
+            tmp.write(chunk)
+    name = content_photo_name(digest.hexdigest(), extension)
+    path = storage.path(name)
+    try:
+        if os.path.exists(path):
+            # Свежая дата изменения не даст gc_media удалить файл, который снова используется
+            os.utime(path)
+        else:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            os.chmod(tmp.name, storage.file_permissions_mode or 0o644)
+            _move_into_place(tmp.name, path)
+    finally:
+        if os.path.exists(tmp.name):
+            os.remove(tmp.name)
+    return name, digest.hexdigest()
+
+
+def _move_into_place(source: str, path: str):
+    """Атомарно кладёт файл по пути path, даже если source на другом разделе"""
+    try:
+        os.replace(source, path)
+    except OSError as error:
+        if error.errno != errno.EXDEV:
+            raise
+        # Копия рядом с целью под случайным именем, затем переименование в том же разделе
+        with tempfile.NamedTemporaryFile(dir=os.path.dirname(path), delete=False) as tmp:
+            with open(source, "rb") as src:
+                shutil.copyfileobj(src, tmp)
+        try:
+            shutil.copymode(source, tmp.name)
+            os.replace(tmp.name, path)
+        except OSError:
+            os.remove(tmp.name)
+            raise
+
+
+def save_photo_file(file) -> tuple[str, str | None]:
+    if settings.VEHICLE_PHOTO_CONTENT_ADDRESSED:
+        return save_content_addressed(file)
+    field = VehiclePhoto._meta.get_field("image")
+    name = field.generate_filename(VehiclePhoto(), file.name)
+    return field.storage.save(name, file, max_length=field.max_length), None
+
+
+def ingest_vehicle_photos(vehicle: Vehicle, files) -> list[VehiclePhoto]:
+    """Сохраняет файлы и привязывает их к машине"""
+    if not files:
+        return []
+    check_photo_limits(files)
+
+    storage = VehiclePhoto._meta.get_field("image").storage
+    futures = [get_executor().submit(save_photo_file, file) for file in files]
+    saved, error = [], None
+    for future in futures:
+        try:
+            saved.append(future.result())
+        except Exception as exc:
+            error = error or exc
+    # Файлы по хэшу могут принадлежать и другим фото - их подберёт gc_media
+    own_files = [name for name, content_hash in saved if content_hash is None]
+    if error is not None:
+        for name in own_files:
+            storage.delete(name)
+        raise error
+
+    try:
+        with transaction.atomic():
+            photos, created = _create_photos(saved)
+            Through = Vehicle.photos.through
+            Through.objects.bulk_create(
+                [Through(vehicle_id=vehicle.pk, vehiclephoto_id=photo.pk) for photo in photos],
+                ignore_conflicts=True,
+            )
+    except Exception:
+        for name in own_files:
+            storage.delete(name)
+        raise
+
+    # bulk_create не отправляет сигналы, которые сбрасывают кэш статистики
+    invalidate_statistic(vehicle.owner_id)
+    transaction.on_commit(lambda: schedule_renditions(created))
+    return photos
+
+
+def _create_photos(saved: list[tuple[str, str | None]]):
+    """
+    Строки VehiclePhoto для сохранённых файлов; фото с известным хэшем переиспользуется.
+    Возвращает (фото в порядке файлов без повторов, новые фото).
+    """
+    plain = {
+        name: VehiclePhoto(image=name) for name, content_hash in saved if not content_hash
+    }
+    VehiclePhoto.objects.bulk_create(plain.values())
+
+    hashes = {content_hash for _, content_hash in saved if content_hash}
+    by_hash, new_hashes = {}, set()
+    if hashes:
+        by_hash = VehiclePhoto.objects.in_bulk(hashes, field_name="content_hash")
+        if by_hash:
+            # Фото без машин gc_media удаляет по updated_at
+            VehiclePhoto.objects.filter(
+                pk__in=[photo.pk for photo in by_hash.values()]
+            ).update(updated_at=timezone.now())
+        new_photos = {}
+        for name, content_hash in saved:
+            if content_hash and content_hash not in by_hash:
+                new_photos.setdefault(
+                    content_hash, VehiclePhoto(image=name, content_hash=content_hash)
+                )
+        if new_photos:
+            # Тот же файл могли параллельно загрузить к другой машине
+            VehiclePhoto.objects.bulk_create(new_photos.values(), ignore_conflicts=True)
+            by_hash = VehiclePhoto.objects.in_bulk(hashes, field_name="content_hash")
+            new_hashes = set(new_photos)
+
+    photos, seen = [], set()
+    for name, content_hash in saved:
+        photo = by_hash[content_hash] if content_hash else plain[name]
+        if photo.pk not in seen:
+            seen.add(photo.pk)
+            photos.append(photo)
+    created = list(plain.values()) + [by_hash[content_hash] for content_hash in new_hashes]
+    return photos, created
+
+
+def get_process_executor() -> ProcessPoolExecutor | None:
+    """Пул процессов для копий или None: при PHOTO_RENDITION_WORKERS = 0 - в текущем потоке"""
+    global _process_executor
+    if settings.PHOTO_RENDITION_WORKERS < 1:
+        return None
+    if _process_executor is None:
+        with _executor_lock:
+            if _process_executor is None:
+                _process_executor = ProcessPoolExecutor(
+                    max_workers=settings.PHOTO_RENDITION_WORKERS
+                )
+    return _process_executor
+
+
+def rendition_token(photo: VehiclePhoto) -> str:
+    """
+    Подписанный идентификатор фото для ссылки на создание копии: ссылка доступна
+    без авторизации, и по подряд идущим pk фото не перебрать
+    """
+    return signing.dumps(photo.pk, salt=RENDITION_TOKEN_SALT)
+
+
+def photo_id_from_token(token: str) -> int | None:
+    try:
+        photo_id = signing.loads(token, salt=RENDITION_TOKEN_SALT)
+    except signing.BadSignature:
+        return None
+    return photo_id if isinstance(photo_id, int) else None
+
+
+def record_renditions(photo: VehiclePhoto, renditions):
+    """Отмечает в строке фото, что копии созданы"""
+    recorded = sorted(set(photo.renditions) | set(renditions))
+    if recorded != photo.renditions:
+        photo.renditions = recorded
+        VehiclePhoto.objects.filter(pk=photo.pk).update(renditions=recorded)
+
+
+def missing_renditions(photo: VehiclePhoto) -> list[str]:
+    """Копии, которых нет в хранилище; найденные там отмечаются в строке фото"""
+    storage = photo.image.storage
+    existing, missing = [], []
+    for rendition in RENDITIONS:
+        if rendition in photo.renditions:
+            continue
+        if storage.exists(rendition_name(photo.image.name, rendition)):
+            existing.append(rendition)
+        else:
+            missing.append(rendition)
+    record_renditions(photo, existing)
+    return missing
+
+
+def save_renditions(photo: VehiclePhoto, rendered: dict[str, bytes], replace: bool = False):
+    storage = photo.image.storage
+    for rendition, content in rendered.items():
+        name = rendition_name(photo.image.name, rendition)
+        if replace:
+            storage.delete(name)
+        saved = storage.save(name, ContentFile(content))
+        if saved != name:
+            # Копию уже сохранил параллельный запрос - хранилище выбрало другое имя
+            storage.delete(saved)
+    record_renditions(photo, rendered)
+
+
+def read_original(photo: VehiclePhoto) -> bytes:
+    with photo.image.storage.open(photo.image.name, "rb") as file:
+        return file.read()
+
+
+def rendition_lock(photo: VehiclePhoto) -> threading.Lock:
+    return _rendition_locks[photo.pk % len(_rendition_locks)]
+
+
+def generate_renditions(photo: VehiclePhoto, renditions: list[str] | None = None):
+    """Создаёт копии и ждёт их сохранения"""
+    renditions = missing_renditions(photo) if renditions is None else renditions
+    if not renditions:
+        return
+    data = read_original(photo)
+    executor = get_process_executor()
+    if executor is None:
+        rendered = render(data, renditions)
+    else:
+        rendered = executor.submit(render, data, renditions).result()
+    save_renditions(photo, rendered)
+
+
+def schedule_renditions(photos: list[VehiclePhoto]):
+    """Ставит создание копий в пул процессов, не дожидаясь результата"""
+    executor = get_process_executor()
+    for photo in photos:
+        try:
+            if executor is None:
+                generate_renditions(photo, list(RENDITIONS))
+                continue
+            future = executor.submit(render, read_original(photo), list(RENDITIONS))
+            future.add_done_callback(lambda future, photo=photo: _save_rendered(photo, future))
+        except Exception:
+            logger.exception("Не удалось создать копии фото %s", photo.pk)
+
+
+def _save_rendered(photo: VehiclePhoto, future):
+    try:
+        save_renditions(photo, future.result())
+    except Exception:
+        # Недостающие копии создадутся при первом запросе
+        logger.exception("Не удалось создать копии фото %s", photo.pk)
+    finally:
+        # Колбэк выполняется в служебном потоке пула процессов
+        connection.close()
@@ -0,0 +1,47 @@
+"""
+Уменьшенные копии фотографий машин.
+
+Модуль не зависит от Django: функции выполняются в пуле процессов и получают
+и возвращают только байты.
+"""
+
+import io
+
+from PIL import Image, ImageOps
+
+# Имя -> (наибольшая сторона, формат, расширение)
+RENDITIONS = {
+    "thumb": (320, "JPEG", "jpg"),
+    "medium": (1280, "JPEG", "jpg"),
+    "thumb_webp": (320, "WEBP", "webp"),
+    "medium_webp": (1280, "WEBP", "webp"),
+}
+QUALITY = 82
+
+
+def rendition_name(original: str, rendition: str) -> str:
+    """Путь копии рядом с оригиналом: photos/car.jpg -> photos/car.thumb.jpg"""
+    _, _, extension = RENDITIONS[rendition]
+    stem = original.rsplit(".", 1)[0] if "." in original.rsplit("/", 1)[-1] else original
+    return f"{stem}.{rendition}.{extension}"
+
+
+def render(data: bytes, renditions: list[str]) -> dict[str, bytes]:
+    """Все запрошенные копии одного изображения; оригинал декодируется один раз"""
+    with Image.open(io.BytesIO(data)) as source:
+        # Фото с телефонов часто повёрнуты через EXIF
+        image = ImageOps.exif_transpose(source)
+        if image.mode not in ("RGB", "L"):
+            image = image.convert("RGB")
+        image.load()
+
+    result = {}
+    # От большей копии к меньшей: каждая следующая уменьшается из предыдущей
+    for rendition in sorted(renditions, key=lambda name: -RENDITIONS[name][0]):
+        size, fmt, _ = RENDITIONS[rendition]
+        image = image.copy()
+        image.thumbnail((size, size), Image.Resampling.LANCZOS)
+        buffer = io.BytesIO()
+        image.save(buffer, format=fmt, quality=QUALITY, optimize=fmt == "JPEG")
+        result[rendition] = buffer.getvalue()
+    return result
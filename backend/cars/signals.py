@@ -0,0 +1,211 @@
+from django.db import transaction
+from django.db.models import F, QuerySet
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from cars.catalog import invalidate_catalog
+from cars.models import CarBrand, CarModel, DailyUserRollup, Expense, Vehicle, VehiclePhoto
+from cars.statistic_cache import invalidate_statistic
+from users.models import User
+
+
+def _amount(value):
+    return Expense._meta.get_field("amount").to_python(value) or 0
+
+
+def _date(value):
+    return Expense._meta.get_field("date").to_python(value)
+
+
+def _add_to_expenses_total(vehicle_id, amount):
+    if vehicle_id is None or not amount:
+        return
+    Vehicle.objects.filter(pk=vehicle_id).update(expenses_total=F("expenses_total") + amount)
+
+
+def _current_state(instance):
+    return {field: getattr(instance, field) for field in instance.ROLLUP_FIELDS}
+
+
+def _deleted_with_owner(origin) -> bool:
+    """Удаление начато с пользователя - его итоги удаляются вместе с ним"""
+    model = origin.model if isinstance(origin, QuerySet) else type(origin)
+    return model is User
+
+
+def _add_deltas(deltas: dict, contributions, sign: int):
+    for (owner_id, day), values in contributions:
+        row = deltas.setdefault((owner_id, day), {})
+        for field, value in values.items():
+            row[field] = row.get(field, 0) + sign * value
+
+
+def _apply_deltas(deltas: dict):
+    for (owner_id, day), values in deltas.items():
+        DailyUserRollup.objects.bump(owner_id, day, **values)
+
+
+def vehicle_contributions(state: dict, expenses_total):
+    """Вклад машины в дневные итоги: покупка, продажа и реализованная прибыль"""
+    purchase_price = _amount(state["purchase_price"])
+    sale_price = _amount(state["sale_price"])
+    if state["purchase_date"]:
+        yield (state["owner_id"], _date(state["purchase_date"])), {
+            "purchases_count": 1,
+            "purchases_amount": purchase_price,
+        }
+    if state["sale_date"]:
+        yield (state["owner_id"], _date(state["sale_date"])), {
+            "sales_count": 1,
+            "sales_amount": sale_price,
+            "realized_benefit": sale_price - purchase_price - expenses_total,
+        }
+
+
+def expense_contributions(state: dict, vehicles: dict):
+    """Вклад расхода: сумма по типу в день расхода и уменьшение прибыли в день продажи"""
+    if state["vehicle_id"] not in vehicles:
+        return
+    owner_id, sale_date = vehicles[state["vehicle_id"]]
+    amount = _amount(state["amount"])
+    field = DailyUserRollup.expense_field(state["expense_type"])
+    yield (owner_id, _date(state["date"])), {field: amount}
+    if sale_date:
+        yield (owner_id, sale_date), {"realized_benefit": -amount}
+
+
+@receiver(post_save, sender=Expense)
+def update_totals_on_expense_save(sender, instance: Expense, created, raw, **kwargs):
+    """Переносит изменение расхода в Vehicle.expenses_total и DailyUserRollup"""
+    if raw:
+        return
+    old_state = None if created else instance._saved_state
+    instance.remember_state()
+    new_state = instance._saved_state
+
+    if new_state is None or (not created and old_state is None):
+        # Прежние значения неизвестны (объект создан не из БД) - пересчитываем
+        Vehicle.objects.filter(pk=instance.vehicle_id).recalculate_expenses_total()
+        return
+
+    if old_state and old_state["vehicle_id"] == new_state["vehicle_id"]:
+        amount = _amount(new_state["amount"]) - _amount(old_state["amount"])
+        _add_to_expenses_total(new_state["vehicle_id"], amount)
+    else:
+        if old_state:
+            _add_to_expenses_total(old_state["vehicle_id"], -_amount(old_state["amount"]))
+        _add_to_expenses_total(new_state["vehicle_id"], _amount(new_state["amount"]))
+
+    vehicle_ids = {new_state["vehicle_id"], old_state and old_state["vehicle_id"]}
+    vehicles = {
+        vehicle_id: (owner_id, sale_date)
+        for vehicle_id, owner_id, sale_date in Vehicle.objects.filter(
+            pk__in=vehicle_ids - {None}
+        ).values_list("id", "owner_id", "sale_date")
+    }
+    deltas = {}
+    if old_state:
+        _add_deltas(deltas, expense_contributions(old_state, vehicles), -1)
+    _add_deltas(deltas, expense_contributions(new_state, vehicles), 1)
+    _apply_deltas(deltas)
+
+
+@receiver(post_delete, sender=Expense)
+def update_totals_on_expense_delete(sender, instance: Expense, origin=None, **kwargs):
+    if _deleted_with_owner(origin):
+        return
+    state = getattr(instance, "_saved_state", None) or _current_state(instance)
+    _add_to_expenses_total(state["vehicle_id"], -_amount(state["amount"]))
+
+    vehicles = {
+        vehicle_id: (owner_id, sale_date)
+        for vehicle_id, owner_id, sale_date in Vehicle.objects.filter(
+            pk=state["vehicle_id"]
+        ).values_list("id", "owner_id", "sale_date")
+    }
+    deltas = {}
+    _add_deltas(deltas, expense_contributions(state, vehicles), -1)
+    _apply_deltas(deltas)
+
+
+@receiver(post_save, sender=Vehicle)
+def update_rollups_on_vehicle_save(sender, instance: Vehicle, created, raw, **kwargs):
+    if raw:
+        return
+    old_state = None if created else instance._saved_state
+    instance.remember_state()
+    new_state = instance._saved_state
+
+    if new_state is None or (not created and old_state is None):
+        DailyUserRollup.objects.rebuild({instance.owner_id})
+        return
+    if old_state == new_state:
+        return
+
+    # У новой машины расходов нет; у существующей берём актуальную сумму из БД
+    expenses_total = 0
+    if not created and (old_state["sale_date"] or new_state["sale_date"]):
+        expenses_total = (
+            Vehicle.objects.filter(pk=instance.pk)
+            .values_list("expenses_total", flat=True)
+            .first()
+        ) or 0
+
+    deltas = {}
+    if old_state:
+        _add_deltas(deltas, vehicle_contributions(old_state, expenses_total), -1)
+    _add_deltas(deltas, vehicle_contributions(new_state, expenses_total), 1)
+    _apply_deltas(deltas)
+
+
+@receiver(post_delete, sender=Vehicle)
+def update_rollups_on_vehicle_delete(sender, instance: Vehicle, origin=None, **kwargs):
+    if _deleted_with_owner(origin):
+        return
+    # Расходы машины удаляются каскадом раньше неё и уже вычтены своими сигналами,
+    # поэтому прибыль считаем без расходов
+    state = getattr(instance, "_saved_state", None) or _current_state(instance)
+    deltas = {}
+    _add_deltas(deltas, vehicle_contributions(state, 0), -1)
+    _apply_deltas(deltas)
+
+
+@receiver(post_save, sender=Vehicle)
+@receiver(post_delete, sender=Vehicle)
+def invalidate_statistic_on_vehicle_change(sender, instance: Vehicle, **kwargs):
+    invalidate_statistic(instance.owner_id)
+
+
+@receiver(post_save, sender=Expense)
+@receiver(post_delete, sender=Expense)
+def invalidate_statistic_on_expense_change(sender, instance: Expense, **kwargs):
+    invalidate_statistic(
+        *Vehicle.objects.filter(pk=instance.vehicle_id).values_list("owner_id", flat=True)
+    )
+
+
+@receiver(post_save, sender=VehiclePhoto)
+@receiver(pre_delete, sender=VehiclePhoto)
+def invalidate_statistic_on_photo_change(sender, instance: VehiclePhoto, **kwargs):
+    invalidate_statistic(*instance.vehicles.values_list("owner_id", flat=True))
+
+
+@receiver(m2m_changed, sender=Vehicle.photos.through)
+def invalidate_statistic_on_photos_change(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ("post_add", "post_remove", "pre_clear"):
+        return
+    if not reverse:
+        invalidate_statistic(instance.owner_id)
+        return
+    vehicles = Vehicle.objects.filter(pk__in=pk_set) if pk_set else instance.vehicles.all()
+    invalidate_statistic(*vehicles.values_list("owner_id", flat=True))
+
+
+@receiver(post_save, sender=CarBrand)
+@receiver(post_delete, sender=CarBrand)
+@receiver(post_save, sender=CarModel)
+@receiver(post_delete, sender=CarModel)
+def invalidate_catalog_on_change(sender, **kwargs):
+    invalidate_catalog()
+    # Параллельный запрос мог закэшировать справочник до коммита - сбрасываем ещё раз
+    transaction.on_commit(invalidate_catalog)
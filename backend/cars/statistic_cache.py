@@ -0,0 +1,101 @@
+"""
+Кэш ответа /api/cars/statistic/ по пользователям.
+
+Ключ записи включает версию пользователя, которую сигналы Vehicle/Expense/VehiclePhoto
+увеличивают при каждом изменении (сразу и после коммита), и общее поколение, которое
+сбрасывается при полной пересборке итогов. Старые записи не удаляются, а просто перестают читаться и
+вытесняются по TTL.
+"""
+
+import hashlib
+import json
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+GENERATION_KEY = "cars:statistic:generation"
+VERSION_KEY = "cars:statistic:version:{user_id}"
+DATA_KEY = "cars:statistic:data:{user_id}:{generation}:{version}:{params}"
+HITS_KEY = "cars:statistic:hits"
+MISSES_KEY = "cars:statistic:misses"
+
+
+def _incr(key: str):
+    try:
+        return cache.incr(key)
+    except ValueError:
+        # Ключ вытеснен или ещё не создан. Начинаем с текущего времени, чтобы
+        # новая версия не совпала ни с одной из прежних
+        value = time.time_ns()
+        cache.set(key, value, timeout=None)
+        return value
+
+
+def _versions(user_id) -> tuple:
+    version_key = VERSION_KEY.format(user_id=user_id)
+    values = cache.get_many([GENERATION_KEY, version_key])
+    generation = values.get(GENERATION_KEY) or _incr(GENERATION_KEY)
+    version = values.get(version_key) or _incr(version_key)
+    return generation, version
+
+
+def _data_key(user_id, params: dict) -> str:
+    generation, version = _versions(user_id)
+    raw = json.dumps(params, sort_keys=True, default=str).encode()
+    return DATA_KEY.format(
+        user_id=user_id,
+        generation=generation,
+        version=version,
+        params=hashlib.md5(raw).hexdigest(),
+    )
+
+
+def get_statistic(user_id, params: dict):
+    """Закэшированная статистика или None"""
+    data = cache.get(_data_key(user_id, params))
+    _count(HITS_KEY if data is not None else MISSES_KEY)
+    return data
+
+
+def set_statistic(user_id, params: dict, data):
+    cache.set(_data_key(user_id, params), data, timeout=settings.STATISTIC_CACHE_TTL)
+
+
+def _bump_versions(user_ids):
+    for user_id in user_ids:
+        _incr(VERSION_KEY.format(user_id=user_id))
+
+
+def invalidate_statistic(*user_ids):
+    user_ids = set(user_ids) - {None}
+    _bump_versions(user_ids)
+    # Параллельный запрос до коммита видит старые строки и мог закэшировать их
+    # под новой версией - сбрасываем ещё раз после коммита
+    transaction.on_commit(lambda: _bump_versions(user_ids))
+
+
+def invalidate_all_statistics():
+    _incr(GENERATION_KEY)
+    transaction.on_commit(lambda: _incr(GENERATION_KEY))
+
+
+def _count(key: str):
+    if cache.add(key, 1, timeout=None):
+        return
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, 1, timeout=None)
+
+
+def statistic_cache_stats() -> dict:
+    values = cache.get_many([HITS_KEY, MISSES_KEY])
+    hits, misses = values.get(HITS_KEY, 0), values.get(MISSES_KEY, 0)
+    return {
+        "hits": hits,
+        "misses": misses,
+        "hit_ratio": hits / (hits + misses) if hits + misses else None,
+        "ttl": settings.STATISTIC_CACHE_TTL,
+    }
@@ -0,0 +1,323 @@
+"""
+Автодополнение названий марок и моделей.
+
+Индекс - префиксное дерево в памяти процесса. Названия приводятся к нижнему
+регистру и латинице (кириллица транслитерируется), поэтому "тойота" находит
+"Toyota", а "лада" - "Лада". Каждое слово названия индексируется отдельно:
+"rover" находит "Land Rover". В каждом узле хранится top-k лучших записей
+поддерева, так что ответ на запрос - это спуск по дереву на длину запроса.
+
+Индекс синхронизируется со справочником (cars.catalog) при смене его версии:
+добавляются и удаляются только изменившиеся записи.
+"""
+
+import gc
+import heapq
+import itertools
+import re
+import threading
+
+from django.conf import settings
+
+from cars.catalog import get_catalog
+
+BRAND = "brand"
+MODEL = "model"
+# При большем числе изменений top пересчитывается один раз для всего дерева
+BULK_SYNC_THRESHOLD = 1000
+
+TRANSLIT = str.maketrans(
+    {
+        "а": "a",
+        "б": "b",
+        "в": "v",
+        "г": "g",
+        "д": "d",
+        "е": "e",
+        "ё": "e",
+        "ж": "zh",
+        "з": "z",
+        "и": "i",
+        "й": "y",
+        "к": "k",
+        "л": "l",
+        "м": "m",
+        "н": "n",
+        "о": "o",
+        "п": "p",
+        "р": "r",
+        "с": "s",
+        "т": "t",
+        "у": "u",
+        "ф": "f",
+        "х": "kh",
+        "ц": "ts",
+        "ч": "ch",
+        "ш": "sh",
+        "щ": "shch",
+        "ъ": "",
+        "ы": "y",
+        "ь": "",
+        "э": "e",
+        "ю": "yu",
+        "я": "ya",
+    }
+)
+SEPARATORS = re.compile(r"[^0-9a-z]+")
+
+
+def normalize(text: str) -> str:
+    """Нижний регистр, транслитерация и единственный пробел между словами"""
+    return " ".join(SEPARATORS.split(text.casefold().translate(TRANSLIT))).strip()
+
+
+def index_keys(name: str) -> set[str]:
+    """Ключи записи: полное название и его хвосты, начинающиеся с каждого слова"""
+    words = normalize(name).split()
+    return {" ".join(words[index:]) for index in range(len(words))}
+
+
+class _Node:
+    __slots__ = ("children", "entries", "top")
+
+    def __init__(self):
+        self.children = {}
+        self.entries = None  # записи, ключ которых заканчивается в этом узле
+        self.top = []  # лучшие записи поддерева, отсортированные
+
+
+class PrefixTrie:
+    """Префиксное дерево с top-k записей поддерева в каждом узле"""
+
+    def __init__(self, k: int):
+        self.k = k
+        self.root = _Node()
+
+    def add(self, key: str, entry: tuple, refresh: bool = True):
+        path = self._path(key, create=True)
+        if path[-1].entries is None:
+            path[-1].entries = set()
+        path[-1].entries.add(entry)
+        if refresh:
+            self._refresh(reversed(path))
+
+    def remove(self, key: str, entry: tuple, refresh: bool = True):
+        path = self._path(key, create=False)
+        if path is None:
+            return
+        if path[-1].entries:
+            path[-1].entries.discard(entry)
+        if refresh:
+            self._refresh(reversed(path))
+        # Удаляем опустевшие узлы снизу вверх
+        for depth in range(len(key), 0, -1):
+            node = path[depth]
+            if node.entries or node.children:
+                break
+            del path[depth - 1].children[key[depth - 1]]
+
+    def search(self, prefix: str) -> list[tuple]:
+        node = self.root
+        for char in prefix:
+            node = node.children.get(char)
+            if node is None:
+                return []
+        return node.top
+
+    def fuzzy_search(self, prefix: str, max_distance: int = 1) -> list[tuple]:
+        """Записи, у которых начало ключа отличается от prefix не больше чем на max_distance"""
+        found = []
+        first_row = list(range(len(prefix) + 1))
+        stack = [(child, char, first_row) for char, child in self.root.children.items()]
+        while stack:
+            node, char, previous = stack.pop()
+            row = [previous[0] + 1]
+            for column in range(1, len(prefix) + 1):
+                row.append(
+                    min(
+                        row[column - 1] + 1,
+                        previous[column] + 1,
+                        previous[column - 1] + (prefix[column - 1] != char),
+                    )
+                )
+            if row[-1] <= max_distance:
+                found.append(node.top)
+            elif min(row) <= max_distance:
+                stack.extend((child, key, row) for key, child in node.children.items())
+        return list(heapq.merge(*found))
+
+    def _path(self, key: str, create: bool):
+        node = self.root
+        path = [node]
+        for char in key:
+            child = node.children.get(char)
+            if child is None:
+                if not create:
+                    return None
+                child = node.children[char] = _Node()
+            node = child
+            path.append(node)
+        return path
+
+    def refresh_all(self):
+        """Пересчитывает top всех узлов после изменений с refresh=False"""
+        order, stack = [], [self.root]
+        while stack:
+            node = stack.pop()
+            order.append(node)
+            stack.extend(node.children.values())
+        self._refresh(reversed(order))
+
+    def _refresh(self, nodes):
+        """Пересчитывает top узлов; дети должны идти раньше родителей"""
+        for node in nodes:
+            # Частые случаи в разреженном дереве: лист и узел с единственным ребёнком
+            if not node.children:
+                node.top = sorted(node.entries)[: self.k] if node.entries else []
+                continue
+            if not node.entries and len(node.children) == 1:
+                node.top = next(iter(node.children.values())).top
+                continue
+            candidates = heapq.merge(
+                sorted(node.entries or ()), *(child.top for child in node.children.values())
+            )
+            top = []
+            for entry in candidates:
+                if not top or top[-1] != entry:
+                    top.append(entry)
+                if len(top) == self.k:
+                    break
+            node.top = top
+
+
+class SuggestIndex:
+    """Индексы марок, всех моделей и моделей каждой марки"""
+
+    def __init__(self, k: int):
+        self.k = k
+        self.version = None
+        self.brands = PrefixTrie(k)
+        self.models = PrefixTrie(k)
+        self.models_by_brand = {}
+        self.items = {}  # (тип, id) -> строка справочника
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_entry(kind: str, pk: int, name: str) -> tuple:
+        # Порядок выдачи: короткие названия выше, затем по алфавиту
+        return (len(name), name.casefold(), kind, pk)
+
+    def sync(self, version, brands: list[tuple], models: list[tuple]):
+        """Приводит индекс к строкам справочника, меняя только разошедшиеся записи"""
+        with self._lock:
+            if version == self.version:
+                return
+            rows = {(BRAND, pk): (pk, name, None) for pk, name in brands}
+            rows.update({(MODEL, pk): (pk, name, brand_id) for pk, brand_id, name in models})
+            removed = [(key, row) for key, row in self.items.items() if rows.get(key) != row]
+            changed = {key for key, _ in removed}
+            added = [
+                (key, row)
+                for key, row in rows.items()
+                if key not in self.items or key in changed
+            ]
+            refresh = len(removed) + len(added) <= BULK_SYNC_THRESHOLD
+            # Сборщик мусора на каждом поколении обходил бы миллионы новых узлов
+            gc_enabled = gc.isenabled()
+            if not refresh:
+                gc.disable()
+            try:
+                for key, row in removed:
+                    self._remove(key[0], row, refresh)
+                for key, row in added:
+                    self._add(key[0], row, refresh)
+                if not refresh:
+                    for trie in [self.brands, self.models, *self.models_by_brand.values()]:
+                        trie.refresh_all()
+            finally:
+                if gc_enabled:
+                    gc.enable()
+            self.version = version
+
+    def _tries(self, kind: str, brand_id):
+        if kind == BRAND:
+            return [self.brands]
+        if brand_id not in self.models_by_brand:
+            self.models_by_brand[brand_id] = PrefixTrie(self.k)
+        return [self.models, self.models_by_brand[brand_id]]
+
+    def _add(self, kind: str, row: tuple, refresh: bool = True):
+        pk, name, brand_id = row
+        entry = self.make_entry(kind, pk, name)
+        for trie in self._tries(kind, brand_id):
+            for key in index_keys(name):
+                trie.add(key, entry, refresh)
+        self.items[(kind, pk)] = row
+
+    def _remove(self, kind: str, row: tuple, refresh: bool = True):
+        pk, name, brand_id = row
+        entry = self.make_entry(kind, pk, name)
+        for trie in self._tries(kind, brand_id):
+            for key in index_keys(name):
+                trie.remove(key, entry, refresh)
+        del self.items[(kind, pk)]
+
+    def suggest(self, query: str, brand_id: int | None = None, limit: int | None = None):
+        limit = max(min(limit or self.k, self.k), 1)
+        prefix = normalize(query)
+        if not prefix:
+            return []
+        with self._lock:
+            return self._suggest(prefix, brand_id, limit)
+
+    def _suggest(self, prefix: str, brand_id: int | None, limit: int) -> list[dict]:
+        if brand_id is not None:
+            tries = [self.models_by_brand.get(brand_id, PrefixTrie(self.k))]
+            # Моделей одной марки немного - опечатки ищем среди них
+            fuzzy_tries = tries
+        else:
+            tries = [self.brands, self.models]
+            # Обход с опечаткой по всем моделям слишком дорог, ищем только среди марок
+            fuzzy_tries = [self.brands]
+
+        entries = self._top(heapq.merge(*(trie.search(prefix) for trie in tries)), limit)
+        if len(entries) < limit and len(prefix) >= settings.CATALOG_SUGGEST_FUZZY_MIN_LENGTH:
+            # Совпадения с опечаткой идут после точных
+            fuzzy = heapq.merge(*(trie.fuzzy_search(prefix) for trie in fuzzy_tries))
+            entries = self._top(itertools.chain(entries, fuzzy), limit)
+        return [self._serialize(entry) for entry in entries]
+
+    @staticmethod
+    def _top(entries, limit: int) -> list[tuple]:
+        top = []
+        for entry in entries:
+            if entry not in top:
+                top.append(entry)
+            if len(top) == limit:
+                break
+        return top
+
+    def _serialize(self, entry: tuple) -> dict:
+        kind, pk = entry[2], entry[3]
+        _, name, brand_id = self.items[(kind, pk)]
+        item = {"type": kind, "id": pk, "name": name}
+        if kind == MODEL:
+            item["brand_id"] = brand_id
+        return item
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_suggest_index() -> SuggestIndex:
+    """Индекс процесса, синхронизированный с текущей версией справочника"""
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                _index = SuggestIndex(settings.CATALOG_SUGGEST_LIMIT)
+    catalog = get_catalog()
+    if _index.version != catalog.version:
+        _index.sync(catalog.version, catalog.brands, catalog.models)
+    return _index
@@ -0,0 +1,84 @@
+"""
+Асинхронные представления API.
+
+DRF не поддерживает async-обработчики, поэтому AsyncAPIView - обычное
+асинхронное представление Django с тем же поведением, что и у APIView:
+JWT-аутентификация (users.authentication), права из permission_classes, ошибки
+APIException в виде JSON и ответ через JSONRenderer. request.query_params - это
+request.GET, чтобы фильтры и пагинация были общими с синхронными представлениями.
+
+Под WSGI такое представление тоже работает, но каждый запрос выполняется в своём
+цикле событий; выигрыш даёт только ASGI-сервер (backend.asgi).
+"""
+
+from django.contrib.auth.models import AnonymousUser
+from django.core.exceptions import PermissionDenied
+from django.http import Http404, HttpResponse
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework import exceptions
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.renderers import JSONRenderer
+
+from users.authentication import CachedJWTAuthentication
+
+
+class AsyncAPIView(View):
+    permission_classes = [IsAuthenticated]
+    # Как у APIView: нужен только id пользователя (users.authentication)
+    token_user = False
+    renderer = JSONRenderer()
+
+    @classmethod
+    def as_view(cls, **initkwargs):
+        # Как и APIView: аутентификация по токену, а не по сессии
+        return csrf_exempt(super().as_view(**initkwargs))
+
+    async def dispatch(self, request, *args, **kwargs):
+        request.query_params = request.GET
+        self.authenticator = CachedJWTAuthentication()
+        try:
+            await self.perform_authentication(request)
+            self.check_permissions(request)
+            method = request.method.lower()
+            handler = getattr(self, method, None) if method in self.http_method_names else None
+            if handler is None:
+                raise exceptions.MethodNotAllowed(request.method)
+            return await handler(request, *args, **kwargs)
+        except Exception as exc:
+            return self.handle_exception(request, exc)
+
+    async def perform_authentication(self, request):
+        request.user, request.auth = AnonymousUser(), None
+        result = await self.authenticator.aauthenticate(request, view=self)
+        if result is not None:
+            request.user, request.auth = result
+
+    def check_permissions(self, request):
+        for permission in [permission() for permission in self.permission_classes]:
+            if not permission.has_permission(request, self):
+                if request.auth is None:
+                    raise exceptions.NotAuthenticated()
+                raise exceptions.PermissionDenied(getattr(permission, "message", None))
+
+    def handle_exception(self, request, exc) -> HttpResponse:
+        if isinstance(exc, Http404):
+            exc = exceptions.NotFound()
+        elif isinstance(exc, PermissionDenied):
+            exc = exceptions.PermissionDenied()
+        if not isinstance(exc, exceptions.APIException):
+            raise exc
+        detail = exc.detail
+        data = detail if isinstance(detail, (list, dict)) else {"detail": detail}
+        response = self.render(data, status=exc.status_code)
+        if isinstance(exc, (exceptions.NotAuthenticated, exceptions.AuthenticationFailed)):
+            response["WWW-Authenticate"] = self.authenticator.authenticate_header(request)
+        return response
+
+    def render(self, data, status=200, headers=None) -> HttpResponse:
+        return HttpResponse(
+            self.renderer.render(data),
+            status=status,
+            headers=headers,
+            content_type="application/json",
+        )
@@ -0,0 +1,186 @@
+"""
+Генераторы первичных ключей для моделей на основе common.models.AbstractModel.
+
+Алгоритм задаётся настройкой ID_ALLOCATOR (путь к классу):
+
+* HiLoIdAllocator - резервирует в таблице IdSequence блоки по ID_BLOCK_SIZE значений
+  и раздаёт их из памяти процесса: один запрос к БД на блок вместо запроса на вставку;
+* SnowflakeIdAllocator - упорядоченные по времени 63-битные ID без обращений к БД.
+"""
+
+import os
+import threading
+import time
+from contextlib import nullcontext
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, IntegrityError, connections, transaction
+from django.db.models import Max
+from django.utils.module_loading import import_string
+
+
+class IdAllocator:
+    def allocate(self, model) -> int:
+        raise NotImplementedError
+
+
+class _Block:
+    """Зарезервированный полуинтервал [next, stop)"""
+
+    def __init__(self, start: int, stop: int, connection=None):
+        self.next, self.stop = start, stop
+        # SQLite: блок зарезервирован в транзакции вызывающего кода и действителен,
+        # только пока она не откатилась
+        self.connection = connection
+        self.pending = connection is not None and connection.in_atomic_block
+        if self.pending:
+            transaction.on_commit(self.confirm, using=connection.alias)
+
+    def confirm(self):
+        self.pending = False
+
+    def is_valid(self) -> bool:
+        if self.next >= self.stop:
+            return False
+        if not self.pending:
+            return True
+        # Откат транзакции или savepoint отбрасывает зарегистрированные в ней on_commit
+        return any(entry[1] == self.confirm for entry in self.connection.run_on_commit)
+
+
+class HiLoIdAllocator(IdAllocator):
+    """
+    Hi/lo-генератор: "hi" - блок, зарезервированный в IdSequence, "lo" - счётчик в памяти.
+
+    Блок резервируется одним UPDATE ... RETURNING на отдельном соединении в режиме
+    autocommit, поэтому откат транзакции, в которой создаётся объект, не возвращает
+    блок в оборот и не приводит к повторной выдаче тех же ID другим процессам,
+    а блокировка строки IdSequence не держится до конца чужой транзакции.
+
+    На SQLite (только для разработки) отдельное соединение заблокировалось бы
+    транзакцией текущего, поэтому блок резервируется в ней же и отбрасывается,
+    если она откатилась.
+    """
+
+    def __init__(self, block_size: int | None = None, using: str = DEFAULT_DB_ALIAS):
+        self.block_size = block_size or settings.ID_BLOCK_SIZE
+        self.using = using
+        self._lock = threading.Lock()
+        self._blocks = {}
+        self._connection = None
+
+    def allocate(self, model) -> int:
+        name = model._meta.label_lower
+        with self._lock:
+            block = self._blocks.get(name)
+            if block is None or not block.is_valid():
+                block = self._blocks[name] = self._reserve(model)
+            value = block.next
+            block.next += 1
+            return value
+
+    def _reserve(self, model) -> _Block:
+        """Резервирует следующий блок"""
+        from common.models import IdSequence
+
+        name = model._meta.label_lower
+        connection = self._get_connection()
+        shared = connection is connections[self.using]
+        table = connection.ops.quote_name(IdSequence._meta.db_table)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"UPDATE {table} SET next_value = next_value + %s WHERE name = %s"
+                " RETURNING next_value",
+                [self.block_size, name],
+            )
+            row = cursor.fetchone()
+        if row is not None:
+            return _Block(row[0] - self.block_size, row[0], connection if shared else None)
+
+        # Первый блок модели начинается после уже существующих записей
+        max_id = model._base_manager.using(self.using).aggregate(max_id=Max("pk"))["max_id"]
+        start = (max_id or 0) + 1
+        try:
+            # Savepoint нужен, только если вставка идёт в транзакции вызывающего кода
+            with transaction.atomic(using=self.using) if shared else nullcontext():
+                with connection.cursor() as cursor:
+                    cursor.execute(
+                        f"INSERT INTO {table} (name, next_value) VALUES (%s, %s)",
+                        [name, start + self.block_size],
+                    )
+        except IntegrityError:
+            # Последовательность создал другой процесс
+            return self._reserve(model)
+        return _Block(start, start + self.block_size, connection if shared else None)
+
+    def _get_connection(self):
+        connection = connections[self.using]
+        if connection.vendor == "sqlite":
+            return connection
+        if self._connection is None:
+            # Своё соединение в режиме autocommit: ORM с using() попал бы в
+            # соединение вызывающего кода, у которого тот же alias
+            self._connection = connections.create_connection(self.using)
+            self._connection.inc_thread_sharing()
+        self._connection.close_if_unusable_or_obsolete()
+        return self._connection
+
+
+class SnowflakeIdAllocator(IdAllocator):
+    """
+    ID в стиле Snowflake: 41 бит миллисекунд от EPOCH, 10 бит номера воркера
+    (SNOWFLAKE_WORKER_ID) и 12 бит счётчика внутри миллисекунды.
+
+    Значения больше 2**53, поэтому в JSON их нужно отдавать строками.
+    """
+
+    EPOCH = 1704067200000  # 2024-01-01 00:00:00 UTC
+    WORKER_BITS = 10
+    SEQUENCE_BITS = 12
+
+    def __init__(self, worker_id: int | None = None):
+        if worker_id is None:
+            worker_id = settings.SNOWFLAKE_WORKER_ID
+        if worker_id is None:
+            worker_id = os.getpid()
+        self.worker_id = worker_id % (1 << self.WORKER_BITS)
+        self._lock = threading.Lock()
+        self._last_timestamp = -1
+        self._sequence = 0
+
+    def allocate(self, model) -> int:
+        with self._lock:
+            timestamp = self._now()
+            if timestamp < self._last_timestamp:
+                # Часы ушли назад - продолжаем с последней выданной миллисекунды
+                timestamp = self._last_timestamp
+            if timestamp == self._last_timestamp:
+                self._sequence = (self._sequence + 1) & ((1 << self.SEQUENCE_BITS) - 1)
+                if self._sequence == 0:
+                    while timestamp <= self._last_timestamp:
+                        timestamp = self._now()
+            else:
+                self._sequence = 0
+            self._last_timestamp = timestamp
+            return (
+                (timestamp - self.EPOCH) << (self.WORKER_BITS + self.SEQUENCE_BITS)
+                | self.worker_id << self.SEQUENCE_BITS
+                | self._sequence
+            )
+
+    @staticmethod
+    def _now() -> int:
+        return time.time_ns() // 1_000_000
+
+
+_allocator = None
+_allocator_lock = threading.Lock()
+
+
+def get_id_allocator() -> IdAllocator:
+    global _allocator
+    if _allocator is None:
+        with _allocator_lock:
+            if _allocator is None:
+                _allocator = import_string(settings.ID_ALLOCATOR)()
+    return _allocator
@@ -0,0 +1,222 @@
+"""
+Раздача файлов из MEDIA_ROOT.
+
+Middleware стоит первым и отвечает на запросы к MEDIA_URL, не проходя остальной
+стек. Полный файл отдаётся через FileResponse, который WSGI-сервер передаёт в
+sendfile. Поддерживаются If-None-Match/If-Modified-Since, одиночный Range и
+заранее сжатые копии (.br, .gz рядом с файлом). Файлы из MEDIA_IMMUTABLE_PREFIXES
+не меняются и кэшируются навсегда. С MEDIA_ACCEL_REDIRECT_PREFIX файл отдаёт nginx.
+Браузер показывает только изображения (INLINE_CONTENT_TYPES), остальное скачивается.
+"""
+
+import mimetypes
+import os
+import re
+import stat
+from urllib.parse import quote, unquote
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import FileResponse, Http404, HttpResponse, StreamingHttpResponse
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, parse_etags
+
+IMMUTABLE_MAX_AGE = 365 * 24 * 60 * 60
+BLOCK_SIZE = 64 * 1024
+RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+# Заголовок Accept-Encoding -> расширение сжатой копии, в порядке предпочтения
+ENCODINGS = (("br", ".br"), ("gzip", ".gz"))
+# Типы, которые браузер показывает сам; остальное (HTML, SVG, текст...) отдаётся
+# вложением, чтобы загруженный файл не выполнялся на нашем домене
+INLINE_CONTENT_TYPES = {"image/jpeg", "image/png", "image/gif", "image/webp"}
+
+
+class MediaMiddleware:
+    # Под ASGI синхронный middleware заставил бы Django выполнять в потоке и
+    # асинхронные представления, поэтому поддерживаются оба режима
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.prefix = settings.MEDIA_URL
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if self.is_media(request):
+            return self.serve(request)
+        return self.get_response(request)
+
+    async def __acall__(self, request):
+        if self.is_media(request):
+            return await sync_to_async(self.serve)(request)
+        return await self.get_response(request)
+
+    def is_media(self, request) -> bool:
+        return (
+            settings.MEDIA_SERVE
+            and request.method in ("GET", "HEAD")
+            and request.path.startswith(self.prefix)
+        )
+
+    def serve(self, request):
+        try:
+            return serve_media(request, unquote(request.path[len(self.prefix) :]))
+        except Http404:
+            return HttpResponse(status=404)
+
+
+def serve_media(request, name: str):
+    try:
+        path = safe_join(settings.MEDIA_ROOT, name)
+    except SuspiciousFileOperation:
+        raise Http404
+    try:
+        info = os.stat(path)
+    except OSError:
+        raise Http404
+    if not stat.S_ISREG(info.st_mode):
+        raise Http404
+
+    immutable = name.startswith(tuple(settings.MEDIA_IMMUTABLE_PREFIXES))
+    if settings.MEDIA_ACCEL_REDIRECT_PREFIX:
+        # Условные запросы и Range nginx обработает сам
+        response = HttpResponse(content_type=mimetypes.guess_type(name)[0])
+        response["X-Accel-Redirect"] = settings.MEDIA_ACCEL_REDIRECT_PREFIX + quote(name)
+        set_content_headers(response, name)
+        return set_cache_headers(response, immutable)
+
+    # Имя файла по хэшу уже однозначно определяет содержимое
+    etag = (
+        f'"{os.path.basename(name)}"'
+        if immutable
+        else f'"{info.st_size:x}-{info.st_mtime_ns:x}"'
+    )
+    encoding = negotiate_encoding(request, path)
+    if encoding is not None:
+        # Сжатая копия - другое представление с другими байтами и своим ETag
+        etag = f'{etag[:-1]}-{encoding}"'
+    response = get_conditional_response(request, etag=etag, last_modified=int(info.st_mtime))
+    if response is None:
+        response = file_response(request, path, info.st_size, etag, encoding)
+    response.headers.setdefault("ETag", etag)
+    response["Last-Modified"] = http_date(info.st_mtime)
+    # И для 304: кэш должен различать ответы с разным Accept-Encoding
+    response["Vary"] = "Accept-Encoding"
+    set_content_headers(response, name)
+    return set_cache_headers(response, immutable)
+
+
+def set_content_headers(response, name: str):
+    """Тип определяется по расширению, которое выбрал загрузивший файл клиент"""
+    # Middleware стоит до SecurityMiddleware, поэтому nosniff ставим сами
+    response["X-Content-Type-Options"] = "nosniff"
+    if mimetypes.guess_type(name)[0] not in INLINE_CONTENT_TYPES:
+        response["Content-Disposition"] = "attachment"
+
+
+def parse_accept_encoding(header: str) -> dict[str, float]:
+    """Кодировки из Accept-Encoding с их q"""
+    accepted = {}
+    for item in header.split(","):
+        coding, *params = [part.strip() for part in item.split(";")]
+        if not coding:
+            continue
+        quality = 1.0
+        for param in params:
+            key, _, value = param.partition("=")
+            if key.strip().lower() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        accepted[coding.lower()] = quality
+    return accepted
+
+
+def negotiate_encoding(request, path: str) -> str | None:
+    """Кодировка заранее сжатой копии, которую принимает клиент"""
+    if request.headers.get("Range"):
+        # Диапазоны отдаются из несжатого файла
+        return None
+    accepted = parse_accept_encoding(request.headers.get("Accept-Encoding", ""))
+    for encoding, extension in ENCODINGS:
+        # q=0 - кодировка запрещена; "*" покрывает не перечисленные явно
+        if accepted.get(encoding, accepted.get("*", 0)) > 0 and os.path.isfile(
+            path + extension
+        ):
+            return encoding
+    return None
+
+
+def file_response(request, path: str, size: int, etag: str, encoding: str | None = None):
+    content_type = mimetypes.guess_type(path)[0] or "application/octet-stream"
+    if encoding is not None:
+        extension = dict(ENCODINGS)[encoding]
+        response = FileResponse(open(path + extension, "rb"), content_type=content_type)
+        response["Content-Encoding"] = encoding
+        return response
+    requested = parse_range(request, size, etag)
+    if requested == "unsatisfiable":
+        response = HttpResponse(status=416)
+        response["Content-Range"] = f"bytes */{size}"
+        return response
+    if requested is not None:
+        start, end = requested
+        response = StreamingHttpResponse(
+            read_range(path, start, end - start + 1), status=206, content_type=content_type
+        )
+        response["Content-Length"] = end - start + 1
+        response["Content-Range"] = f"bytes {start}-{end}/{size}"
+        response["Accept-Ranges"] = "bytes"
+        return response
+
+    response = FileResponse(open(path, "rb"), content_type=content_type)
+    response["Accept-Ranges"] = "bytes"
+    return response
+
+
+def parse_range(request, size: int, etag: str):
+    """(начало, конец) одиночного диапазона, "unsatisfiable" или None для всего файла"""
+    header = request.headers.get("Range")
+    if not header:
+        return None
+    if_range = request.headers.get("If-Range")
+    if if_range and etag not in parse_etags(if_range):
+        return None
+    match = RANGE_RE.match(header.strip())
+    if not match or match.groups() == ("", ""):
+        # Несколько диапазонов не поддерживаем - отдаём файл целиком
+        return None
+    first, last = match.groups()
+    if not first:
+        start, end = max(size - int(last), 0), size - 1
+    else:
+        start, end = int(first), min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        return "unsatisfiable"
+    return start, end
+
+
+def read_range(path: str, start: int, length: int):
+    with open(path, "rb") as file:
+        file.seek(start)
+        while length > 0:
+            chunk = file.read(min(BLOCK_SIZE, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+
+
+def set_cache_headers(response, immutable: bool):
+    if immutable:
+        patch_cache_control(response, public=True, max_age=IMMUTABLE_MAX_AGE, immutable=True)
+    else:
+        patch_cache_control(response, public=True, max_age=settings.MEDIA_CACHE_MAX_AGE)
+    return response
@@ -1,8 +1,37 @@
+import io
+
 import pytest
+from asgiref.sync import async_to_sync
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import RequestFactory
+from PIL import Image
 from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
 
 from cars.models import CarBrand, CarModel, Vehicle
 from users.models import User
+from users.throttling import reset_local_store
+
+
+@pytest.fixture(autouse=True)
+def clear_cache():
+    """Очищает кэш между тестами."""
+    cache.clear()
+    yield
+    cache.clear()
+
+
+@pytest.fixture(autouse=True)
+def reset_throttles():
+    """Сбрасывает корзины лимитов входа, которые хранятся в памяти процесса."""
+    reset_local_store()
+
+
+@pytest.fixture(autouse=True)
+def fast_password_hashing(settings):
+    """Минимальная стоимость bcrypt: хэширование занимало большую часть времени тестов."""
+    settings.BCRYPT_ROUNDS = 4
 
 
 @pytest.fixture
@@ -29,6 +58,25 @@ def api_client_auth(api_client, create_test_user):
     return api_client
 
 
+@pytest.fixture
+def async_request(create_test_user):
+    """Вызывает асинхронное представление (common.async_views) с JWT пользователя."""
+    token = str(AccessToken.for_user(create_test_user))
+
+    def call(view_class, method="get", data=None, headers=None, authenticated=True, **kwargs):
+        headers = dict(headers or {})
+        if authenticated:
+            headers["Authorization"] = f"Bearer {token}"
+        make = getattr(RequestFactory(), method)
+        if method == "get":
+            request = make("/", data, headers=headers)
+        else:
+            request = make("/", data, content_type="application/json", headers=headers)
+        return async_to_sync(view_class.as_view())(request, **kwargs)
+
+    return call
+
+
 @pytest.fixture
 def car_brand(db):
     """Создаёт тестовую марку автомобиля."""
@@ -54,3 +102,22 @@ def vehicle(create_test_user, car_brand, car_model):
         status="for_sale",
         purchase_date="2024-12-01",
     )
+
+
+@pytest.fixture
+def media_root(settings, tmp_path):
+    """Перенаправляет MEDIA_ROOT во временный каталог."""
+    settings.MEDIA_ROOT = str(tmp_path / "media")
+    return tmp_path / "media"
+
+
+@pytest.fixture
+def image_file():
+    """Создаёт загружаемый JPEG заданного размера и цвета."""
+
+    def make(name="photo.jpg", size=(64, 48), color=(200, 30, 30)):
+        buffer = io.BytesIO()
+        Image.new("RGB", size, color).save(buffer, format="JPEG")
+        return SimpleUploadedFile(name, buffer.getvalue(), content_type="image/jpeg")
+
+    return make
@@ -1,8 +1,35 @@
+import hashlib
+import json
+import os
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from importlib import import_module
+from io import StringIO
+
 import pytest
+from django.apps import apps as django_apps
+from django.core.files.storage import FileSystemStorage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.core.management.base import CommandError
 from django.urls import reverse
+from django.utils import timezone
+from PIL import Image
 from rest_framework import status
+from rest_framework.test import APIClient
 
-from cars.models import Expense, Vehicle
+from cars import statistic_cache
+from cars.api.async_views import (
+    AsyncCarBrandListView,
+    AsyncUserStatisticView,
+    AsyncVehicleListView,
+    AsyncVehicleRetrieveView,
+)
+from cars.importers import VehicleImporter
+from cars.models import CarBrand, CarModel, DailyUserRollup, Expense, Vehicle, VehiclePhoto
+from cars.photos import rendition_token
+from cars.renditions import RENDITIONS
+from users.models import User
 
 
 class TestListVehicles:
@@ -88,6 +115,207 @@ class TestListVehicles:
         assert len(response.data) == 1
         assert response.data[0]["vin"] == "1HGCM82633A123456"
 
+    @pytest.mark.django_db
+    def test_vehicle_list_multi_value_filters(
+        self,
+        api_client_auth,
+        create_test_user,
+        car_brand,
+        car_model,
+        django_assert_num_queries,
+    ):
+        other_brand = CarBrand.objects.create(name="Other Brand")
+        other_model = CarModel.objects.create(brand=other_brand, name="Other Model")
+        for vin, brand, model, vehicle_status, purchase_date in [
+            ("1HGCM82633A000001", car_brand, car_model, "for_sale", "2024-01-10"),
+            ("1HGCM82633A000002", car_brand, car_model, "sold", "2024-03-10"),
+            ("1HGCM82633A000003", other_brand, other_model, "in_progress", "2024-05-10"),
+        ]:
+            Vehicle.objects.create(
+                owner=create_test_user,
+                vin=vin,
+                brand=brand,
+                model=model,
+                year=2020,
+                mileage=1000,
+                status=vehicle_status,
+                purchase_date=purchase_date,
+            )
+
+        def vins(params):
+            response = api_client_auth.get(self.url, params)
+            assert response.status_code == status.HTTP_200_OK
+            return sorted(item["vin"][-1] for item in response.data)
+
+        assert vins({"status": "for_sale,in_progress"}) == ["1", "3"]
+        assert vins({"brand_id": f"{other_brand.pk}"}) == ["3"]
+        assert vins({"model_id": f"{car_model.pk},{other_model.pk}"}) == ["1", "2", "3"]
+        assert vins({"brand": "Test Brand,Other Brand", "status": "sold"}) == ["2"]
+        assert vins({"model": "Other Model"}) == ["3"]
+        assert vins({"brand": "Unknown"}) == []
+        assert vins(
+            {"purchase_date_from": "2024-02-01", "purchase_date_to": "2024-04-01"}
+        ) == ["2"]
+
+        # Справочник закэширован: запрос с фильтром по названию идёт только в Vehicle
+        with django_assert_num_queries(1) as context:
+            api_client_auth.get(self.url, {"brand": "Test Brand"})
+        where = context.captured_queries[0]["sql"].rsplit("WHERE", 1)[1]
+        assert '"cars_vehicle"."brand_id" IN' in where
+        assert "cars_carbrand" not in where
+
+        # Переименование марки сбрасывает кэш справочника
+        other_brand.name = "Renamed Brand"
+        other_brand.save()
+        assert vins({"brand": "Renamed Brand"}) == ["3"]
+
+        response = api_client_auth.get(self.url, {"brand_id": "x"})
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        response = api_client_auth.get(self.url, {"sale_date_from": "2024-13-01"})
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+    @pytest.mark.django_db
+    def test_vehicle_list_expenses_and_benefit(self, api_client_auth, vehicle):
+        Expense.objects.create(vehicle=vehicle, amount=1500.00, date="2024-12-01")
+        Expense.objects.create(vehicle=vehicle, amount=300.00, date="2024-12-02")
+
+        response = api_client_auth.get(self.url)
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data[0]["brand"] == "Test Brand"
+        assert response.data[0]["model"] == "Test Model"
+        assert response.data[0]["expenses_amount"] == 1800
+        assert response.data[0]["benefit"] == -1201800
+
+    @pytest.mark.django_db
+    def test_vehicle_list_query_count(
+        self,
+        api_client_auth,
+        create_test_user,
+        car_brand,
+        car_model,
+        django_assert_num_queries,
+    ):
+        # Количество запросов не должно зависеть от числа машин и расходов
+        for i in range(10):
+            vehicle = Vehicle.objects.create(
+                owner=create_test_user,
+                vin=f"1HGCM82633A{i:06d}",
+                brand=car_brand,
+                model=car_model,
+                year=2020,
+                mileage=15000,
+                purchase_price=1200000.00,
+                purchase_date="2024-12-01",
+            )
+            Expense.objects.create(vehicle=vehicle, amount=100.00, date="2024-12-01")
+            Expense.objects.create(vehicle=vehicle, amount=200.00, date="2024-12-02")
+
+        with django_assert_num_queries(1):
+            response = api_client_auth.get(self.url)
+
+        assert response.status_code == status.HTTP_200_OK
+        assert len(response.data) == 10
+        assert all(item["expenses_amount"] == 300 for item in response.data)
+
+
+class TestListVehiclesPagination:
+    url = reverse("vehicle-list")
+
+    @pytest.fixture
+    def vehicles(self, create_test_user, car_brand, car_model):
+        return [
+            Vehicle.objects.create(
+                owner=create_test_user,
+                vin=f"1HGCM82633A{i:06d}",
+                brand=car_brand,
+                model=car_model,
+                year=2010 + i % 3,
+                mileage=1000 * (7 - i),
+                purchase_price=100000 + i,
+                purchase_date="2024-12-01",
+            )
+            for i in range(7)
+        ]
+
+    @pytest.mark.django_db
+    def test_cursor_pagination(self, api_client_auth, vehicles):
+        response = api_client_auth.get(self.url, {"page_size": 3})
+
+        assert response.status_code == status.HTTP_200_OK
+        assert [item["id"] for item in response.data["results"]] == [
+            vehicle.id for vehicle in vehicles[:3]
+        ]
+        assert response.data["prev"] is None
+
+        # Проходим все страницы вперёд
+        seen = []
+        cursor = None
+        while True:
+            params = {"page_size": 3}
+            if cursor:
+                params["cursor"] = cursor
+            response = api_client_auth.get(self.url, params)
+            seen += [item["id"] for item in response.data["results"]]
+            cursor = response.data["next"]
+            if cursor is None:
+                break
+        assert seen == [vehicle.id for vehicle in vehicles]
+
+        # И одну страницу назад
+        response = api_client_auth.get(
+            self.url, {"page_size": 3, "cursor": response.data["prev"]}
+        )
+        assert [item["id"] for item in response.data["results"]] == [
+            vehicle.id for vehicle in vehicles[3:6]
+        ]
+
+    @pytest.mark.django_db
+    def test_sort(self, api_client_auth, vehicles):
+        response = api_client_auth.get(self.url, {"sort": "-year"})
+        years = [item["year"] for item in response.data]
+        assert years == sorted(years, reverse=True)
+
+        response = api_client_auth.get(self.url, {"sort": "mileage", "page_size": 2})
+        assert [item["mileage"] for item in response.data["results"]] == [1000, 2000]
+        response = api_client_auth.get(
+            self.url, {"sort": "mileage", "page_size": 2, "cursor": response.data["next"]}
+        )
+        assert [item["mileage"] for item in response.data["results"]] == [3000, 4000]
+
+        response = api_client_auth.get(self.url, {"sort": "-benefit", "page_size": 2})
+        assert [item["benefit"] for item in response.data["results"]] == [-100000, -100001]
+
+    @pytest.mark.django_db
+    def test_invalid_params(self, api_client_auth, vehicles):
+        response = api_client_auth.get(self.url, {"sort": "vin"})
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+        response = api_client_auth.get(self.url, {"cursor": "garbage"})
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+        response = api_client_auth.get(self.url, {"page_size": 2})
+        response = api_client_auth.get(
+            self.url, {"sort": "year", "cursor": response.data["next"]}
+        )
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+
+class TestBenchVehicleFilters:
+    @pytest.mark.django_db
+    def test_bench_vehicle_filters(self):
+        """Проверяет, что бенчмарк фильтров отрабатывает и откатывает свои данные."""
+        stdout = StringIO()
+        call_command(
+            "bench_vehicle_filters", "--count=300", "--owners=3", "--repeat=2", stdout=stdout
+        )
+
+        output = stdout.getvalue()
+        assert "owner + status" in output
+        assert "p95" in output
+        assert not Vehicle.objects.exists()
+        assert not User.objects.exists()
+
 
 class TestCreateVehicle:
     url = reverse("vehicle-create")
@@ -113,6 +341,158 @@ class TestCreateVehicle:
         assert Vehicle.objects.filter(vin="1HGCM82633A123456").exists()
 
 
+class TestImportVehicles:
+    url = reverse("vehicle-import")
+    csv = (
+        "vin,brand,model,year,mileage,purchase_price,purchase_date,status\n"
+        "VIN00000000000001,Test Brand,Test Model,2020,1000,500000,2024-01-10,for_sale\n"
+        "VIN00000000000002,Test Brand,Unknown,2020,1000,,,\n"
+        "1HGCM82633A123456,Test Brand,Test Model,2019,2000,,,\n"
+        "VIN00000000000001,Test Brand,Test Model,2018,3000,,,\n"
+        "VIN00000000000003,Test Brand,Test Model,year,-1,,,\n"
+        "VIN00000000000004,Test Brand,Test Model,2021,0,,,sold\n"
+    )
+
+    def upload(self, api_client_auth, **data):
+        file = SimpleUploadedFile("vehicles.csv", self.csv.encode(), content_type="text/csv")
+        return api_client_auth.post(self.url, {"file": file, **data}, format="multipart")
+
+    @pytest.mark.django_db
+    def test_import_dry_run(self, api_client_auth, vehicle):
+        response = self.upload(api_client_auth, dry_run="1")
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data["rows"] == 6
+        assert response.data["valid"] == 2
+        assert response.data["created"] == 0
+        errors = {item["row"]: item["errors"] for item in response.data["errors"]}
+        assert set(errors) == {2, 3, 4, 5}
+        assert "model" in errors[2]
+        assert "vin" in errors[3] and "vin" in errors[4]
+        assert {"year", "mileage"} <= set(errors[5])
+        assert Vehicle.objects.count() == 1
+
+    @pytest.mark.django_db
+    def test_import(
+        self, api_client_auth, create_test_user, vehicle, django_assert_max_num_queries
+    ):
+        with django_assert_max_num_queries(16):
+            response = self.upload(api_client_auth)
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data["created"] == 2
+        imported = Vehicle.objects.get(vin="VIN00000000000001")
+        assert imported.owner == create_test_user
+        assert imported.purchase_price == Decimal("500000")
+        assert Vehicle.objects.get(vin="VIN00000000000004").status == Vehicle.SOLD
+        assert DailyUserRollup.objects.get(owner=create_test_user, day=date(2024, 1, 10))
+
+    @pytest.mark.django_db
+    def test_import_command(self, tmp_path, create_test_user, car_model):
+        path = tmp_path / "vehicles.csv"
+        path.write_text(self.csv, encoding="utf-8")
+        stdout, stderr = StringIO(), StringIO()
+
+        call_command(
+            "import_vehicles", str(path), "--owner=testuser", stdout=stdout, stderr=stderr
+        )
+
+        assert "Импортировано машин: 3 из 6" in stdout.getvalue()
+        assert "Строка 2" in stderr.getvalue()
+        assert create_test_user.vehicles.count() == 3
+        with pytest.raises(CommandError):
+            call_command("import_vehicles", str(path), "--owner=nobody")
+
+    @pytest.mark.django_db
+    @pytest.mark.parametrize(
+        "name, content",
+        [
+            ("vehicles.xlsx", b"not a zip"),
+            ("vehicles.xlsx", b"PK\x05\x06" + b"\x00" * 18),
+            ("vehicles.json", b'{"vin": "VIN00000000000001"}'),
+            ("vehicles.csv", b"vin\n" + b"a" * 200_000 + b"\n"),
+        ],
+    )
+    def test_import_bad_file(self, api_client_auth, name, content):
+        file = SimpleUploadedFile(name, content)
+        response = api_client_auth.post(self.url, {"file": file}, format="multipart")
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert "file" in response.data
+
+    @pytest.mark.django_db
+    @pytest.mark.parametrize(
+        "name, content", [("vehicles.json", b"[1, 2]"), ("vehicles.jsonl", b'1\n"x"\n')]
+    )
+    def test_import_not_object_rows(self, api_client_auth, name, content):
+        file = SimpleUploadedFile(name, content)
+        response = api_client_auth.post(self.url, {"file": file}, format="multipart")
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data["rows"] == 2
+        assert [item["row"] for item in response.data["errors"]] == [1, 2]
+        assert "non_field_errors" in response.data["errors"][0]["errors"]
+
+    @pytest.mark.django_db
+    def test_import_xlsx(self, tmp_path, create_test_user, car_model, monkeypatch):
+        from openpyxl import Workbook
+
+        workbook = Workbook()
+        sheet = workbook.active
+        for line in self.csv.splitlines():
+            sheet.append([value or None for value in line.split(",")])
+        sheet["G2"] = datetime(2024, 1, 10)
+        path = tmp_path / "vehicles.xlsx"
+        workbook.save(path)
+        rebuilds = []
+        rebuild = DailyUserRollup.objects.rebuild
+        monkeypatch.setattr(
+            DailyUserRollup.objects,
+            "rebuild",
+            lambda *args: rebuilds.append(args) or rebuild(*args),
+        )
+        stdout, stderr = StringIO(), StringIO()
+
+        call_command(
+            "import_vehicles",
+            str(path),
+            "--owner=testuser",
+            "--chunk-size=2",
+            stdout=stdout,
+            stderr=stderr,
+        )
+
+        assert "Импортировано машин: 3 из 6" in stdout.getvalue()
+        assert "Строка 2" in stderr.getvalue()
+        assert Vehicle.objects.get(vin="VIN00000000000001").purchase_date == date(2024, 1, 10)
+        # Итоги пересобираются один раз на весь файл, а не на каждую пачку
+        assert rebuilds == [([create_test_user.pk],)]
+        assert DailyUserRollup.objects.get(owner=create_test_user, day=date(2024, 1, 10))
+
+    @pytest.mark.django_db
+    def test_import_vin_race(self, api_client_auth, create_test_user, car_model, monkeypatch):
+        save_vehicles = VehicleImporter.save_vehicles
+
+        def concurrent_insert(importer, numbered_vehicles):
+            # VIN занимает другой запрос между проверкой и вставкой
+            Vehicle.objects.create(
+                owner=create_test_user,
+                vin="VIN00000000000004",
+                brand=car_model.brand,
+                model=car_model,
+                year=2020,
+                mileage=0,
+            )
+            save_vehicles(importer, numbered_vehicles)
+
+        monkeypatch.setattr(VehicleImporter, "save_vehicles", concurrent_insert)
+        response = self.upload(api_client_auth)
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data["created"] == 2
+        errors = {item["row"]: item["errors"] for item in response.data["errors"]}
+        assert errors[6] == {"vin": ["VIN уже занят."]}
+        assert Vehicle.objects.filter(vin="VIN00000000000001").exists()
+
+
 class TestUpdateVehicle:
     @staticmethod
     def url(_id):
@@ -148,6 +528,242 @@ class TestUpdateVehicle:
         assert vehicle.status == "in_progress"
         assert vehicle.description == "Поменяли масло и тормоза"
 
+    @pytest.mark.django_db
+    def test_vehicle_update_photos(
+        self, api_client_auth, vehicle, media_root, image_file, django_assert_max_num_queries
+    ):
+        photos = [
+            image_file(f"photo{index}.jpg", color=(index * 40, 0, 0)) for index in range(5)
+        ]
+        with django_assert_max_num_queries(12):
+            response = api_client_auth.patch(
+                self.url(vehicle.id), {"photos": photos}, format="multipart"
+            )
+
+        assert response.status_code == status.HTTP_200_OK
+        assert vehicle.photos.count() == 5
+        for photo in vehicle.photos.all():
+            assert (media_root / photo.image.name).exists()
+
+    @pytest.mark.django_db
+    def test_vehicle_update_photos_deduplicated(
+        self, api_client_auth, vehicle, car_brand, car_model, media_root, image_file
+    ):
+        other_owner = User.objects.create_user("other", "other@example.com", "password")
+        other = Vehicle.objects.create(
+            owner=other_owner,
+            vin="1HGCM82633A654321",
+            brand=car_brand,
+            model=car_model,
+            year=2021,
+            mileage=1000,
+            purchase_price=1000000,
+            purchase_date="2024-12-01",
+        )
+        other_client = APIClient()
+        other_client.force_authenticate(user=other_owner)
+        for client, target in ((api_client_auth, vehicle), (other_client, other)):
+            response = client.patch(
+                self.url(target.id),
+                {"photos": [image_file("a.jpg"), image_file("b.jpg")]},
+                format="multipart",
+            )
+            assert response.status_code == status.HTTP_200_OK
+
+        photo = VehiclePhoto.objects.get()
+        content_hash = hashlib.sha256((media_root / photo.image.name).read_bytes()).hexdigest()
+        assert photo.content_hash == content_hash
+        assert photo.image.name == (
+            f"photos/vehicle/sha256/{content_hash[:2]}/{content_hash[2:4]}/{content_hash}.jpg"
+        )
+        assert list(vehicle.photos.all()) == list(other.photos.all()) == [photo]
+
+        # Удаление фото у одной машины не затрагивает другую
+        response = api_client_auth.delete(
+            reverse("vehicle-photo-delete", kwargs={"photo_id": photo.id})
+        )
+        assert response.status_code == status.HTTP_204_NO_CONTENT
+        assert not vehicle.photos.exists()
+        assert list(other.photos.all()) == [photo]
+
+    @pytest.mark.django_db
+    def test_vehicle_update_photo_upload_files(
+        self, api_client_auth, vehicle, media_root, image_file, settings, tmp_path
+    ):
+        settings.FILE_UPLOAD_TEMP_DIR = str(tmp_path / "uploads")
+        (tmp_path / "uploads").mkdir()
+        response = api_client_auth.patch(
+            self.url(vehicle.id), {"photos": [image_file("photo.html")]}, format="multipart"
+        )
+
+        assert response.status_code == status.HTTP_200_OK
+        # Расширение - по формату содержимого, а не по имени файла
+        assert VehiclePhoto.objects.get().image.name.endswith(".jpg")
+        # Временный файл пишется вне MEDIA_ROOT и удаляется
+        assert not (media_root / "photos/vehicle/sha256/tmp").exists()
+        assert not list((tmp_path / "uploads").iterdir())
+
+        text = SimpleUploadedFile("photo.jpg", b"<html></html>", content_type="image/jpeg")
+        response = api_client_auth.patch(
+            self.url(vehicle.id), {"photos": [text], "mileage": 1}, format="multipart"
+        )
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert "photos" in response.data
+        assert VehiclePhoto.objects.count() == 1
+        # Отклонённая загрузка не сохраняет и остальные поля
+        mileage = vehicle.mileage
+        vehicle.refresh_from_db()
+        assert vehicle.mileage == mileage
+
+    @pytest.mark.django_db
+    def test_vehicle_update_photo_limits(
+        self, api_client_auth, vehicle, media_root, image_file, settings
+    ):
+        settings.VEHICLE_PHOTO_MAX_COUNT = 2
+        photos = [image_file(f"photo{index}.jpg") for index in range(3)]
+        response = api_client_auth.patch(
+            self.url(vehicle.id), {"photos": photos, "mileage": 1}, format="multipart"
+        )
+
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert "photos" in response.data
+        vehicle.refresh_from_db()
+        assert vehicle.mileage == 15000
+        assert not VehiclePhoto.objects.exists()
+
+
+class TestPhotoRenditions:
+    @pytest.fixture
+    def photo(self, vehicle, media_root, image_file):
+        photo = VehiclePhoto.objects.create(image=image_file(size=(2000, 1000)))
+        vehicle.photos.add(photo)
+        return photo
+
+    @pytest.mark.django_db
+    def test_lazy_rendition(
+        self, api_client_auth, vehicle, photo, media_root, settings, monkeypatch
+    ):
+        settings.PHOTO_RENDITION_WORKERS = 0
+        url = reverse("vehicle-retrieve", args=[vehicle.pk])
+        renditions = api_client_auth.get(url).data["photos"][0]["renditions"]
+        assert set(renditions) == {"thumb", "medium", "thumb_webp", "medium_webp"}
+        rendition_url = reverse(
+            "vehicle-photo-rendition", args=[rendition_token(photo), "thumb"]
+        )
+        assert renditions["thumb"].endswith(rendition_url)
+
+        response = APIClient().get(rendition_url)
+        assert response.status_code == status.HTTP_302_FOUND
+        thumb = media_root / photo.image.name.replace(".jpg", ".thumb.jpg")
+        assert response["Location"].endswith(thumb.name)
+        with Image.open(thumb) as image:
+            assert image.size == (320, 160)
+        with Image.open(
+            media_root / photo.image.name.replace(".jpg", ".medium_webp.webp")
+        ) as image:
+            assert image.format == "WEBP" and image.size == (1280, 640)
+
+        photo.refresh_from_db()
+        assert sorted(photo.renditions) == sorted(RENDITIONS)
+        # Ссылки на созданные копии строятся без обращения к хранилищу
+        monkeypatch.setattr(FileSystemStorage, "exists", pytest.fail)
+        renditions = api_client_auth.get(url).data["photos"][0]["renditions"]
+        assert renditions["thumb"].endswith(f"/media/{photo.image.name[:-4]}.thumb.jpg")
+        assert (
+            APIClient()
+            .get(reverse("vehicle-photo-rendition", args=[rendition_token(photo), "huge"]))
+            .status_code
+            == status.HTTP_404_NOT_FOUND
+        )
+
+    @pytest.mark.django_db
+    def test_rendition_requires_token(self, photo, media_root, settings):
+        """Фото не перебрать по pk: без верной подписи - 404 и копия не создаётся"""
+        settings.PHOTO_RENDITION_WORKERS = 0
+        token = rendition_token(photo)
+        for bad in [str(photo.pk), token[:-1] + ("A" if token[-1] != "A" else "B")]:
+            response = APIClient().get(reverse("vehicle-photo-rendition", args=[bad, "thumb"]))
+            assert response.status_code == status.HTTP_404_NOT_FOUND
+        photo.refresh_from_db()
+        assert not photo.renditions
+
+    @pytest.mark.django_db
+    def test_rendition_throttled(self, photo, media_root, image_file, settings):
+        settings.PHOTO_RENDITION_WORKERS = 0
+        settings.AUTH_THROTTLE_RATES = {"photo_rendition_ip": "1/min"}
+        other = VehiclePhoto.objects.create(image=image_file("other.jpg"))
+        client = APIClient()
+
+        response = client.get(
+            reverse("vehicle-photo-rendition", args=[rendition_token(photo), "thumb"])
+        )
+        assert response.status_code == status.HTTP_302_FOUND
+        response = client.get(
+            reverse("vehicle-photo-rendition", args=[rendition_token(other), "thumb"])
+        )
+        assert response.status_code == status.HTTP_429_TOO_MANY_REQUESTS
+        assert not other.renditions
+        # Готовые копии отдаются и после исчерпания лимита
+        response = client.get(
+            reverse("vehicle-photo-rendition", args=[rendition_token(photo), "medium"])
+        )
+        assert response.status_code == status.HTTP_302_FOUND
+
+    @pytest.mark.django_db
+    def test_backfill_renditions(self, photo, media_root, settings):
+        settings.PHOTO_RENDITION_WORKERS = 1
+        stdout = StringIO()
+        call_command("backfill_photo_renditions", stdout=stdout)
+
+        assert "Обработано фото: 1, ошибок: 0" in stdout.getvalue()
+        photo.refresh_from_db()
+        assert sorted(photo.renditions) == sorted(RENDITIONS)
+        assert len(list(media_root.glob("**/*.webp"))) == 2
+        call_command("backfill_photo_renditions", stdout=stdout)
+        assert "Обработано фото: 0" in stdout.getvalue()
+
+
+class TestGcMedia:
+    @pytest.mark.django_db
+    def test_gc_media(self, vehicle, media_root, image_file, settings):
+        settings.PHOTO_RENDITION_WORKERS = 0
+        kept = VehiclePhoto.objects.create(image=image_file("kept.jpg"))
+        vehicle.photos.add(kept)
+        orphan = VehiclePhoto.objects.create(image=image_file("orphan.jpg"))
+        stray = media_root / "photos/vehicle/sha256/ab/cd/stray.jpg"
+        stray.parent.mkdir(parents=True)
+        stray.write_bytes(b"x" * 100)
+        fresh = media_root / "photos/vehicle/photos/fresh.jpg"
+        fresh.write_bytes(b"x" * 10)
+
+        # Всё, кроме fresh, изменено давно
+        old = timezone.now() - timedelta(days=1)
+        VehiclePhoto.objects.update(updated_at=old)
+        for path in media_root.glob("**/*.jpg"):
+            if path != fresh:
+                os.utime(path, (old.timestamp(), old.timestamp()))
+        orphan_size = (media_root / orphan.image.name).stat().st_size
+
+        stdout = StringIO()
+        call_command("gc_media", "--dry-run", "--sleep=0", stdout=stdout)
+        # Файлы строк, которые удалит настоящий запуск, тоже учитываются
+        assert (
+            f"Будет удалено фото: 1, файлов: 2, освобождено {orphan_size + 100} байт"
+            in stdout.getvalue()
+        )
+        assert VehiclePhoto.objects.count() == 2
+
+        stdout = StringIO()
+        call_command("gc_media", "--sleep=0", "--batch-size=1", stdout=stdout)
+        assert f"Удалено фото: 1, файлов: 2, освобождено {orphan_size + 100} байт" in (
+            stdout.getvalue()
+        )
+        assert list(VehiclePhoto.objects.all()) == [kept]
+        assert (media_root / kept.image.name).exists()
+        assert not (media_root / orphan.image.name).exists()
+        assert not stray.exists()
+        assert fresh.exists()
+
 
 class TestDeleteVehicle:
     @staticmethod
@@ -186,6 +802,123 @@ class TestDeleteVehicle:
         )
 
 
+class TestCatalogList:
+    brand_url = reverse("car-brand-list")
+    model_url = reverse("car-model-list")
+
+    @pytest.mark.django_db
+    def test_catalog_etag(
+        self, api_client_auth, car_brand, car_model, django_assert_num_queries
+    ):
+        response = api_client_auth.get(self.brand_url)
+        assert response.status_code == status.HTTP_200_OK
+        assert response.json() == [{"id": car_brand.pk, "name": "Test Brand", "country": None}]
+        assert "max-age" in response["Cache-Control"]
+        etag = response["ETag"]
+
+        # Справочник не менялся: 304 без запросов к таблицам справочника
+        with django_assert_num_queries(0):
+            response = api_client_auth.get(self.brand_url, HTTP_IF_NONE_MATCH=etag)
+        assert response.status_code == status.HTTP_304_NOT_MODIFIED
+        assert response["ETag"] == etag
+
+        response = api_client_auth.get(self.model_url)
+        assert response.json() == [
+            {"id": car_model.pk, "name": "Test Model", "brand": car_brand.pk}
+        ]
+
+        # Изменение марки увеличивает версию справочника и меняет ETag
+        CarBrand.objects.create(name="Other Brand")
+        response = api_client_auth.get(self.brand_url, HTTP_IF_NONE_MATCH=etag)
+        assert response.status_code == status.HTTP_200_OK
+        assert response["ETag"] != etag
+        assert len(response.json()) == 2
+
+
+class TestImportCatalog:
+    @pytest.mark.django_db
+    def test_import_catalog(self, tmp_path, car_brand, car_model):
+        csv_path = tmp_path / "catalog.csv"
+        csv_path.write_text(
+            "brand,model,country\n"
+            "Test Brand,Test Model,\n"
+            "Test Brand,Second Model,\n"
+            "Toyota,Camry,Japan\n"
+            "Toyota,Corolla,\n"
+            ",Orphan,\n",
+            encoding="utf-8",
+        )
+        stdout, stderr = StringIO(), StringIO()
+        call_command(
+            "import_catalog", str(csv_path), "--chunk-size=2", stdout=stdout, stderr=stderr
+        )
+
+        assert "новых марок: 1, новых моделей: 3" in stdout.getvalue()
+        assert "Строка 5: Не указана марка" in stderr.getvalue()
+        toyota = CarBrand.objects.get(name="Toyota")
+        assert toyota.country == "Japan"
+        assert set(toyota.models.values_list("name", flat=True)) == {"Camry", "Corolla"}
+        assert car_brand.models.count() == 2
+
+        jsonl_path = tmp_path / "catalog.jsonl"
+        jsonl_path.write_text(
+            '{"brand": "Toyota", "model": "Camry", "country": "JP"}\n'
+            '{"brand": "Лада", "model": "Granta"}\n',
+            encoding="utf-8",
+        )
+        call_command("import_catalog", str(jsonl_path), "--update-country", stdout=StringIO())
+
+        toyota.refresh_from_db()
+        assert toyota.country == "JP"
+        assert CarModel.objects.filter(brand__name="Лада", name="Granta").exists()
+        assert CarModel.objects.count() == 5
+
+        with pytest.raises(CommandError):
+            call_command("import_catalog", str(tmp_path / "catalog.xml"))
+
+
+class TestCatalogSuggest:
+    url = reverse("catalog-suggest")
+
+    @pytest.mark.django_db
+    def test_suggest(self, api_client_auth, car_brand, car_model):
+        toyota = CarBrand.objects.create(name="Toyota")
+        camry = CarModel.objects.create(brand=toyota, name="Camry")
+        CarModel.objects.create(brand=toyota, name="Land Cruiser")
+        lada = CarBrand.objects.create(name="Лада")
+        CarModel.objects.create(brand=lada, name="Granta")
+
+        def names(params):
+            response = api_client_auth.get(self.url, params)
+            assert response.status_code == status.HTTP_200_OK
+            return [item["name"] for item in response.data]
+
+        assert names({"q": "TOY"}) == ["Toyota"]
+        assert names({"q": "тойо"}) == ["Toyota"]
+        assert names({"q": "lad"}) == ["Лада"]
+        assert names({"q": "cruis"}) == ["Land Cruiser"]
+        assert names({"q": "toyta"}) == ["Toyota"]
+        assert names({"q": ""}) == []
+        assert names({"q": "t", "limit": "1"}) == ["Toyota"]
+        for limit in ("0", "-1"):
+            response = api_client_auth.get(self.url, {"q": "t", "limit": limit})
+            assert response.status_code == status.HTTP_400_BAD_REQUEST
+            assert "limit" in response.data
+
+        response = api_client_auth.get(self.url, {"q": "ca", "brand_id": toyota.pk})
+        assert response.data == [
+            {"type": "model", "id": camry.pk, "name": "Camry", "brand_id": toyota.pk}
+        ]
+        assert names({"q": "ca", "brand_id": lada.pk}) == []
+
+        # Индекс обновляется вместе со справочником
+        camry.name = "Corolla"
+        camry.save()
+        assert names({"q": "co", "brand_id": toyota.pk}) == ["Corolla"]
+        lada.delete()
+        assert names({"q": "gra"}) == []
+
+
 class TestExpenseList:
     @staticmethod
     def url(vehicle_id):
@@ -300,3 +1033,465 @@ class TestExpenseDelete:
 
         assert response.status_code == status.HTTP_404_NOT_FOUND
         assert response.data["detail"] == "No Expense matches the given query."
+
+
+class TestVehicleExpensesTotal:
+    @pytest.mark.django_db
+    def test_expenses_total_follows_expense_writes(self, api_client_auth, vehicle):
+        response = api_client_auth.post(
+            reverse("expense-create"),
+            {"vehicle": vehicle.id, "amount": 500.00, "date": "2024-12-02"},
+        )
+        assert response.status_code == status.HTTP_201_CREATED
+        vehicle.refresh_from_db()
+        assert vehicle.expenses_total == Decimal("500.00")
+        assert vehicle.benefit == Decimal("-1200500.00")
+
+        expense = Expense.objects.get(id=response.data["id"])
+        expense.amount = Decimal("200.00")
+        expense.save()
+        Expense.objects.bulk_create(
+            [Expense(vehicle=vehicle, amount=Decimal("50.00"), date="2024-12-03")] * 2
+        )
+        vehicle.refresh_from_db()
+        assert vehicle.expenses_total == Decimal("300.00")
+
+        # Устаревший экземпляр машины не должен затирать сумму расходов
+        stale = Vehicle.objects.get(id=vehicle.id)
+        api_client_auth.delete(reverse("expense-delete", args=[expense.id]))
+        stale.sale_price = Decimal("1300000.00")
+        stale.save()
+        vehicle.refresh_from_db()
+        assert vehicle.expenses_total == Decimal("100.00")
+        assert vehicle.benefit == Decimal("99900.00")
+
+    @pytest.mark.django_db
+    def test_amounts_format(self, api_client_auth, create_test_user, vehicle, car_model):
+        """Суммы отдаются так же, как при подсчёте расходов в Python: 0 без цен и расходов"""
+        common = {"owner": create_test_user, "brand": car_model.brand, "model": car_model}
+        Vehicle.objects.create(vin="VIN00000000000001", year=2020, mileage=0, **common)
+        zero = Vehicle.objects.create(vin="VIN00000000000002", year=2020, mileage=0, **common)
+        Expense.objects.create(vehicle=zero, amount=0, date="2024-12-02")
+
+        content = api_client_auth.get(reverse("vehicle-list")).content
+        amounts = [(item["expenses_amount"], item["benefit"]) for item in json.loads(content)]
+        assert amounts == [(0, -1200000.0), (0, 0), (0.0, 0.0)]
+        assert b'"expenses_amount":0,"benefit":0}' in content
+
+        Vehicle.objects.exclude(pk=vehicle.pk).delete()
+        Vehicle.objects.filter(pk=vehicle.pk).update(purchase_price=None)
+        response = api_client_auth.get(reverse("user-statistic"))
+        assert b'"benefit":0,' in response.content
+        vehicle.expenses.create(amount=0, date="2024-12-02")
+        response = api_client_auth.get(reverse("user-statistic"))
+        assert b'"benefit":0.0,' in response.content
+
+    @pytest.mark.django_db
+    def test_rebuild_vehicle_totals(self, monkeypatch, vehicle):
+        Expense.objects.create(vehicle=vehicle, amount=Decimal("700.00"), date="2024-12-02")
+        other = Vehicle.objects.create(
+            owner=vehicle.owner,
+            vin="VIN00000000000001",
+            brand=vehicle.brand,
+            model=vehicle.model,
+            year=2020,
+            mileage=0,
+        )
+        Expense.objects.create(vehicle=other, amount=Decimal("50.00"), date="2024-12-03")
+        Vehicle.objects.update(expenses_total=0)
+
+        with pytest.raises(CommandError):
+            call_command("rebuild_vehicle_totals", "--check", stdout=StringIO())
+
+        # Итоги владельца пересобираются один раз за команду, а не на каждую пачку
+        rebuilds = []
+        rebuild = DailyUserRollup.objects.rebuild
+        monkeypatch.setattr(
+            DailyUserRollup.objects,
+            "rebuild",
+            lambda owner_ids=None: rebuilds.append(list(owner_ids)) or rebuild(owner_ids),
+        )
+        call_command("rebuild_vehicle_totals", "--batch-size", "1", stdout=StringIO())
+        assert rebuilds == [[vehicle.owner_id]]
+
+        call_command("rebuild_vehicle_totals", "--check", stdout=StringIO())
+        vehicle.refresh_from_db()
+        assert vehicle.expenses_total == Decimal("700.00")
+        rollup = DailyUserRollup.objects.get(owner=vehicle.owner, day=date(2024, 12, 3))
+        assert rollup.expenses_other == Decimal("50.00")
+
+
+class TestUserStatistic:
+    url = reverse("user-statistic")
+
+    @pytest.mark.django_db
+    def test_statistic(self, api_client_auth, create_test_user, vehicle, car_brand, car_model):
+        sold = Vehicle.objects.create(
+            owner=create_test_user,
+            vin="2HGCM82633A654321",
+            brand=car_brand,
+            model=car_model,
+            year=2019,
+            mileage=20000,
+            purchase_price=1000000.00,
+            purchase_date="2024-11-01",
+            sale_price=1100000.00,
+            sale_date="2024-11-11",
+            status="sold",
+        )
+        Expense.objects.create(
+            vehicle=sold, expense_type="repaid", amount=500, date="2024-11-02"
+        )
+        Expense.objects.create(
+            vehicle=vehicle, expense_type="other", amount=100, date="2024-12-02"
+        )
+
+        response = api_client_auth.get(self.url)
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data["vehicle_count"] == 2
+        assert response.data["vehicle_by_status"] == {"for_sale": 1, "sold": 1}
+        assert response.data["expenses_by_status"] == {"repaid": 500, "other": 100}
+        deals_data = response.data["deals_data"]
+        assert deals_data["purchase_total_amount"] == 2200000
+        assert deals_data["sold_total_amount"] == 1100000
+        assert deals_data["purchase_avg_price"] == 1100000
+        assert deals_data["benefit"] == 1100000 - 2200000 - 600
+        assert deals_data["avg_days_between_purchase_and_sale"] == 5
+        assert deals_data["vehicle_with_benefits"] == 1
+        assert deals_data["vehicle_with_losses"] == 1
+        count_dataset = response.data["graph_datasets"]["count_dataset"]
+        assert len(count_dataset["purchase_dates"]) == 31
+        assert count_dataset["sale_dates"][10] == {
+            "sale_date": date(2024, 11, 11),
+            "count": 1,
+            "date": date(2024, 11, 11),
+        }
+        assert sum(item["count"] for item in count_dataset["sale_dates"]) == 1
+
+    @pytest.mark.django_db
+    def test_statistic_graph_buckets(self, api_client_auth, vehicle, car_brand, car_model):
+        # Машины других пользователей в графики не попадают
+        other_user = User.objects.create_user(
+            username="other", email="other@example.com", password="testpassword"
+        )
+        Vehicle.objects.create(
+            owner=other_user,
+            vin="2HGCM82633A654321",
+            brand=car_brand,
+            model=car_model,
+            year=2019,
+            mileage=20000,
+            purchase_price=1000000.00,
+            purchase_date="2024-10-05",
+        )
+
+        response = api_client_auth.get(
+            self.url, {"bucket": "month", "from": "2024-09-15", "to": "2025-01-10"}
+        )
+
+        assert response.status_code == status.HTTP_200_OK
+        financial_dataset = response.data["graph_datasets"]["financial_dataset"]
+        assert [item["date"] for item in financial_dataset["purchase_dates"]] == [
+            date(2024, 9, 1),
+            date(2024, 10, 1),
+            date(2024, 11, 1),
+            date(2024, 12, 1),
+            date(2025, 1, 1),
+        ]
+        assert [item["amount"] for item in financial_dataset["purchase_dates"]] == [
+            0,
+            0,
+            0,
+            1200000,
+            0,
+        ]
+        assert len(financial_dataset["sale_dates"]) == 5
+
+        response = api_client_auth.get(self.url, {"bucket": "year"})
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+    @pytest.mark.django_db
+    def test_statistic_bucket_limit(self, api_client_auth, vehicle, settings):
+        settings.STATISTIC_MAX_BUCKETS = 12
+        params = {"bucket": "day", "from": "0001-01-01", "to": "9999-12-31"}
+        response = api_client_auth.get(self.url, params)
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert "to" in response.data
+
+        params = {"bucket": "month", "from": "2024-01-31", "to": "2024-12-01"}
+        response = api_client_auth.get(self.url, params)
+        assert response.status_code == status.HTTP_200_OK
+        assert len(response.data["graph_datasets"]["count_dataset"]["purchase_dates"]) == 12
+        params["to"] = "2025-01-01"
+        assert api_client_auth.get(self.url, params).status_code == 400
+        params = {"bucket": "week", "from": "2024-01-07", "to": "2024-03-18"}
+        response = api_client_auth.get(self.url, params)
+        assert len(response.data["graph_datasets"]["count_dataset"]["purchase_dates"]) == 12
+
+        # Открытая граница берётся из дат сделок - ограничение то же
+        for params, field in (
+            ({"from": "0001-01-01"}, "from"),
+            ({"to": "2200-01-01"}, "to"),
+            ({"bucket": "month", "from": "2023-12-01"}, "from"),
+        ):
+            response = api_client_auth.get(self.url, params)
+            assert response.status_code == status.HTTP_400_BAD_REQUEST
+            assert field in response.data
+        assert api_client_auth.get(self.url, {"from": "2024-11-20"}).status_code == 200
+        vehicle.sale_date = date(2026, 6, 1)
+        vehicle.save()
+        response = api_client_auth.get(self.url, {"bucket": "month"})
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert "bucket" in response.data
+        assert api_client_auth.get(self.url, {"bucket": "quarter"}).status_code == 200
+
+    @pytest.mark.django_db
+    def test_statistic_query_budget(
+        self,
+        api_client_auth,
+        create_test_user,
+        car_brand,
+        car_model,
+        django_assert_max_num_queries,
+    ):
+        Vehicle.objects.bulk_create(
+            Vehicle(
+                owner=create_test_user,
+                vin=f"VIN{i:014d}",
+                brand=car_brand,
+                model=car_model,
+                year=2020,
+                mileage=1000,
+                purchase_price=1000 + i % 100,
+                purchase_date=date(2024, 1, 1) + timedelta(days=i % 365),
+                sale_price=1200 if i % 2 else None,
+                sale_date=date(2024, 6, 1) + timedelta(days=i % 180) if i % 2 else None,
+            )
+            for i in range(10000)
+        )
+
+        with django_assert_max_num_queries(3):
+            response = api_client_auth.get(self.url)
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data["vehicle_count"] == 10000
+
+    @pytest.mark.django_db
+    def test_statistic_cache(self, api_client_auth, vehicle, django_assert_num_queries):
+        response = api_client_auth.get(self.url)
+        assert response["X-Cache"] == "MISS"
+
+        with django_assert_num_queries(0):
+            response = api_client_auth.get(self.url)
+        assert response["X-Cache"] == "HIT"
+        assert response.data["expenses_by_status"] == {}
+
+        # Изменение расходов сбрасывает кэш пользователя
+        Expense.objects.create(vehicle=vehicle, amount=100, date="2024-12-02")
+        response = api_client_auth.get(self.url)
+        assert response["X-Cache"] == "MISS"
+        assert response.data["expenses_by_status"] == {"other": 100}
+
+        # Другие параметры графиков кэшируются отдельно
+        response = api_client_auth.get(self.url, {"bucket": "month"})
+        assert response["X-Cache"] == "MISS"
+
+        stats = statistic_cache.statistic_cache_stats()
+        assert stats["hits"] == 1
+        assert stats["misses"] == 3
+
+    @pytest.mark.django_db
+    def test_statistic_cache_invalidated_on_commit(
+        self, api_client_auth, vehicle, django_capture_on_commit_callbacks
+    ):
+        params = {"bucket": "day"}
+        with django_capture_on_commit_callbacks(execute=True):
+            Expense.objects.create(vehicle=vehicle, amount=100, date="2024-12-02")
+            # Параллельный запрос до коммита видит старые строки и кэширует их под новой версией
+            statistic_cache.set_statistic(vehicle.owner_id, params, {"stale": True})
+            assert statistic_cache.get_statistic(vehicle.owner_id, params) == {"stale": True}
+
+        response = api_client_auth.get(self.url)
+        assert response["X-Cache"] == "MISS"
+        assert response.data["expenses_by_status"] == {"other": 100}
+
+
+class TestAsyncViews:
+    """Асинхронные представления (ASYNC_API_VIEWS) отвечают так же, как синхронные"""
+
+    @pytest.mark.django_db
+    def test_vehicle_list(self, api_client_auth, async_request, vehicle, car_brand):
+        params = {"brand": car_brand.name, "sort": "-year"}
+        response = async_request(AsyncVehicleListView, data=params)
+        assert response.status_code == status.HTTP_200_OK
+        assert (
+            json.loads(response.content)
+            == api_client_auth.get(reverse("vehicle-list"), params).json()
+        )
+        assert len(json.loads(response.content)) == 1
+
+        response = async_request(AsyncVehicleListView, data={"page_size": 1})
+        page = json.loads(response.content)
+        assert [item["id"] for item in page["results"]] == [vehicle.pk]
+        assert page["next"] is None
+
+        response = async_request(AsyncVehicleListView, data={"sort": "color"})
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert "sort" in json.loads(response.content)
+
+    @pytest.mark.django_db
+    def test_vehicle_retrieve(self, async_request, vehicle):
+        response = async_request(AsyncVehicleRetrieveView, pk=vehicle.pk)
+        assert response.status_code == status.HTTP_200_OK
+        data = json.loads(response.content)
+        assert data["vin"] == vehicle.vin
+        assert data["brand"]["name"] == "Test Brand"
+        assert data["photos"] == []
+
+        response = async_request(AsyncVehicleRetrieveView, pk=vehicle.pk + 1000)
+        assert response.status_code == status.HTTP_404_NOT_FOUND
+        assert json.loads(response.content) == {"detail": "Модель не найдена."}
+
+    @pytest.mark.django_db
+    def test_vehicle_retrieve_photos(
+        self, api_client_auth, async_request, vehicle, media_root, image_file, monkeypatch
+    ):
+        photo = VehiclePhoto.objects.create(image=image_file(), renditions=["thumb"])
+        vehicle.photos.add(photo)
+        # Блокирующий ввод-вывод в цикле событий
+        monkeypatch.setattr(FileSystemStorage, "exists", pytest.fail)
+        response = async_request(AsyncVehicleRetrieveView, pk=vehicle.pk)
+        assert response.status_code == status.HTTP_200_OK
+        renditions = json.loads(response.content)["photos"][0]["renditions"]
+        assert renditions["thumb"].endswith(f"/media/{photo.image.name[:-4]}.thumb.jpg")
+        assert renditions == (
+            api_client_auth.get(reverse("vehicle-retrieve", args=[vehicle.pk])).json()[
+                "photos"
+            ][0]["renditions"]
+        )
+
+    @pytest.mark.django_db
+    def test_statistic(self, api_client_auth, async_request, vehicle):
+        Expense.objects.create(vehicle=vehicle, amount=100, date="2024-12-02")
+        params = {"bucket": "week"}
+        response = async_request(AsyncUserStatisticView, data=params)
+        assert response.status_code == status.HTTP_200_OK
+        assert response["X-Cache"] == "MISS"
+        data = json.loads(response.content)
+        assert data["vehicle_count"] == 1
+        assert data["expenses_by_status"] == {"other": 100}
+
+        # Ответ попал в тот же кэш, что и у синхронного представления
+        response = api_client_auth.get(reverse("user-statistic"), params)
+        assert response["X-Cache"] == "HIT"
+        assert response.json() == data
+        assert async_request(AsyncUserStatisticView, data=params)["X-Cache"] == "HIT"
+
+    @pytest.mark.django_db
+    def test_catalog_etag(self, async_request, car_brand):
+        response = async_request(AsyncCarBrandListView)
+        assert response.status_code == status.HTTP_200_OK
+        assert json.loads(response.content) == [
+            {"id": car_brand.pk, "name": "Test Brand", "country": None}
+        ]
+
+        etag = response["ETag"]
+        response = async_request(AsyncCarBrandListView, headers={"If-None-Match": etag})
+        assert response.status_code == status.HTTP_304_NOT_MODIFIED
+
+    @pytest.mark.django_db
+    def test_authentication(self, async_request, create_test_user, settings):
+        response = async_request(AsyncVehicleListView, authenticated=False)
+        assert response.status_code == status.HTTP_401_UNAUTHORIZED
+        assert response["WWW-Authenticate"].startswith("Bearer")
+
+        # Заблокированный пользователь не проходит и через кэш аутентификации
+        create_test_user.is_active = False
+        create_test_user.save()
+        response = async_request(AsyncVehicleRetrieveView, pk=1)
+        assert response.status_code == status.HTTP_401_UNAUTHORIZED
+        assert json.loads(response.content)["code"] == "user_inactive"
+
+
+class TestDailyUserRollup:
+    @staticmethod
+    def snapshot(owner):
+        return sorted(
+            DailyUserRollup.objects.filter(owner=owner)
+            .exclude(
+                purchases_count=0,
+                sales_count=0,
+                expenses_repaid=0,
+                expenses_documents=0,
+                expenses_delivery=0,
+                expenses_other=0,
+                realized_benefit=0,
+            )
+            .values_list(
+                "day",
+                "purchases_count",
+                "purchases_amount",
+                "sales_count",
+                "sales_amount",
+                "expenses_repaid",
+                "expenses_other",
+                "realized_benefit",
+            )
+        )
+
+    @pytest.mark.django_db
+    def test_incremental_rollup_matches_rebuild(self, create_test_user, vehicle):
+        repair = Expense.objects.create(
+            vehicle=vehicle, expense_type="repaid", amount=1000, date="2024-12-05"
+        )
+        Expense.objects.create(vehicle=vehicle, amount=200, date="2024-12-06")
+
+        vehicle = Vehicle.objects.get(id=vehicle.id)
+        vehicle.sale_price = Decimal("1300000.00")
+        vehicle.sale_date = date(2024, 12, 20)
+        vehicle.status = Vehicle.SOLD
+        vehicle.save()
+
+        repair.amount = Decimal("1500.00")
+        repair.save()
+
+        incremental = self.snapshot(create_test_user)
+        assert (
+            date(2024, 12, 20),
+            0,
+            Decimal("0.00"),
+            1,
+            Decimal("1300000.00"),
+            Decimal("0.00"),
+            Decimal("0.00"),
+            Decimal("98300.00"),
+        ) in incremental
+
+        DailyUserRollup.objects.rebuild([create_test_user.id])
+        assert self.snapshot(create_test_user) == incremental
+
+        Vehicle.objects.get(id=vehicle.id).delete()
+        assert self.snapshot(create_test_user) == []
+
+    @pytest.mark.django_db
+    def test_migration_fills_rollups(self, create_test_user, vehicle):
+        Expense.objects.create(
+            vehicle=vehicle, expense_type="repaid", amount=700, date="2024-12-05"
+        )
+        # Тип, которого нет среди полей итогов, считается "прочими"
+        legacy = Expense.objects.create(vehicle=vehicle, amount=30, date="2024-12-05")
+        Expense.objects.filter(pk=legacy.pk).update(expense_type="legacy")
+        Vehicle.objects.filter(pk=vehicle.pk).update(
+            sale_price=Decimal("1300000.00"), sale_date=date(2024, 12, 20)
+        )
+        DailyUserRollup.objects.rebuild([create_test_user.id])
+        expected = self.snapshot(create_test_user)
+
+        # Строки, которые были до миграции, попадают в итоги при её применении
+        DailyUserRollup.objects.all().delete()
+        migration = import_module("cars.migrations.0006_dailyuserrollup")
+        migration.fill_daily_rollups(django_apps, None)
+
+        assert self.snapshot(create_test_user) == expected
+        assert len(expected) == 3
@@ -1,8 +1,16 @@
+import json
+import threading
+from datetime import timedelta
+
 import pytest
 from django.urls import reverse
+from django.utils import timezone
 from rest_framework import status
+from rest_framework_simplejwt.tokens import RefreshToken
 
-from users.models import User
+from users import blacklist, passwords
+from users.api.async_views import AsyncUserProfileView
+from users.models import BlacklistedToken, User
 
 
 class TestLogin:
@@ -29,6 +37,29 @@ class TestLogin:
         assert "access" in response.data
         assert "refresh" in response.data
 
+    @pytest.mark.django_db
+    def test_token_obtain_single_query(
+        self, api_client, create_test_user, django_assert_num_queries
+    ):
+        """Проверяет, что пользователь ищется одним запросом (второй - last_login)."""
+        for login in ("testuser", "testuser@example.com"):
+            with django_assert_num_queries(2):
+                response = api_client.post(
+                    self.url_login, {"username": login, "password": "testpassword"}
+                )
+            assert response.status_code == status.HTTP_200_OK
+
+    @pytest.mark.django_db
+    def test_token_obtain_busy(self, api_client, create_test_user, monkeypatch):
+        """Проверяет, что при заполненной очереди проверок пароля вход отклоняется."""
+        passwords.get_executor()
+        monkeypatch.setattr(passwords, "_slots", threading.BoundedSemaphore(1))
+        passwords._slots.acquire()
+        response = api_client.post(
+            self.url_login, {"username": "testuser", "password": "testpassword"}
+        )
+        assert response.status_code == status.HTTP_429_TOO_MANY_REQUESTS
+
     @pytest.mark.django_db
     def test_token_obtain_invalid_credentials(self, api_client):
         """Проверяет, что при неверных данных токены не выдаются."""
@@ -54,6 +85,164 @@ class TestLogin:
         assert "access" in response.data
 
 
+class TestTokenBlacklist:
+    url_refresh = reverse("token_refresh")
+    url_revoke = reverse("token_revoke")
+
+    @pytest.mark.django_db
+    def test_rotated_token_rejected(self, api_client, create_test_user):
+        """Проверяет, что refresh-токен нельзя использовать после ротации."""
+        refresh = str(RefreshToken.for_user(create_test_user))
+        response = api_client.post(self.url_refresh, {"refresh": refresh})
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data["refresh"] != refresh
+
+        response = api_client.post(self.url_refresh, {"refresh": refresh})
+        assert response.status_code == status.HTTP_401_UNAUTHORIZED
+
+    @pytest.mark.django_db
+    def test_revoke(self, api_client, create_test_user, django_assert_num_queries):
+        """Проверяет отзыв токена и проверку без запроса к БД для неотозванных."""
+        revoked, active = (RefreshToken.for_user(create_test_user) for _ in range(2))
+        response = api_client.post(self.url_revoke, {"refresh": str(revoked)})
+        assert response.status_code == status.HTTP_200_OK
+        assert BlacklistedToken.objects.filter(jti=revoked["jti"]).exists()
+
+        response = api_client.post(self.url_refresh, {"refresh": str(revoked)})
+        assert response.status_code == status.HTTP_401_UNAUTHORIZED
+
+        # Неотозванный токен проверяется фильтром Блума: запросы только на вставку
+        assert not blacklist.is_blacklisted(active)
+        with django_assert_num_queries(0):
+            assert not blacklist.is_blacklisted(active)
+
+    @pytest.mark.django_db
+    def test_prune(self, create_test_user):
+        now = timezone.now()
+        BlacklistedToken.objects.create(jti="expired", expires_at=now - timedelta(days=1))
+        BlacklistedToken.objects.create(jti="active", expires_at=now + timedelta(days=1))
+
+        assert blacklist.prune_blacklist() == 1
+        assert list(BlacklistedToken.objects.values_list("jti", flat=True)) == ["active"]
+
+    def test_bloom_filter(self):
+        bloom = blacklist.BloomFilter(1000)
+        values = [f"jti-{index}" for index in range(1000)]
+        for value in values:
+            bloom.add(value)
+
+        assert all(value in bloom for value in values)
+        false_positives = sum(f"other-{index}" in bloom for index in range(10000))
+        assert false_positives < 300
+
+
+class TestLoginThrottling:
+    url_login = reverse("token_obtain_pair")
+
+    @pytest.mark.django_db
+    @pytest.mark.parametrize("store", ["local", "cache"])
+    def test_login_throttled_before_db(
+        self, api_client, create_test_user, settings, store, django_assert_num_queries
+    ):
+        """Проверяет, что сверх лимита вход отклоняется без запросов к БД."""
+        settings.AUTH_THROTTLE_STORE = store
+        settings.AUTH_THROTTLE_RATES = {
+            **settings.AUTH_THROTTLE_RATES,
+            "login_ip": "5/min",
+            "login_username": "2/min",
+        }
+        payload = {"username": "testuser", "password": "wrong"}
+        for _ in range(2):
+            response = api_client.post(self.url_login, payload)
+            assert response.status_code == status.HTTP_401_UNAUTHORIZED
+
+        with django_assert_num_queries(0):
+            response = api_client.post(self.url_login, {**payload, "username": "TestUser"})
+        assert response.status_code == status.HTTP_429_TOO_MANY_REQUESTS
+        assert int(response["Retry-After"]) > 0
+
+        # Другой логин ограничен только лимитом IP
+        for _ in range(2):
+            response = api_client.post(self.url_login, {**payload, "username": "other"})
+        assert response.status_code == status.HTTP_401_UNAUTHORIZED
+        response = api_client.post(self.url_login, {**payload, "username": "third"})
+        assert response.status_code == status.HTTP_429_TOO_MANY_REQUESTS
+
+        admin = User.objects.create_user(
+            "admin", "admin@example.com", "password", is_staff=True
+        )
+        api_client.force_authenticate(user=admin)
+        response = api_client.get(reverse("user-throttle-stats"))
+        assert response.data == {"login_username": 1, "login_ip": 1}
+
+    @pytest.mark.django_db
+    @pytest.mark.parametrize("body", ['["testuser", "wrong"]', '"testuser"', "null"])
+    def test_login_not_object_body(self, api_client, body):
+        """Проверяет, что тело не-объект отклоняется с 400, а не падает в троттлинге."""
+        response = api_client.post(self.url_login, body, content_type="application/json")
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+    @pytest.mark.django_db
+    def test_forwarded_for_not_trusted(self, api_client, settings):
+        """Проверяет, что подмена X-Forwarded-For не обходит лимит IP."""
+        settings.AUTH_THROTTLE_RATES = {**settings.AUTH_THROTTLE_RATES, "login_ip": "3/min"}
+        payload = {"username": "nobody", "password": "wrong"}
+        statuses = [
+            api_client.post(
+                self.url_login,
+                {**payload, "username": f"nobody{index}"},
+                HTTP_X_FORWARDED_FOR=f"10.0.0.{index}",
+            ).status_code
+            for index in range(4)
+        ]
+        assert statuses[-1] == status.HTTP_429_TOO_MANY_REQUESTS
+
+        # За доверенным прокси клиентом считается адрес, который добавил прокси
+        settings.REST_FRAMEWORK = {**settings.REST_FRAMEWORK, "NUM_PROXIES": 1}
+        response = api_client.post(
+            self.url_login, payload, HTTP_X_FORWARDED_FOR="10.0.0.100, 10.0.0.200"
+        )
+        assert response.status_code == status.HTTP_401_UNAUTHORIZED
+
+
+class TestPasswordHashing:
+    @pytest.mark.django_db(transaction=True)
+    def test_rehash_on_login(self, api_client, create_test_user, settings, monkeypatch):
+        """Проверяет, что хэш устаревшей стоимости пересчитывается после входа."""
+        assert passwords.hash_cost(create_test_user.password) == 4
+        settings.BCRYPT_ROUNDS = 5
+        futures = []
+        schedule_rehash = passwords.schedule_rehash
+        monkeypatch.setattr(
+            passwords,
+            "schedule_rehash",
+            lambda *args: futures.append(schedule_rehash(*args)) or futures[-1],
+        )
+
+        response = api_client.post(
+            reverse("token_obtain_pair"), {"username": "testuser", "password": "testpassword"}
+        )
+        assert response.status_code == status.HTTP_200_OK
+        futures[0].result()
+        create_test_user.refresh_from_db()
+        assert passwords.hash_cost(create_test_user.password) == 5
+        assert create_test_user.check_password("testpassword")
+        assert len(futures) == 1
+
+    @pytest.mark.django_db
+    def test_hash_cost_distribution(self, api_client, create_test_user):
+        User.objects.create_user("other", "other@example.com", "password")
+        User.objects.filter(username="other").update(password="pbkdf2_sha256$1$salt$hash")
+        admin = User.objects.create_user(
+            "admin", "admin@example.com", "password", is_staff=True
+        )
+        api_client.force_authenticate(user=admin)
+
+        response = api_client.get(reverse("user-password-hashes"))
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data == {"target_cost": 4, "costs": {"4": 2, "other": 1}}
+
+
 class TestRegistration:
     url_register = "/api/users/auth/register/"
 
@@ -87,3 +276,63 @@ class TestRegistration:
         response = api_client.post(self.url_register, payload)
         assert response.status_code == status.HTTP_400_BAD_REQUEST
         assert "password" in response.data
+
+
+class TestCachedJWTAuthentication:
+    profile_url = reverse("user-profile")
+
+    @pytest.fixture
+    def token_client(self, api_client, create_test_user):
+        access = RefreshToken.for_user(create_test_user).access_token
+        api_client.credentials(HTTP_AUTHORIZATION=f"Bearer {access}")
+        return api_client
+
+    @pytest.mark.django_db
+    def test_user_cached_until_saved(
+        self, token_client, create_test_user, django_assert_num_queries
+    ):
+        with django_assert_num_queries(1):
+            assert token_client.get(self.profile_url).status_code == status.HTTP_200_OK
+        with django_assert_num_queries(0):
+            response = token_client.get(self.profile_url)
+        assert response.data["username"] == "testuser"
+
+        # Сохранение пользователя сбрасывает кэш
+        create_test_user.first_name = "Иван"
+        create_test_user.save()
+        with django_assert_num_queries(1):
+            response = token_client.get(self.profile_url)
+        assert response.data["first_name"] == "Иван"
+
+        create_test_user.is_active = False
+        create_test_user.save()
+        response = token_client.get(self.profile_url)
+        assert response.status_code == status.HTTP_401_UNAUTHORIZED
+
+    @pytest.mark.django_db
+    def test_token_user(self, token_client, vehicle, settings, django_assert_num_queries):
+        settings.AUTH_TOKEN_USER = True
+        # Пользователь не загружается: единственный запрос - список машин
+        with django_assert_num_queries(1):
+            response = token_client.get(reverse("vehicle-list"))
+        assert response.status_code == status.HTTP_200_OK
+        assert [item["id"] for item in response.data] == [vehicle.id]
+
+
+class TestAsyncUserProfile:
+    @pytest.mark.django_db
+    def test_profile(self, async_request, create_test_user):
+        response = async_request(AsyncUserProfileView)
+        assert response.status_code == status.HTTP_200_OK
+        assert json.loads(response.content)["username"] == "testuser"
+
+        # Изменение профиля выполняет синхронное представление
+        response = async_request(AsyncUserProfileView, "patch", {"first_name": "Иван"})
+        assert response.status_code == status.HTTP_200_OK
+        assert json.loads(response.content)["first_name"] == "Иван"
+        create_test_user.refresh_from_db()
+        assert create_test_user.first_name == "Иван"
+
+        # Сохранение пользователя сбросило кэш аутентификации
+        response = async_request(AsyncUserProfileView)
+        assert json.loads(response.content)["first_name"] == "Иван"
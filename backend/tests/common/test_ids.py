@@ -0,0 +1,79 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from django.db import connections, transaction
+
+from common.ids import HiLoIdAllocator, SnowflakeIdAllocator, get_id_allocator
+from common.models import IdSequence
+from users.models import User
+
+
+class TestHiLoIdAllocator:
+    @pytest.mark.django_db
+    def test_starts_after_existing_records(self, create_test_user):
+        """Проверяет, что первый блок начинается после уже существующих ID."""
+        allocator = HiLoIdAllocator(block_size=10)
+        User.objects.filter(pk=create_test_user.pk).update(id=41)
+        IdSequence.objects.all().delete()
+
+        assert [allocator.allocate(User) for _ in range(3)] == [42, 43, 44]
+        assert IdSequence.objects.get(name="users.user").next_value == 52
+
+    @pytest.mark.django_db
+    def test_reserves_next_block(self):
+        """Проверяет, что блоки резервируются одним запросом и не пересекаются."""
+        first, second = HiLoIdAllocator(block_size=5), HiLoIdAllocator(block_size=5)
+
+        ids = [first.allocate(User), second.allocate(User), first.allocate(User)]
+        ids += [second.allocate(User) for _ in range(5)]
+
+        assert ids == [1, 6, 2, 7, 8, 9, 10, 11]
+
+    @pytest.mark.django_db
+    def test_rolled_back_reservation(self):
+        """Проверяет, что откат транзакции не приводит к повторной выдаче ID."""
+        first, second = HiLoIdAllocator(block_size=5), HiLoIdAllocator(block_size=5)
+
+        with pytest.raises(RuntimeError):
+            with transaction.atomic():
+                first.allocate(User)
+                raise RuntimeError
+
+        # Блок, зарезервированный в откаченной транзакции, может достаться другому процессу
+        ids = [second.allocate(User) for _ in range(5)]
+        ids += [first.allocate(User) for _ in range(5)]
+
+        assert len(set(ids)) == 10
+        assert IdSequence.objects.get(name="users.user").next_value > max(ids)
+
+    @pytest.mark.django_db(transaction=True)
+    def test_concurrent_user_creation(self):
+        """Проверяет, что пользователи, создаваемые параллельно, получают разные ID."""
+        get_id_allocator()
+
+        def create(index):
+            try:
+                return User.objects.create_user(
+                    username=f"user{index}", email=f"user{index}@example.com", password="pass"
+                ).pk
+            finally:
+                connections.close_all()
+
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            ids = list(executor.map(create, range(40)))
+
+        assert len(set(ids)) == 40
+        assert User.objects.count() == 40
+
+
+class TestSnowflakeIdAllocator:
+    def test_ids_are_unique_and_ordered(self):
+        """Проверяет, что ID растут и не повторяются при параллельной выдаче."""
+        allocator = SnowflakeIdAllocator(worker_id=3)
+
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            ids = list(executor.map(lambda _: allocator.allocate(User), range(10000)))
+
+        assert len(set(ids)) == len(ids)
+        assert sorted(ids)[-1] < 2**63
+        assert all(value >> 12 & 0x3FF == 3 for value in ids)
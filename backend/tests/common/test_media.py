@@ -0,0 +1,127 @@
+import gzip
+
+import pytest
+from asgiref.sync import async_to_sync
+
+
+class TestMediaMiddleware:
+    @pytest.fixture
+    def files(self, media_root, settings):
+        settings.MEDIA_SERVE = True
+        (media_root / "photos/vehicle/sha256/ab/cd").mkdir(parents=True)
+        (media_root / "photos/vehicle/sha256/ab/cd/abcdef.jpg").write_bytes(b"0123456789")
+        (media_root / "photos/user/1/profile").mkdir(parents=True)
+        (media_root / "photos/user/1/profile/me.txt").write_bytes(b"hello " * 100)
+        return media_root
+
+    def test_conditional_and_cache_headers(self, client, files):
+        response = client.get("/media/photos/vehicle/sha256/ab/cd/abcdef.jpg")
+        assert response.status_code == 200
+        assert b"".join(response.streaming_content) == b"0123456789"
+        assert response["Content-Type"] == "image/jpeg"
+        assert "immutable" in response["Cache-Control"]
+        etag, last_modified = response["ETag"], response["Last-Modified"]
+
+        response = client.get(
+            "/media/photos/vehicle/sha256/ab/cd/abcdef.jpg", HTTP_IF_NONE_MATCH=etag
+        )
+        assert response.status_code == 304
+        response = client.get(
+            "/media/photos/user/1/profile/me.txt", HTTP_IF_MODIFIED_SINCE=last_modified
+        )
+        assert response.status_code == 304
+        assert "immutable" not in response["Cache-Control"]
+
+    def test_range(self, client, files):
+        url = "/media/photos/vehicle/sha256/ab/cd/abcdef.jpg"
+        response = client.get(url, HTTP_RANGE="bytes=2-5")
+        assert response.status_code == 206
+        assert b"".join(response.streaming_content) == b"2345"
+        assert response["Content-Range"] == "bytes 2-5/10"
+
+        response = client.get(url, HTTP_RANGE="bytes=-3")
+        assert b"".join(response.streaming_content) == b"789"
+
+        response = client.get(url, HTTP_RANGE="bytes=20-")
+        assert response.status_code == 416
+        assert response["Content-Range"] == "bytes */10"
+
+        # Файл изменился с момента первого запроса - отдаём его целиком
+        response = client.get(url, HTTP_RANGE="bytes=2-5", HTTP_IF_RANGE='"other"')
+        assert response.status_code == 200
+
+    def test_precompressed(self, client, files):
+        path = files / "photos/user/1/profile/me.txt"
+        path.with_name("me.txt.gz").write_bytes(gzip.compress(path.read_bytes()))
+
+        response = client.get(
+            "/media/photos/user/1/profile/me.txt", HTTP_ACCEPT_ENCODING="gzip"
+        )
+        assert response["Content-Encoding"] == "gzip"
+        assert response["Content-Type"].startswith("text/plain")
+        assert gzip.decompress(b"".join(response.streaming_content)) == path.read_bytes()
+
+        gzip_etag = response["ETag"]
+
+        response = client.get("/media/photos/user/1/profile/me.txt")
+        assert "Content-Encoding" not in response
+        assert response["ETag"] != gzip_etag
+        for accepted in ("gzip;q=0", "x-gzip", "br;q=0.5, *;q=0"):
+            response = client.get(
+                "/media/photos/user/1/profile/me.txt", HTTP_ACCEPT_ENCODING=accepted
+            )
+            assert "Content-Encoding" not in response
+        response = client.get(
+            "/media/photos/user/1/profile/me.txt", HTTP_ACCEPT_ENCODING="identity, *;q=0.1"
+        )
+        assert response["Content-Encoding"] == "gzip"
+
+        # Сжатая копия проверяется своим ETag, ответ 304 тоже зависит от Accept-Encoding
+        response = client.get(
+            "/media/photos/user/1/profile/me.txt",
+            HTTP_ACCEPT_ENCODING="gzip",
+            HTTP_IF_NONE_MATCH=gzip_etag,
+        )
+        assert response.status_code == 304
+        assert response["Vary"] == "Accept-Encoding"
+        response = client.get(
+            "/media/photos/user/1/profile/me.txt", HTTP_IF_NONE_MATCH=gzip_etag
+        )
+        assert response.status_code == 200
+
+    def test_content_headers(self, client, files):
+        (files / "photos/user/1/profile/page.html").write_bytes(b"<script></script>")
+        response = client.get("/media/photos/user/1/profile/page.html")
+        assert response["Content-Type"].startswith("text/html")
+        assert response["Content-Disposition"] == "attachment"
+        assert response["X-Content-Type-Options"] == "nosniff"
+
+        response = client.get("/media/photos/vehicle/sha256/ab/cd/abcdef.jpg")
+        assert not response["Content-Disposition"].startswith("attachment")
+        assert response["X-Content-Type-Options"] == "nosniff"
+
+    def test_serve_disabled(self, client, files, settings):
+        settings.MEDIA_SERVE = False
+        assert client.get("/media/photos/vehicle/sha256/ab/cd/abcdef.jpg").status_code == 404
+
+    def test_not_found(self, client, files):
+        assert client.get("/media/photos/missing.jpg").status_code == 404
+        assert client.get("/media/photos/vehicle").status_code == 404
+        assert client.get("/media/../manage.py").status_code == 404
+
+    def test_accel_redirect(self, client, files, settings):
+        settings.MEDIA_ACCEL_REDIRECT_PREFIX = "/protected-media/"
+        response = client.get("/media/photos/vehicle/sha256/ab/cd/abcdef.jpg")
+        assert response["X-Accel-Redirect"] == (
+            "/protected-media/photos/vehicle/sha256/ab/cd/abcdef.jpg"
+        )
+        assert response.content == b""
+
+    def test_asgi(self, async_client, files):
+        # Под ASGI middleware работает асинхронно и не переводит запрос в поток
+        response = async_to_sync(async_client.get)("/media/photos/user/1/profile/me.txt")
+        assert response.status_code == 200
+        assert response["ETag"]
+
+        response = async_to_sync(async_client.get)("/media/photos/missing.jpg")
+        assert response.status_code == 404
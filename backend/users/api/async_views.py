@@ -0,0 +1,26 @@
+from asgiref.sync import sync_to_async
+from rest_framework.permissions import IsAuthenticated
+
+from common.async_views import AsyncAPIView
+
+from .serializers import UserProfileSerializer
+from .views import UserProfileView
+
+sync_profile_view = UserProfileView.as_view()
+
+
+class AsyncUserProfileView(AsyncAPIView):
+    permission_classes = [IsAuthenticated]
+
+    async def get(self, request, *args, **kwargs):
+        """Возвращает данные о текущем пользователе."""
+        serializer = UserProfileSerializer(request.user, context={"request": request})
+        return self.render(serializer.data)
+
+    async def patch(self, request, *args, **kwargs):
+        """Обновление профиля редкое и пишет файлы: его выполняет UserProfileView."""
+        return await sync_to_async(self.update)(request, *args, **kwargs)
+
+    @staticmethod
+    def update(request, *args, **kwargs):
+        return sync_profile_view(request, *args, **kwargs).render()
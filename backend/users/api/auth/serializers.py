@@ -1,25 +1,84 @@
+from django.contrib.auth.models import update_last_login
+from django.db.models import Q
 from rest_framework import serializers
-from rest_framework.exceptions import AuthenticationFailed
-from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
+from rest_framework.exceptions import AuthenticationFailed, Throttled
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.serializers import (
+    TokenObtainPairSerializer,
+    TokenRefreshSerializer,
+)
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import RefreshToken
 
+from users.blacklist import blacklist_token, is_blacklisted
 from users.models import User
+from users.passwords import PasswordCheckBusy, check_dummy_password
 
 
 class CustomTokenObtainPairSerializer(TokenObtainPairSerializer):
     def validate(self, attrs):
-        username_or_email = attrs.get("username")
+        username_or_email = attrs.get(self.username_field)
         password = attrs.get("password")
 
-        user = User.objects.filter(username=username_or_email).first()
-        if not user:
-            user = User.objects.filter(email=username_or_email).first()
+        # Один запрос по двум уникальным индексам; при совпадении логина одного
+        # пользователя с email другого приоритет у логина
+        users = list(
+            User.objects.filter(Q(username=username_or_email) | Q(email=username_or_email))[:2]
+        )
+        user = next((user for user in users if user.username == username_or_email), None)
+        user = user or (users[0] if users else None)
 
-        if user is None or not user.check_password(password):
+        # Пароль проверяется один раз, без повторной аутентификации в TokenObtainSerializer
+        try:
+            valid = user.check_password(password) if user else check_dummy_password(password)
+        except PasswordCheckBusy:
+            raise Throttled(detail="Слишком много попыток входа, повторите позже.")
+        if not valid:
             raise AuthenticationFailed("Invalid credentials")
+        if not api_settings.USER_AUTHENTICATION_RULE(user):
+            raise AuthenticationFailed(
+                self.error_messages["no_active_account"], "no_active_account"
+            )
+
+        self.user = user
+        refresh = self.get_token(user)
+        if api_settings.UPDATE_LAST_LOGIN:
+            update_last_login(None, user)
+        return {"refresh": str(refresh), "access": str(refresh.access_token)}
+
+
+class CustomTokenRefreshSerializer(TokenRefreshSerializer):
+    """Обновление токенов с проверкой и пополнением списка отозванных (users.blacklist)"""
+
+    def validate(self, attrs):
+        refresh = self.token_class(attrs["refresh"])
+        if is_blacklisted(refresh):
+            raise TokenError("Token is blacklisted")
 
-        # Устанавливаем пользователя для токенов
-        attrs["username"] = user.username
-        return super().validate(attrs)
+        if api_settings.ROTATE_REFRESH_TOKENS:
+            # Вставка в список - одновременно проверка: из двух параллельных обновлений
+            # одним токеном пройдёт только одно
+            if api_settings.BLACKLIST_AFTER_ROTATION and not blacklist_token(refresh):
+                raise TokenError("Token is blacklisted")
+            data = {"access": str(refresh.access_token)}
+            refresh.set_jti()
+            refresh.set_exp()
+            refresh.set_iat()
+            data["refresh"] = str(refresh)
+            return data
+        return {"access": str(refresh.access_token)}
+
+
+class TokenRevokeSerializer(serializers.Serializer):
+    refresh = serializers.CharField()
+
+    def validate(self, attrs):
+        try:
+            refresh = RefreshToken(attrs["refresh"])
+        except TokenError as error:
+            raise serializers.ValidationError({"refresh": str(error)})
+        blacklist_token(refresh)
+        return attrs
 
 
 class RegistrationSerializer(serializers.ModelSerializer):
@@ -1,10 +1,15 @@
 from django.urls import path
-from rest_framework_simplejwt.views import TokenRefreshView
 
-from .views import CustomTokenObtainPairView, RegistrationView
+from .views import (
+    CustomTokenObtainPairView,
+    CustomTokenRefreshView,
+    RegistrationView,
+    TokenRevokeView,
+)
 
 urlpatterns = [
     path("token/", CustomTokenObtainPairView.as_view(), name="token_obtain_pair"),
-    path("token/refresh/", TokenRefreshView.as_view(), name="token_refresh"),
+    path("token/refresh/", CustomTokenRefreshView.as_view(), name="token_refresh"),
+    path("token/revoke/", TokenRevokeView.as_view(), name="token_revoke"),
     path("register/", RegistrationView.as_view(), name="user_register"),
 ]
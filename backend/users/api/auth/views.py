@@ -3,18 +3,47 @@ from rest_framework.permissions import AllowAny
 from rest_framework.response import Response
 from rest_framework.views import APIView
 from rest_framework_simplejwt.tokens import RefreshToken
-from rest_framework_simplejwt.views import TokenObtainPairView
+from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
 
-from .serializers import CustomTokenObtainPairSerializer, RegistrationSerializer
+from users.throttling import LoginIPThrottle, LoginUsernameThrottle, RegistrationIPThrottle
+
+from .serializers import (
+    CustomTokenObtainPairSerializer,
+    CustomTokenRefreshSerializer,
+    RegistrationSerializer,
+    TokenRevokeSerializer,
+)
 
 
 class CustomTokenObtainPairView(TokenObtainPairView):
+    # Без аутентификации по заголовку: до троттлинга не должно быть запросов к БД
+    authentication_classes = []
     permission_classes = [AllowAny]
+    throttle_classes = [LoginIPThrottle, LoginUsernameThrottle]
     serializer_class = CustomTokenObtainPairSerializer
 
 
+class CustomTokenRefreshView(TokenRefreshView):
+    authentication_classes = []
+    serializer_class = CustomTokenRefreshSerializer
+
+
+class TokenRevokeView(APIView):
+    """Отзывает refresh-токен, например при выходе"""
+
+    authentication_classes = []
+    permission_classes = [AllowAny]
+
+    def post(self, request, *args, **kwargs):
+        serializer = TokenRevokeSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        return Response({"detail": "Token revoked."}, status=status.HTTP_200_OK)
+
+
 class RegistrationView(APIView):
+    authentication_classes = []
     permission_classes = [AllowAny]
+    throttle_classes = [RegistrationIPThrottle]
 
     def post(self, request, *args, **kwargs):
         serializer = RegistrationSerializer(data=request.data)
@@ -1,8 +1,15 @@
+from django.conf import settings
 from django.urls import include, path
 
-from users.api.views import UserProfileView
+from users.api.async_views import AsyncUserProfileView
+from users.api.views import PasswordHashStatsView, ThrottleStatsView, UserProfileView
+
+# Асинхронная версия при ASYNC_API_VIEWS (cars.api.urls)
+profile_view = AsyncUserProfileView if settings.ASYNC_API_VIEWS else UserProfileView
 
 urlpatterns = [
     path("auth/", include("users.api.auth.urls")),
-    path("profile/", UserProfileView.as_view(), name="user-profile"),
+    path("profile/", profile_view.as_view(), name="user-profile"),
+    path("password-hashes/", PasswordHashStatsView.as_view(), name="user-password-hashes"),
+    path("throttle-stats/", ThrottleStatsView.as_view(), name="user-throttle-stats"),
 ]
@@ -1,8 +1,13 @@
+from django.conf import settings
 from rest_framework import status
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.permissions import IsAdminUser, IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
+from users.models import User
+from users.passwords import hash_cost_distribution
+from users.throttling import throttle_stats
+
 from .serializers import UserProfileSerializer
 
 
@@ -25,3 +30,24 @@ class UserProfileView(APIView):
             serializer.save()
             return Response(serializer.data, status=status.HTTP_200_OK)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+
+class PasswordHashStatsView(APIView):
+    """Число пользователей по стоимости bcrypt-хэша пароля"""
+
+    permission_classes = [IsAdminUser]
+
+    def get(self, request, *args, **kwargs):
+        return Response(
+            {"target_cost": settings.BCRYPT_ROUNDS, "costs": hash_cost_distribution(User)},
+            status=status.HTTP_200_OK,
+        )
+
+
+class ThrottleStatsView(APIView):
+    """Число запросов входа и регистрации, отклонённых лимитами"""
+
+    permission_classes = [IsAdminUser]
+
+    def get(self, request, *args, **kwargs):
+        return Response(throttle_stats(), status=status.HTTP_200_OK)
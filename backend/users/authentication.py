@@ -0,0 +1,115 @@
+"""
+JWT-аутентификация с кэшем пользователей.
+
+Пользователь из токена берётся из кэша, а не из БД. Запись кэша помечена версией
+пользователя, которую сигналы увеличивают при каждом сохранении User (смена
+пароля, is_active, профиля), поэтому устаревшая запись просто перестаёт читаться.
+Версия и запись читаются одним get_many.
+
+Представления с token_user = True при AUTH_TOKEN_USER получают TokenUser из самого
+токена без обращения к БД и кэшу. Такой пользователь знает только свой id, а
+блокировка пользователя действует для него лишь после истечения токена.
+"""
+
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
+
+USER_KEY = "users:auth:user:{user_id}"
+VERSION_KEY = "users:auth:version:{user_id}"
+
+
+def invalidate_user(user_id) -> int:
+    """Увеличивает версию пользователя и возвращает её"""
+    key = VERSION_KEY.format(user_id=user_id)
+    try:
+        return cache.incr(key)
+    except ValueError:
+        # Начинаем с текущего времени, чтобы не совпасть с вытесненной версией
+        value = time.time_ns()
+        cache.set(key, value, timeout=None)
+        return value
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    token_user = False
+
+    def authenticate(self, request):
+        view = (request.parser_context or {}).get("view")
+        self.token_user = settings.AUTH_TOKEN_USER and getattr(view, "token_user", False)
+        return super().authenticate(request)
+
+    async def aauthenticate(self, request, view=None):
+        """authenticate для асинхронных представлений (common.async_views)"""
+        self.token_user = settings.AUTH_TOKEN_USER and getattr(view, "token_user", False)
+        header = self.get_header(request)
+        raw_token = self.get_raw_token(header) if header is not None else None
+        if raw_token is None:
+            return None
+        # Проверка подписи не обращается к БД и кэшу
+        validated_token = self.get_validated_token(raw_token)
+        return await self.aget_user(validated_token), validated_token
+
+    def get_user(self, validated_token):
+        user_id = self.get_user_id(validated_token)
+        if self.token_user:
+            return api_settings.TOKEN_USER_CLASS(validated_token)
+
+        user_key = USER_KEY.format(user_id=user_id)
+        version_key = VERSION_KEY.format(user_id=user_id)
+        values = cache.get_many([user_key, version_key])
+        version = values.get(version_key) or invalidate_user(user_id)
+        cached = values.get(user_key)
+        if cached is None or cached[0] != version:
+            user = super().get_user(validated_token)
+            # Если пользователя сохранят после чтения, версия уже будет другой
+            cache.set(user_key, (version, user), settings.AUTH_USER_CACHE_TTL)
+            return user
+        return self.check_user(cached[1], validated_token)
+
+    async def aget_user(self, validated_token):
+        user_id = self.get_user_id(validated_token)
+        if self.token_user:
+            return api_settings.TOKEN_USER_CLASS(validated_token)
+
+        user_key = USER_KEY.format(user_id=user_id)
+        version_key = VERSION_KEY.format(user_id=user_id)
+        values = await cache.aget_many([user_key, version_key])
+        version = values.get(version_key) or await sync_to_async(invalidate_user)(user_id)
+        cached = values.get(user_key)
+        if cached is None or cached[0] != version:
+            try:
+                user = await self.user_model.objects.aget(
+                    **{api_settings.USER_ID_FIELD: user_id}
+                )
+            except self.user_model.DoesNotExist:
+                raise AuthenticationFailed("User not found", code="user_not_found")
+            self.check_user(user, validated_token)
+            await cache.aset(user_key, (version, user), settings.AUTH_USER_CACHE_TTL)
+            return user
+        return self.check_user(cached[1], validated_token)
+
+    @staticmethod
+    def get_user_id(validated_token):
+        try:
+            return validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken("Token contained no recognizable user identification")
+
+    @staticmethod
+    def check_user(user, validated_token):
+        if not user.is_active:
+            raise AuthenticationFailed("User is inactive", code="user_inactive")
+        if api_settings.CHECK_REVOKE_TOKEN and validated_token.get(
+            api_settings.REVOKE_TOKEN_CLAIM
+        ) != get_md5_hash_password(user.password):
+            raise AuthenticationFailed(
+                "The user's password has been changed.", code="password_changed"
+            )
+        return user
@@ -0,0 +1,142 @@
+"""
+Отозванные refresh-токены.
+
+JTI отозванного токена хранится в BlacklistedToken до истечения самого токена.
+Проверка идёт через фильтр Блума в памяти процесса: если JTI в фильтре нет, токен
+точно не отозван и запроса к БД нет; к таблице обращаемся только при вероятном
+попадании.
+
+Фильтр догружает новые строки, когда меняется версия в кэше, которую увеличивает
+каждый отзыв, поэтому отзыв в одном процессе виден остальным. Истёкшие строки
+удаляются автоматически, не чаще раза в TOKEN_BLACKLIST_PRUNE_INTERVAL.
+"""
+
+import hashlib
+import math
+import threading
+import time
+from datetime import datetime, timedelta
+from datetime import timezone as dt_timezone
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from rest_framework_simplejwt.settings import api_settings
+
+from users.models import BlacklistedToken
+
+VERSION_KEY = "users:blacklist:version"
+# Строка могла закоммититься позже, чем её created_at попал в окно прошлой загрузки
+SYNC_OVERLAP = timedelta(minutes=1)
+
+
+class BloomFilter:
+    def __init__(self, capacity: int, error_rate: float = 0.01):
+        self.capacity = capacity
+        self.size = max(8, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, value: str):
+        # Двойное хэширование: k позиций из двух половин одного дайджеста
+        digest = hashlib.blake2b(value.encode(), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], "big")
+        second = int.from_bytes(digest[8:], "big") | 1
+        return ((first + index * second) % self.size for index in range(self.hashes))
+
+    def add(self, value: str):
+        for position in self._positions(value):
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, value: str) -> bool:
+        return all(
+            self.bits[position >> 3] & (1 << (position & 7))
+            for position in self._positions(value)
+        )
+
+
+def _incr_version() -> int:
+    try:
+        return cache.incr(VERSION_KEY)
+    except ValueError:
+        value = time.time_ns()
+        cache.set(VERSION_KEY, value, timeout=None)
+        return value
+
+
+class TokenBlacklist:
+    def __init__(self):
+        self.bloom = None
+        self.version = None
+        self.synced_at = None
+        self.pruned_at = 0.0
+        self._lock = threading.Lock()
+
+    def sync(self):
+        version = cache.get(VERSION_KEY) or _incr_version()
+        if version == self.version:
+            return
+        with self._lock:
+            if version == self.version:
+                return
+            now = timezone.now()
+            rows = BlacklistedToken.objects.filter(expires_at__gt=now)
+            capacity = settings.TOKEN_BLACKLIST_BLOOM_CAPACITY
+            if self.bloom is None or self.bloom.count > self.bloom.capacity:
+                # Первая загрузка или фильтр переполнен: собираем заново по живым строкам
+                capacity = max(capacity, rows.count() * 2)
+                bloom = BloomFilter(capacity)
+            else:
+                bloom = self.bloom
+                rows = rows.filter(created_at__gte=self.synced_at - SYNC_OVERLAP)
+            for jti in rows.values_list("jti", flat=True).iterator(chunk_size=10_000):
+                bloom.add(jti)
+            self.bloom, self.synced_at, self.version = bloom, now, version
+
+    def contains(self, jti: str) -> bool:
+        self.sync()
+        if jti not in self.bloom:
+            return False
+        return BlacklistedToken.objects.filter(jti=jti, expires_at__gt=timezone.now()).exists()
+
+    def add(self, jti: str, expires_at: datetime) -> bool:
+        """Отзывает токен; False, если он уже был отозван"""
+        try:
+            with transaction.atomic():
+                BlacklistedToken.objects.create(jti=jti, expires_at=expires_at)
+        except IntegrityError:
+            return False
+        self.sync()
+        with self._lock:
+            self.bloom.add(jti)
+        transaction.on_commit(_incr_version)
+        self.prune_if_due()
+        return True
+
+    def prune_if_due(self):
+        now = time.monotonic()
+        if now - self.pruned_at < settings.TOKEN_BLACKLIST_PRUNE_INTERVAL:
+            return
+        self.pruned_at = now
+        prune_blacklist()
+
+
+def prune_blacklist() -> int:
+    """Удаляет строки истёкших токенов: они и так не пройдут проверку подписи"""
+    deleted, _ = BlacklistedToken.objects.filter(expires_at__lte=timezone.now()).delete()
+    return deleted
+
+
+_blacklist = TokenBlacklist()
+
+
+def is_blacklisted(token) -> bool:
+    return _blacklist.contains(token[api_settings.JTI_CLAIM])
+
+
+def blacklist_token(token) -> bool:
+    expires_at = datetime.fromtimestamp(token["exp"], tz=dt_timezone.utc)
+    return _blacklist.add(token[api_settings.JTI_CLAIM], expires_at)
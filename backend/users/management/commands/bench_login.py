@@ -0,0 +1,127 @@
+import statistics
+import threading
+import time
+
+import bcrypt
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.utils import timezone
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
+
+from common.ids import get_id_allocator
+from users.api.auth.serializers import CustomTokenObtainPairSerializer
+from users.models import User
+
+BENCH_PREFIX = "benchlogin"
+PASSWORD = "bench-password"
+
+
+class LegacyTokenObtainPairSerializer(TokenObtainPairSerializer):
+    """Вход до оптимизации: два запроса, bcrypt в потоке запроса и повторная
+    аутентификация в TokenObtainSerializer"""
+
+    def validate(self, attrs):
+        username_or_email = attrs.get("username")
+        user = User.objects.filter(username=username_or_email).first()
+        if not user:
+            user = User.objects.filter(email=username_or_email).first()
+        if user is None or not bcrypt.checkpw(
+            attrs["password"].encode(), user.password.encode()
+        ):
+            raise ValueError("Invalid credentials")
+        attrs["username"] = user.username
+        return super().validate(attrs)
+
+
+class Command(BaseCommand):
+    help = "Замеряет число входов в секунду через сериализатор получения токенов"
+
+    serializers = {
+        "legacy": LegacyTokenObtainPairSerializer,
+        "current": CustomTokenObtainPairSerializer,
+    }
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=100, help="Сколько пользователей")
+        parser.add_argument("--logins", type=int, default=200, help="Входов на каждый режим")
+        parser.add_argument("--concurrency", type=int, default=8, help="Потоков-клиентов")
+        parser.add_argument("--mode", choices=["legacy", "current", "both"], default="both")
+        parser.add_argument(
+            "--by-email", action="store_true", help="Входить по email, а не по логину"
+        )
+        parser.add_argument(
+            "--keep", action="store_true", help="Не удалять созданных пользователей"
+        )
+
+    def handle(self, *args, **options):
+        if min(options["users"], options["logins"], options["concurrency"]) < 1:
+            raise CommandError("--users, --logins и --concurrency должны быть больше нуля")
+        modes = ["legacy", "current"] if options["mode"] == "both" else [options["mode"]]
+
+        # Потоки-клиенты работают в своих соединениях, поэтому данные коммитятся
+        users = self.generate(options["users"])
+        try:
+            for mode in modes:
+                self.run(mode, users, options)
+        finally:
+            if not options["keep"]:
+                User.objects.filter(username__startswith=BENCH_PREFIX).delete()
+
+    def generate(self, count):
+        # Хэш общий для всех пользователей: bcrypt на каждого занял бы минуты
+        password = bcrypt.hashpw(PASSWORD.encode(), bcrypt.gensalt()).decode()
+        allocator = get_id_allocator()
+        now = timezone.now()
+        return User.objects.bulk_create(
+            User(
+                id=allocator.allocate(User),
+                created_at=now,
+                updated_at=now,
+                username=f"{BENCH_PREFIX}{index}",
+                email=f"{BENCH_PREFIX}{index}@example.com",
+                password=password,
+            )
+            for index in range(count)
+        )
+
+    def run(self, mode, users, options):
+        serializer_class = self.serializers[mode]
+        field = "email" if options["by_email"] else "username"
+        logins = [
+            getattr(users[index % len(users)], field) for index in range(options["logins"])
+        ]
+        timings, errors = [], []
+
+        def client(share):
+            try:
+                for login in share:
+                    started = time.perf_counter()
+                    try:
+                        serializer_class(
+                            data={"username": login, "password": PASSWORD}
+                        ).is_valid(raise_exception=True)
+                    except Exception as error:
+                        errors.append(error)
+                    timings.append((time.perf_counter() - started) * 1000)
+            finally:
+                connection.close()
+
+        concurrency = options["concurrency"]
+        threads = [
+            threading.Thread(target=client, args=(logins[index::concurrency],))
+            for index in range(concurrency)
+        ]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        p50 = statistics.median(timings)
+        p95 = statistics.quantiles(timings, n=20)[-1] if len(timings) > 1 else timings[0]
+        self.stdout.write(self.style.MIGRATE_HEADING(f"\n{mode}"))
+        self.stdout.write(
+            f"входов: {len(timings)}, ошибок: {len(errors)}, "
+            f"{len(timings) / elapsed:.1f} входов/с, p50: {p50:.1f} мс, p95: {p95:.1f} мс"
+        )
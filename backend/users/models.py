@@ -1,8 +1,8 @@
-import bcrypt
 from django.contrib.auth.models import BaseUserManager
 from django.db import models
 
 from common.models import BaseUserModel
+from users import passwords
 
 
 class CustomUserManager(BaseUserManager):
@@ -58,10 +58,21 @@ class User(BaseUserModel):
     REQUIRED_FIELDS = ["email"]
 
     def set_password(self, raw_password):
-        self.password = bcrypt.hashpw(raw_password.encode(), bcrypt.gensalt()).decode()
+        self.password = passwords.hash_password(raw_password)
 
     def check_password(self, raw_password):
-        return bcrypt.checkpw(raw_password.encode(), self.password.encode())
+        valid = passwords.check_password(raw_password, self.password)
+        if valid and self.pk is not None and passwords.needs_rehash(self.password):
+            passwords.schedule_rehash(self, raw_password)
+        return valid
 
     def __str__(self):
         return self.username
+
+
+class BlacklistedToken(models.Model):
+    """Отозванный refresh-токен; строка нужна только до истечения токена (users.blacklist)"""
+
+    jti = models.CharField(max_length=64, primary_key=True)
+    expires_at = models.DateTimeField(db_index=True)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
@@ -0,0 +1,131 @@
+"""
+Проверка паролей bcrypt в ограниченном пуле потоков.
+
+bcrypt отпускает GIL, поэтому проверки идут параллельно, но не больше
+PASSWORD_CHECK_WORKERS одновременно: всплеск входов не занимает все ядра процесса.
+Если проверок в работе и в очереди уже PASSWORD_CHECK_MAX_PENDING, новая сразу
+отклоняется, а не держит поток обработчика запросов.
+
+Стоимость новых хэшей задаёт BCRYPT_ROUNDS. Хэш с другой стоимостью или в формате
+хэшеров Django после успешной проверки пересчитывается в фоне.
+"""
+
+import logging
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import bcrypt
+from django.conf import settings
+from django.contrib.auth import hashers
+from django.db import connection
+from django.db.models import Count
+from django.db.models.functions import Substr
+
+logger = logging.getLogger(__name__)
+
+BCRYPT_RE = re.compile(r"^\$2[aby]\$(\d\d)\$")
+
+_executor = None
+_slots = None
+_lock = threading.Lock()
+_dummy_hash = None
+
+
+class PasswordCheckBusy(Exception):
+    """Очередь проверок паролей заполнена"""
+
+
+def get_executor() -> ThreadPoolExecutor:
+    global _executor, _slots
+    if _executor is None:
+        with _lock:
+            if _executor is None:
+                _slots = threading.BoundedSemaphore(settings.PASSWORD_CHECK_MAX_PENDING)
+                _executor = ThreadPoolExecutor(
+                    max_workers=settings.PASSWORD_CHECK_WORKERS, thread_name_prefix="bcrypt"
+                )
+    return _executor
+
+
+def hash_password(raw_password: str) -> str:
+    return bcrypt.hashpw(
+        raw_password.encode(), bcrypt.gensalt(settings.BCRYPT_ROUNDS)
+    ).decode()
+
+
+def hash_cost(hashed: str) -> int | None:
+    """Стоимость bcrypt-хэша или None для других форматов"""
+    match = BCRYPT_RE.match(hashed or "")
+    return int(match.group(1)) if match else None
+
+
+def needs_rehash(hashed: str) -> bool:
+    return not hashed.startswith("$2b$") or hash_cost(hashed) != settings.BCRYPT_ROUNDS
+
+
+def _checkpw(raw_password: str, hashed: str) -> bool:
+    if hash_cost(hashed) is None:
+        # Хэш хэшера Django (например, из старой схемы или createsuperuser)
+        return hashers.check_password(raw_password, hashed)
+    try:
+        return bcrypt.checkpw(raw_password.encode(), hashed.encode())
+    except ValueError:
+        return False
+
+
+def check_password(raw_password: str, hashed: str) -> bool:
+    executor = get_executor()
+    if not _slots.acquire(blocking=False):
+        raise PasswordCheckBusy
+    try:
+        return executor.submit(_checkpw, raw_password, hashed).result()
+    finally:
+        _slots.release()
+
+
+def check_dummy_password(raw_password: str) -> bool:
+    """Проверка той же стоимости для несуществующего пользователя, чтобы время
+    ответа не выдавало, есть ли такой логин"""
+    global _dummy_hash
+    if _dummy_hash is None or hash_cost(_dummy_hash) != settings.BCRYPT_ROUNDS:
+        _dummy_hash = hash_password("dummy")
+    check_password(raw_password, _dummy_hash)
+    return False
+
+
+def schedule_rehash(user, raw_password: str):
+    """Пересчитывает хэш в пуле, не задерживая вход"""
+    return get_executor().submit(_rehash, type(user), user.pk, raw_password, user.password)
+
+
+def _rehash(model, user_id, raw_password: str, old_hash: str):
+    from users.authentication import invalidate_user
+
+    try:
+        # Сравнение со старым хэшем: пароль могли сменить, пока считался новый
+        updated = model.objects.filter(pk=user_id, password=old_hash).update(
+            password=hash_password(raw_password)
+        )
+        if updated:
+            # update() не отправляет сигналы, сбрасывающие кэш аутентификации
+            invalidate_user(user_id)
+    except Exception:
+        logger.exception("Не удалось пересчитать хэш пароля пользователя %s", user_id)
+    finally:
+        connection.close()
+
+
+def hash_cost_distribution(model) -> dict:
+    """Число пользователей по стоимости bcrypt; прочие форматы - под ключом "other" """
+    prefixes = (
+        model.objects.annotate(prefix=Substr("password", 1, 7))
+        .values("prefix")
+        .annotate(count=Count("pk"))
+    )
+    distribution = {}
+    for row in prefixes:
+        cost = hash_cost(row["prefix"])
+        key = str(cost) if cost is not None else "other"
+        distribution[key] = distribution.get(key, 0) + row["count"]
+    return dict(sorted(distribution.items()))
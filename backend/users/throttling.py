@@ -0,0 +1,174 @@
+"""
+Ограничение частоты входа и регистрации корзинами токенов.
+
+Корзина ёмкостью N пополняется на N токенов за период ("10/min"), каждый запрос
+забирает токен; пустая корзина - ответ 429 с Retry-After. Троттлинг DRF
+выполняется до разбора учётных данных сериализатором, то есть до запросов к БД
+и bcrypt.
+
+Корзины хранятся в памяти процесса (AUTH_THROTTLE_STORE = "local") или в общем
+кэше Django ("cache"), чтобы лимит действовал на все процессы. Число отклонённых
+запросов по каждому виду лимита - в throttle_stats().
+"""
+
+import hashlib
+import threading
+import time
+from collections import Counter, OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework.throttling import BaseThrottle
+
+PERIODS = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+BUCKET_KEY = "users:throttle:bucket:{key}"
+REJECTED_KEY = "users:throttle:rejected:{scope}"
+
+
+def parse_rate(rate: str) -> tuple[int, float]:
+    """Ёмкость и пополнение в секунду: "10/min" -> (10, 10 / 60); период - s, m, h или d"""
+    count, period = rate.split("/")
+    capacity = int(count)
+    return capacity, capacity / PERIODS[period[0]]
+
+
+class LocalBucketStore:
+    """Корзины в памяти процесса; самые давние вытесняются сверх max_keys"""
+
+    def __init__(self, max_keys: int = 100_000):
+        self.max_keys = max_keys
+        self.buckets = OrderedDict()  # ключ -> (токены, время обновления)
+        self.rejected = Counter()
+        self._lock = threading.Lock()
+
+    def consume(self, key: str, capacity: int, refill_rate: float) -> float:
+        """Забирает токен; возвращает 0 или сколько секунд ждать следующего"""
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self.buckets.pop(key, (capacity, now))
+            tokens = min(capacity, tokens + (now - updated) * refill_rate)
+            wait = 0.0 if tokens >= 1 else (1 - tokens) / refill_rate
+            self.buckets[key] = (tokens - 1 if not wait else tokens, now)
+            if len(self.buckets) > self.max_keys:
+                self.buckets.popitem(last=False)
+        return wait
+
+    def add_rejected(self, scope: str):
+        with self._lock:
+            self.rejected[scope] += 1
+
+    def stats(self) -> dict:
+        return dict(self.rejected)
+
+
+class CacheBucketStore:
+    """
+    Корзины в кэше Django, общие для процессов. Чтение и запись корзины не атомарны:
+    при одновременных запросах лимит может быть превышен на несколько запросов.
+    """
+
+    def consume(self, key: str, capacity: int, refill_rate: float) -> float:
+        now = time.time()
+        # Логин может содержать символы, недопустимые в ключах memcached
+        cache_key = BUCKET_KEY.format(key=hashlib.sha256(key.encode()).hexdigest())
+        tokens, updated = cache.get(cache_key) or (capacity, now)
+        tokens = min(capacity, tokens + (now - updated) * refill_rate)
+        wait = 0.0 if tokens >= 1 else (1 - tokens) / refill_rate
+        # Через capacity / refill_rate корзина снова полная - хранить дольше незачем
+        cache.set(cache_key, (tokens - 1 if not wait else tokens, now), capacity / refill_rate)
+        return wait
+
+    def add_rejected(self, scope: str):
+        key = REJECTED_KEY.format(scope=scope)
+        if not cache.add(key, 1, timeout=None):
+            try:
+                cache.incr(key)
+            except ValueError:
+                cache.set(key, 1, timeout=None)
+
+    def stats(self) -> dict:
+        scopes = list(settings.AUTH_THROTTLE_RATES)
+        values = cache.get_many([REJECTED_KEY.format(scope=scope) for scope in scopes])
+        return {
+            scope: values[REJECTED_KEY.format(scope=scope)]
+            for scope in scopes
+            if REJECTED_KEY.format(scope=scope) in values
+        }
+
+
+_local_store = LocalBucketStore()
+_cache_store = CacheBucketStore()
+
+
+def get_store():
+    return _cache_store if settings.AUTH_THROTTLE_STORE == "cache" else _local_store
+
+
+def throttle_stats() -> dict:
+    """Число отклонённых запросов по видам лимитов"""
+    return get_store().stats()
+
+
+def reset_local_store():
+    _local_store.buckets.clear()
+    _local_store.rejected.clear()
+
+
+class TokenBucketThrottle(BaseThrottle):
+    scope = None
+
+    def get_key(self, request) -> str | None:
+        raise NotImplementedError
+
+    def allow_request(self, request, view):
+        self.wait_time = 0.0
+        rate = settings.AUTH_THROTTLE_RATES.get(self.scope)
+        key = self.get_key(request)
+        if not rate or key is None:
+            return True
+        store = get_store()
+        self.wait_time = store.consume(f"{self.scope}:{key}", *parse_rate(rate))
+        if self.wait_time:
+            store.add_rejected(self.scope)
+        return not self.wait_time
+
+    def wait(self):
+        return self.wait_time
+
+
+class LoginIPThrottle(TokenBucketThrottle):
+    scope = "login_ip"
+
+    def get_key(self, request):
+        return self.get_ident(request)
+
+
+class LoginUsernameThrottle(TokenBucketThrottle):
+    """Лимит на учётную запись: перебор паролей одного пользователя с разных IP"""
+
+    scope = "login_username"
+
+    def get_key(self, request):
+        # Тело не объект (JSON-список, строка) - логина нет, ограничиваем по IP
+        if not isinstance(request.data, dict):
+            return self.get_ident(request)
+        username = request.data.get("username")
+        if not isinstance(username, str) or not username.strip():
+            return None
+        return username.strip().casefold()
+
+
+class RegistrationIPThrottle(TokenBucketThrottle):
+    scope = "register_ip"
+
+    def get_key(self, request):
+        return self.get_ident(request)
+
+
+class PhotoRenditionIPThrottle(TokenBucketThrottle):
+    """Лимит на создание копий фото по запросу: каждая - декодирование и уменьшение"""
+
+    scope = "photo_rendition_ip"
+
+    def get_key(self, request):
+        return self.get_ident(request)